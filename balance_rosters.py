@@ -0,0 +1,47 @@
+import argparse
+from concurrent.futures import as_completed
+from concurrent.futures import ProcessPoolExecutor
+import json
+import sys
+
+from balancebot.batch                 import fill_names, fingerprint, load_rosters, solve_roster, validation_error, with_roster_names
+from balancebot.data_store            import DataStore
+from balancebot.driver_identity_cache import DriverIdentityCache
+
+# Balances rosters from CSV or JSON files without Discord, across a pool of worker processes, and writes one JSON line
+# per roster to stdout as each finishes. Identical rosters are only balanced once.
+# Usage: python balance_rosters.py rosters.json more_rosters.csv [--workers 4]
+
+def parse_args():
+  parser = argparse.ArgumentParser(description='Balance rosters of drivers into teams, without Discord.')
+  parser.add_argument('files', nargs='+', help='JSON files (a roster or a list of rosters) or CSV files (one driver per row)')
+  parser.add_argument('--workers', type=int, default=None, help='worker processes (defaults to the number of CPUs)')
+  return parser.parse_args()
+
+def write_result(result):
+  sys.stdout.write(json.dumps(result) + '\n')
+  sys.stdout.flush()
+
+def main():
+  args = parse_args()
+  identity_cache = DriverIdentityCache(DataStore) # Names looked up by the bot, for rosters which only give driver IDs.
+  rosters = [fill_names(roster, identity_cache) for path in args.files for roster in load_rosters(path)]
+  rosters_by_fingerprint = {}
+  for roster in rosters:
+    error = validation_error(roster)
+    if error:
+      write_result({'roster': roster['name'], 'error': error})
+      continue
+    rosters_by_fingerprint.setdefault(fingerprint(roster), []).append(roster)
+  with ProcessPoolExecutor(max_workers=args.workers) as pool:
+    searches = {pool.submit(solve_roster, same_rosters[0]): same_rosters for same_rosters in rosters_by_fingerprint.values()}
+    for search in as_completed(searches):
+      try:
+        result = search.result()
+      except Exception as error:
+        result = {'error': 'Balancing failed: {0!r}'.format(error)}
+      for roster in searches[search]:
+        write_result(with_roster_names(result, roster))
+
+if __name__ == '__main__':
+  main()
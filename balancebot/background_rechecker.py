@@ -0,0 +1,136 @@
+import asyncio
+import logging
+
+from balancebot.balance_bot                import BalanceBot
+from balancebot.interfaces.discord_channel import DiscordChannel
+from balancebot.metrics                    import Histogram
+from balancebot.rating_events              import RatingEventBus
+from balancebot.tracing                    import span
+
+MAX_CONCURRENT_GUILD_RECHECKS = 8
+OVERRUN_WARNING_FRACTION      = 0.8 # Of the cycle period.
+SLOWEST_GUILDS_LOGGED         = 5
+
+# Owns the process-wide state used by background monitoring, and runs the scheduled rechecks.
+class BackgroundRechecker:
+  def __init__(self, ir_client, di_client, data_store_class, identity_cache, guild_registry, irating_history, scheduler, cycle_period_seconds=None):
+    self.ir_client = ir_client
+    self.di_client = di_client
+    self.data_store_class = data_store_class
+    self.guild_registry = guild_registry
+    self.identity_cache = identity_cache
+    self.irating_history = irating_history
+    self.scheduler = scheduler
+    self.cycle_durations = Histogram()
+    self.cycle_period_seconds = cycle_period_seconds
+    self.cycle_in_progress = False
+    self.guild_rechecks = 0
+    self.last_cycle_guild_count = 0
+    self.rating_events = RatingEventBus(self.propagate_rating_changes)
+  
+  async def check_quarter_number(self):
+    bot = BalanceBot(self.ir_client, self.data_store_class, self.identity_cache, self.guild_registry, self.irating_history)
+    await bot.refresh_quarter_number()
+  
+  def new_bot(self):
+    bot = BalanceBot(self.ir_client, self.data_store_class, self.identity_cache, self.guild_registry, self.irating_history, self.rating_events)
+    interface = DiscordChannel(self.di_client)
+    bot.set_interface(interface)
+    interface.set_bot(bot)
+    return bot, interface
+  
+  # Runs the per-driver rechecks which have come due, as one task per guild. A cycle which starts while the previous one
+  # is still running is skipped; the drivers it would have checked stay due and are picked up by the next cycle.
+  async def perform_background_rechecks(self):
+    if self.cycle_in_progress:
+      logging.warning('Skipping background recheck cycle, since the previous cycle is still running.')
+      return
+    self.cycle_in_progress = True
+    guild_spans = []
+    try:
+      with span('cycle') as cycle_span:
+        worker_slots = asyncio.Semaphore(MAX_CONCURRENT_GUILD_RECHECKS)
+        due_checks = self.scheduler.due_checks()
+        cycle_span.set(guilds=len(due_checks))
+        await asyncio.gather(*[self.perform_guild_recheck(guild_id, driver_ids, worker_slots, guild_spans) for guild_id, driver_ids in due_checks.items()])
+    finally:
+      self.cycle_in_progress = False
+    self.cycle_durations.observe(cycle_span.duration)
+    self.guild_rechecks += len(due_checks)
+    self.last_cycle_guild_count = len(due_checks)
+    self.log_cycle_summary(cycle_span, guild_spans)
+  
+  def log_cycle_summary(self, cycle_span, guild_spans):
+    if not guild_spans:
+      return
+    slowest = sorted(guild_spans, key=lambda guild_span: -guild_span.duration)[:SLOWEST_GUILDS_LOGGED]
+    logging.info('Background recheck cycle took {0:.2f}s for {1} guild(s). Slowest: {2}'.format(
+      cycle_span.duration, len(guild_spans), '; '.join('guild {0} {1}'.format(guild_span.attributes['guild_id'], guild_span.summary()) for guild_span in slowest)))
+    latencies = getattr(self.ir_client, 'latencies', None)
+    if latencies:
+      logging.info('iRacing latencies: {0}'.format(latencies.summary()))
+    if self.cycle_period_seconds and cycle_span.duration > self.cycle_period_seconds * OVERRUN_WARNING_FRACTION:
+      logging.warning('Background recheck cycle took {0:.2f}s, close to or over its {1}s period. Later cycles will be skipped while it runs.'.format(
+        cycle_span.duration, self.cycle_period_seconds))
+  
+  async def perform_guild_recheck(self, guild_id, driver_ids, worker_slots, guild_spans):
+    changed_ids = set()
+    async with worker_slots, self.guild_registry.lock(guild_id):
+      try:
+        with span('guild', guild_id=guild_id, drivers=len(driver_ids)) as guild_span:
+          guild_spans.append(guild_span)
+          bot, interface = self.new_bot()
+          changed_drivers = await interface.perform_background_recheck(guild_id, driver_ids)
+          changed_ids = set(driver.id for driver in changed_drivers)
+      except Exception:
+        logging.exception('Background recheck of guild {0} failed.'.format(guild_id))
+        self.guild_registry.invalidate(guild_id)
+      finally:
+        for driver_id in driver_ids:
+          self.scheduler.record_check(guild_id, driver_id, driver_id in changed_ids)
+  
+  # Loads everything the first cycle and first commands need at once, instead of one guild or driver at a time on demand.
+  async def warm_start(self):
+    with span('warm_start') as warm_start_span:
+      guild_ids = await self.data_store_class.run_in_executor(self.data_store_class.monitored_guild_ids)
+      results = await asyncio.gather(self.check_quarter_number(),
+                                     self.data_store_class.run_in_executor(self.irating_history.refresh),
+                                     *[self.guild_registry.load(guild_id) for guild_id in guild_ids],
+                                     return_exceptions=True)
+      for result in results:
+        if isinstance(result, Exception):
+          logging.error('Warm start step failed.', exc_info=result)
+      await self.sync_recheck_schedule()
+    logging.info('Warm start loaded {0} monitored guild(s) in {1:.2f}s.'.format(len(guild_ids), warm_start_span.duration))
+  
+  # Applies rating changes published by other guilds' rechecks. The guild's own checks of those drivers are pushed back,
+  # as if it had just checked them itself.
+  async def propagate_rating_changes(self, guild_id, iratings):
+    async with self.guild_registry.lock(guild_id):
+      try:
+        with span('propagate', guild_id=guild_id, drivers=len(iratings)):
+          bot, interface = self.new_bot()
+          await interface.apply_rating_changes(guild_id, iratings)
+      except Exception:
+        logging.exception('Applying rating changes to guild {0} failed.'.format(guild_id))
+        self.guild_registry.invalidate(guild_id)
+    for driver_id in iratings:
+      if self.scheduler.next_check(guild_id, driver_id):
+        self.scheduler.record_check(guild_id, driver_id, True)
+  
+  # Picks up roster, notification channel and event date changes. Only monitored guilds are visited.
+  async def sync_recheck_schedule(self):
+    guild_ids = await self.data_store_class.run_in_executor(self.data_store_class.monitored_guild_ids)
+    for guild_id in self.scheduler.guild_ids() - set(guild_ids):
+      self.scheduler.remove_guild(guild_id)
+      self.rating_events.unsubscribe(guild_id)
+    for guild_id in guild_ids:
+      bot, interface = self.new_bot()
+      await bot.initialize_guild(guild_id)
+      if not interface.is_monitoring_possible() or not bot.guild.has_drivers():
+        self.scheduler.remove_guild(guild_id)
+        self.rating_events.unsubscribe(guild_id)
+        continue
+      driver_ids = [driver.id for driver in bot.guild.get_drivers()]
+      self.scheduler.sync_guild(guild_id, driver_ids, bot.get_event_date())
+      self.rating_events.subscribe(guild_id, driver_ids)
@@ -1,18 +1,39 @@
+import asyncio
+from datetime import datetime as dt
+import logging
 from pyracing import constants
+import time
 
+from balancebot.balance_solver    import BalanceSolver, SOLVER_EXECUTOR
 from balancebot.balancer          import Balancer
 from balancebot.driver            import Driver
 from balancebot.driver_set        import DriverSet
 from balancebot.driver_collection import DriverCollection
-from balancebot.guild             import Guild
+from balancebot.event             import Event
+from balancebot.robustness        import DEFAULT_HORIZON_DAYS, MAX_RANKED_BALANCES, RANKED_BALANCES, RobustnessSimulator
+from balancebot.tracing           import span
+
+BULK_LOOKUP_CONCURRENCY = 5
+DEFAULT_HISTORY_DAYS = 30
+EVENT_DATE_FORMAT = '%Y-%m-%d'
+MAX_TEAM_SIZE = 10
+MIN_TEAM_SIZE = 2
 
 class BalanceBot:
-  def __init__(self, client, data_store_class):
+  quarter_number = None # Shared by every bot in the process; loaded from the data store by the first one.
+  solver = BalanceSolver() # Shared by every bot in the process, so identical searches can be shared.
+  
+  def __init__(self, client, data_store_class, identity_cache, guild_registry, irating_history, rating_events=None):
     self.interface = None
     self.client = client
     self.data_store_class = data_store_class
     self.guild = None
-    self.quarter_number = self.data_store_class.load_quarter_number()
+    self.guild_registry = guild_registry
+    self.identity_cache = identity_cache
+    self.irating_history = irating_history
+    self.rating_events = rating_events
+    if BalanceBot.quarter_number is None:
+      BalanceBot.quarter_number = self.data_store_class.load_quarter_number()
   
   async def add_combinations(self, collection):
     if not self.guild.has_drivers():
@@ -41,30 +62,72 @@ class BalanceBot:
       await self.interface.print('Note that since {0} teams have been set, balance monitoring and notification will continue to check against the set teams. Driver combinations will not be taken into account.'.format(self.guild.name))
 
     
+  # Looks up all drivers concurrently, then adds every driver that could be found in a single write
+  # and reports successes and failures together.
   async def add_drivers(self, driver_identifiers):
-    for driver_identifier in driver_identifiers:
-      await self.interface.indicate_progress()
-      if isinstance(driver_identifier, str):
-        driver_name = driver_identifier
-        if Driver.find_by_name(self.guild.get_drivers(), driver_name):
-          await self.alert_driver_already_exists(driver_name)
-          return
-        driver_id = await self.find_driver_id(driver_identifier)
-        if not driver_id:
-          return
+    await self.interface.indicate_progress()
+    lookup_slots = asyncio.Semaphore(BULK_LOOKUP_CONCURRENCY)
+    unique_identifiers = list(dict.fromkeys(driver_identifiers))
+    results = await asyncio.gather(*[self.resolve_new_driver(driver_identifier, lookup_slots) for driver_identifier in unique_identifiers])
+    added_drivers = DriverSet()
+    failures = []
+    for driver, failure in results:
+      if failure:
+        failures.append(failure)
+      elif added_drivers.has_driver(driver) or Driver.find_by_name(added_drivers.drivers, driver.name):
+        failures.append('{0} was specified more than once.'.format(driver.name))
       else:
-        driver_id = driver_identifier
-        driver_name = await self.find_driver_name(driver_id)
-        if Driver.find_by_name(self.guild.get_drivers(), driver_name):
-          await self.alert_driver_already_exists(driver_name)
+        added_drivers.add_driver(driver)
+    if added_drivers.size() > 0:
+      self.guild.add_drivers(added_drivers.drivers)
+      await self.record_iratings(added_drivers.drivers)
+    await self.identity_cache.save()
+    message_parts = []
+    if added_drivers.size() > 0:
+      message_parts.append('Added {0} driver(s):'.format(added_drivers.size()))
+      message_parts += ['  {0}'.format(driver.print_format()) for driver in added_drivers.drivers]
+    if failures:
+      message_parts.append('Could not add {0} driver(s):'.format(len(failures)))
+      message_parts += ['  {0}'.format(failure) for failure in failures]
+    await self.interface.print('\n'.join(message_parts))
+  
+  async def add_event(self, name):
+    if not name:
+      await self.interface.print('Please name the event.')
+      return
+    if name in self.guild.events:
+      await self.interface.print('An event named {0} already exists.'.format(name))
+      return
+    self.guild.set_event(Event(name))
+    await self.interface.print("Added event {0}. Use 'set event drivers' and 'set event team sizes' to set it up.".format(name))
+  
+  async def add_event_combinations(self, name, collection):
+    event = await self.find_event(name)
+    if not event:
+      return
+    event = event.copy()
+    combined_ids = set(sum(event.combinations, []))
+    new_combinations = []
+    for driver_names in collection:
+      combination = []
+      for driver_name in driver_names:
+        driver = self.identify_driver(driver_name)
+        if not driver or driver.id not in event.driver_ids:
+          await self.interface.print('{0} is not a driver in event {1}.'.format(driver.name if driver else driver_name, event.name))
+          return
+        if driver.id in combined_ids:
+          await self.interface.print('{0} is already part of a combination in event {1}.'.format(driver.name, event.name))
           return
-        if not driver_name:
+        if driver.id in combination or any(driver.id in new_combination for new_combination in new_combinations):
+          await self.alert_driver_already_specified(driver.name)
           return
-      driver_irating = await self.find_driver_irating(driver_id)
-      driver = Driver(driver_id, driver_name, driver_irating)
-      self.guild.add_driver(driver)
-      await self.interface.print('Added driver {0}'.format(driver.print_format()))
-      
+        combination.append(driver.id)
+      new_combinations.append(combination)
+    event.combinations += new_combinations
+    event.clear_balance()
+    self.guild.set_event(event)
+    await self.interface.print('Added new combination(s) of drivers in event {0}.'.format(event.name))
+  
   async def alert_driver_already_exists(self, driver_name):
     await self.interface.print('Driver {0} has already been added.'.format(driver_name))
   
@@ -77,91 +140,52 @@ class BalanceBot:
   async def alert_error_received(self):
     await self.interface.print('Sorry, that command was recognized, but I encountered an error processing it.')
     
+  async def alert_iracing_unavailable(self):
+    await self.interface.print("Sorry, iRacing isn't responding right now. Please try again in a few minutes.")
+    
   async def alert_unrecognized_command(self):
     await self.interface.print("Sorry, I didn't recognize that command. For a list of available commands, use the 'list commands' command.")
   
-  async def background_recheck(self):
+  # Applies iRating changes found while rechecking another guild, then reports on the resulting balance.
+  # Returns the drivers whose iRating changed.
+  async def apply_rating_changes(self, iratings):
+    old_gap = self.current_gap()
+    old_event_gaps = self.current_event_gaps()
+    changed_drivers = []
+    for driver in self.guild.get_drivers():
+      new_irating = iratings.get(driver.id)
+      if new_irating is not None and new_irating != driver.irating:
+        await self.interface.print("The iRating of driver {0} has changed from {1} to {2}.".format(driver.name, driver.irating, new_irating))
+        driver.irating = new_irating
+        self.guild.save_driver(driver)
+        changed_drivers.append(driver)
+    if changed_drivers:
+      await self.report_rebalance(old_gap)
+      await self.report_event_rebalances(changed_drivers, old_event_gaps)
+    return changed_drivers
+  
+  # Rechecks the given drivers (all drivers if not specified) and reports on the resulting balance.
+  # Returns the drivers whose iRating changed.
+  async def background_recheck(self, driver_ids=None):
     if not self.guild.has_drivers():
-      return
-    if self.guild.teams.size() > 0:
-      old_gap = self.guild.teams.irating_gap()
-    else:
-      old_gap = self.guild.balance.irating_gap()
-    threshold = self.guild.balance_threshold
-    any_changed = await self.recheck_driver_ratings(self.guild.get_drivers(), print_unchanged=False)
-    if not any_changed:
-      return
-    if self.guild.teams.size() > 0:
-      new_gap = self.guild.teams.irating_gap()
-      if threshold and new_gap > threshold:
-        verb = 'remains' if old_gap > threshold else 'has moved'
-        message = "**WARNING**: The iRating gap of the fixed teams {0} outside of the balance threshold ({1})".format(verb, round(threshold, 2))
-        teams_to_show = self.guild.teams
-      else:
-        message = "The iRating gap of the fixed teams has changed from {0} to {1}.".format(round(old_gap, 2), round(new_gap, 2))
-        teams_to_show = None
+      return []
+    if driver_ids is None:
+      drivers = self.guild.get_drivers()
     else:
-      possible = await self.check_balance_possible(print_reason_not_possible=False)
-      if not possible:
-        return
-      old_balance = self.guild.balance
-      balancer = Balancer(self.guild.get_drivers(), self.guild.team_sizes, self.guild.combinations)
-      await self.interface.indicate_progress()
-      new_balance = balancer.optimal_balance()
-      self.guild.set_balance(new_balance)
-      new_gap = new_balance.irating_gap()
-      if new_balance == old_balance:
-        if threshold:
-          if new_gap > threshold:
-            if old_gap > threshold:
-              conjunction, verb = 'and', 'remains'
-            else:
-              conjunction, verb = 'but', 'has moved'
-            message = "The optimal balance of team members has not changed, {0} the iRating gap {1} outside of the balance threshold ({2})".format(conjunction, verb, round(threshold, 2))
-            teams_to_show = new_balance
-          else:
-            message = "The optimal balance of team members has not changed.\nThe iRating gap has changed from {0} to {1}, which is inside the balance threshold ({2}).".format(round(old_gap, 2), round(new_gap, 2), round(threshold, 2))
-            teams_to_show = None
-      else:
-        teams_to_show = new_balance
-        if threshold:
-          if new_gap > threshold:
-            if old_gap > threshold:
-              conjunction, verb = 'but', 'remains'
-            else:
-              conjunction, verb = 'and', 'has moved'
-            message = "The optimal balance of team members has changed, {0} the iRating gap {1} outside of the balance threshold ({2})".format(conjunction, verb, round(threshold, 2))
-          else:
-            if old_gap > threshold:
-              conjunction, verb = 'and', 'has moved'
-            else:
-              conjunction, verb = 'but', 'remains'
-            message = "The optimal balance of team members has changed, {0} the iRating gap {1} inside the balance threshold ({2})".format(conjunction, verb, round(threshold, 2))
-        else:
-          message = "The optimal balance of team members has changed"
-    if teams_to_show:
-      await self.print_collection(teams_to_show, message)
-    else:
-      await self.interface.print(message)
-      
+      drivers = [driver for driver in self.guild.get_drivers() if driver.id in driver_ids]
+    old_gap = self.current_gap()
+    old_event_gaps = self.current_event_gaps()
+    changed_drivers = await self.recheck_driver_ratings(drivers, print_unchanged=False)
+    if changed_drivers:
+      await self.report_rebalance(old_gap)
+      await self.report_event_rebalances(changed_drivers, old_event_gaps)
+    return changed_drivers
+  
   async def check_balance_possible(self, print_reason_not_possible=True):
-    if not self.guild.has_drivers():
-      if print_reason_not_possible:
-        await self.interface.print('No {0} drivers have been added.'.format(self.guild.name))
-      return False
-    if not self.guild.team_sizes:
-      if print_reason_not_possible:
-        await self.interface.print('Team sizes have not been set.')
-      return False
-    if not self.guild.driver_count() >= min(self.guild.team_sizes) * 2:
-      if print_reason_not_possible:
-        await self.interface.print('There are not enough drivers to form teams of the specified size(s).')
-      return False
-    if not Balancer.is_team_formation_possible(self.guild.driver_count(), self.guild.team_sizes):
-      if print_reason_not_possible:
-        await self.interface.print('It is not possible to form teams of the specified size(s) with {0} drivers.'.format(self.guild.driver_count()))
-      return False
-    return True
+    reason = BalanceBot.reason_balance_not_possible(self.guild.name, self.guild.driver_count(), self.guild.team_sizes)
+    if reason and print_reason_not_possible:
+      await self.interface.print(reason)
+    return not reason
   
   async def clear_combinations(self):
     self.guild.clear_combinations()
@@ -174,6 +198,16 @@ class BalanceBot:
     self.guild.clear_drivers()
     await self.interface.print('Cleared {0} drivers, including calculated balance, driver combinations, and fixed teams.'.format(self.guild.name))
   
+  async def clear_event_combinations(self, name):
+    event = await self.find_event(name)
+    if not event:
+      return
+    event = event.copy()
+    event.combinations = []
+    event.clear_balance()
+    self.guild.set_event(event)
+    await self.interface.print('Cleared combinations of drivers in event {0}.'.format(event.name))
+  
   async def clear_teams(self):
     if self.guild.teams.size() == 0:
       await self.interface.print('No {0} teams have been set.'.format(self.guild.name))
@@ -181,21 +215,45 @@ class BalanceBot:
     self.guild.clear_teams()
     await self.interface.print('Cleared {0} teams.'.format(self.guild.name))
   
+  def current_event_gaps(self):
+    return {name: self.guild.driver_collection(event.balance).irating_gap() for name, event in self.guild.events.items()}
+  
+  def current_gap(self):
+    if self.guild.teams.size() > 0:
+      return self.guild.teams.irating_gap()
+    return self.guild.balance.irating_gap()
+  
+  def days_until_event(self):
+    event_date = self.get_event_date()
+    if event_date and event_date > dt.now():
+      return (event_date - dt.now()).days + 1
+    return DEFAULT_HORIZON_DAYS
+  
+  def describe_robustness(self, report, threshold, simulator):
+    description = 'over {0} simulated iRating drifts across {1} day(s), the median iRating gap is {2} and the 90th percentile gap is {3}'.format(
+      simulator.samples, simulator.days, round(report.median_gap, 2), round(report.p90_gap, 2))
+    if threshold:
+      description += ', and the gap stays inside the balance threshold ({0}) {1:.0%} of the time'.format(round(threshold, 2), report.probability_inside)
+    return description
+  
+  # Returns a tuple of the driver ID and a failure message, exactly one of which is None.
   async def find_driver_id(self, driver_name):
+    cached_id = self.identity_cache.find_id(driver_name)
+    if cached_id:
+      return cached_id, None
     response = await self.client._build_request(constants.URL_DRIVER_STATUS, {'searchTerms': driver_name})
     drivers_response_data = response.json()['searchRacers']
     if not drivers_response_data:
-      await self.interface.print('No driver was found with the name {0}. Please check if that is their exact name on iRacing - or add them with their iRacing ID.'.format(driver_name))
-      return
+      return None, 'No driver was found with the name {0}. Please check if that is their exact name on iRacing - or add them with their iRacing ID.'.format(driver_name)
     exact_matches = [int(data['custid']) for data in drivers_response_data if data['name'].replace('+', ' ') == driver_name]
     if not exact_matches:
-      await self.interface.print("Multiple drivers were found with the name {0}. Please check if the driver you're trying to add has a more specific name (maybe a digit at the end).".format(driver_name))
-      return
-    return exact_matches[0]
+      return None, "Multiple drivers were found with the name {0}. Please check if the driver you're trying to add has a more specific name (maybe a digit at the end).".format(driver_name)
+    self.identity_cache.remember(exact_matches[0], driver_name)
+    return exact_matches[0], None
    
   async def find_driver_irating(self, driver_id):
     if not self.quarter_number:
-      await self.update_quarter_number()
+      await self.refresh_quarter_number()
     try:
       event_results = await self.client.event_results(driver_id,
                                                       self.quarter_number,
@@ -220,8 +278,25 @@ class BalanceBot:
     return chart_data.current().value
   
   async def find_driver_name(self, driver_id):
+    cached_name = self.identity_cache.find_name(driver_id)
+    if cached_name:
+      return cached_name
     status = await self.client.driver_status(driver_id)
-    return status.name.replace('+', ' ') # Why does the client not do this, I ask you
+    driver_name = status.name.replace('+', ' ') # Why does the client not do this, I ask you
+    self.identity_cache.remember(driver_id, driver_name)
+    return driver_name
+  
+  async def find_event(self, name):
+    event = self.guild.events.get(name)
+    if not event:
+      await self.interface.print("No event named {0} was found. Use 'events' to list the events of {1}.".format(name, self.guild.name))
+    return event
+  
+  def get_event_date(self):
+    event_date_str = self.guild.monitoring_data.get('event_date')
+    if not event_date_str:
+      return None
+    return dt.strptime(event_date_str, EVENT_DATE_FORMAT)
   
   def get_monitoring_data(self):
     return self.guild.monitoring_data
@@ -231,15 +306,17 @@ class BalanceBot:
     quarters = [season.season_quarter for season in seasons]
     return quarters[0] # They should all be the same. Unless VLN enduro gets in the way or something.
   
+  def id_lists(collection):
+    return sorted(sorted(driver.id for driver in driver_set.drivers) for driver_set in collection.driver_sets)
+  
   def identify_driver(self, driver_identifier):
     if isinstance(driver_identifier, str):
       return Driver.find_by_name(self.guild.get_drivers(), driver_identifier)
     else:
       return Driver.find(self.guild.get_drivers(), driver_identifier)
         
-  def initialize_guild(self, guild_id):
-    data_store = self.data_store_class(guild_id)
-    self.guild = Guild(guild_id, data_store)
+  async def initialize_guild(self, guild_id):
+    self.guild = await self.guild_registry.load(guild_id)
   
   async def list_balance(self):
     if self.guild.balance.size() == 0:
@@ -265,6 +342,19 @@ class BalanceBot:
       message += '  {0}\n'.format(driver.print_format())
     await self.interface.print(message)
     
+  async def list_events(self):
+    if not self.guild.events:
+      await self.interface.print("No events have been added for {0}. Use 'add event' to add one.".format(self.guild.name))
+      return
+    message = 'Current events of {0}:\n'.format(self.guild.name)
+    for name, event in sorted(self.guild.events.items()):
+      team_sizes_str = ', '.join([str(team_size) for team_size in event.team_sizes]) or 'not set'
+      message += '  {0}: {1} driver(s), team sizes {2}, {3} combination(s)'.format(name, len(event.driver_ids), team_sizes_str, len(event.combinations))
+      if event.balance:
+        message += ', iRating gap {0}'.format(round(self.guild.driver_collection(event.balance).irating_gap(), 2))
+      message += '\n'
+    await self.interface.print(message)
+  
   async def list_team_sizes(self):
     if not self.guild.team_sizes:
       await self.interface.print('Team sizes have not been set for {0}.'.format(self.guild.name))
@@ -288,6 +378,36 @@ class BalanceBot:
     message += 'iRating gap between teams: {0}'.format(round(collection.irating_gap(), 2))
     await self.interface.print(message)
     
+  # Finds the best few balances, and ranks them by how likely they are to stay balanced until the event.
+  async def rank_balances(self, count=None):
+    if not RobustnessSimulator.available():
+      await self.interface.print('Ranking balances requires numpy, which is not installed.')
+      return
+    possible = await self.check_balance_possible(print_reason_not_possible=True)
+    if not possible:
+      return
+    count = min(count or RANKED_BALANCES, MAX_RANKED_BALANCES)
+    await self.interface.indicate_progress()
+    balancer = Balancer(self.guild.get_drivers(), self.guild.team_sizes, self.guild.combinations, keep=max(count, 2))
+    balances = await asyncio.get_event_loop().run_in_executor(SOLVER_EXECUTOR, balancer.best_balances)
+    simulator = RobustnessSimulator(self.days_until_event())
+    threshold = self.guild.balance_threshold
+    ranked = await asyncio.get_event_loop().run_in_executor(SOLVER_EXECUTOR, simulator.rank, balances[:count], threshold)
+    for rank, (balance, report) in enumerate(ranked, 1):
+      await self.print_collection(balance, 'Balance #{0} - {1}'.format(rank, self.describe_robustness(report, threshold, simulator)))
+  
+  # Returns why drivers can't be balanced into teams of the given sizes, or None if they can.
+  def reason_balance_not_possible(drivers_description, driver_count, team_sizes):
+    if driver_count == 0:
+      return 'No {0} drivers have been added.'.format(drivers_description)
+    if not team_sizes:
+      return 'Team sizes have not been set.'
+    if not driver_count >= min(team_sizes) * 2:
+      return 'There are not enough drivers to form teams of the specified size(s).'
+    if not Balancer.is_team_formation_possible(driver_count, team_sizes):
+      return 'It is not possible to form teams of the specified size(s) with {0} drivers.'.format(driver_count)
+    return None
+  
   async def recalculate_balance(self):
     if self.guild.teams.size() > 0:
       await self.print_collection(self.guild.teams, 'Current balance of {0} teams'.format(self.guild.name))
@@ -296,9 +416,8 @@ class BalanceBot:
     if not possible:
       return
     old_balance = self.guild.balance
-    balancer = Balancer(self.guild.get_drivers(), self.guild.team_sizes, self.guild.combinations)
     await self.interface.indicate_progress()
-    new_balance = balancer.optimal_balance()
+    new_balance = await self.solve_balance()
     self.guild.set_balance(new_balance)
     if self.guild.balance == old_balance:
       header = 'Optimal balance of {0} drivers'.format(self.guild.name)
@@ -318,13 +437,13 @@ class BalanceBot:
       await self.interface.print('No {0} drivers have changed iRating since their latest update.'.format(self.guild.name))
   
   async def recheck_driver_ratings(self, drivers, print_unchanged=True):
-    any_changed = False
+    changed_drivers = []
     for driver in drivers:
       await self.interface.indicate_progress()
       changed = await self.update_driver_irating(driver, print_unchanged=print_unchanged)
       if changed:
-        any_changed = True
-    return any_changed
+        changed_drivers.append(driver)
+    return changed_drivers
   
   async def recheck_ratings(self, driver_identifiers):
     if not self.guild.has_drivers():
@@ -339,6 +458,20 @@ class BalanceBot:
       drivers.append(driver)
     await self.recheck_driver_ratings(drivers, print_unchanged=True)
   
+  async def record_iratings(self, drivers):
+    records = [(driver.id, driver.irating) for driver in drivers]
+    await self.data_store_class.run_in_executor(lambda: [self.irating_history.append(*record) for record in records])
+  
+  # When sharded, only the first shard asks iRacing; the others pick up the quarter number it saves.
+  async def refresh_quarter_number(self):
+    if self.data_store_class.shard_id == 0:
+      await self.update_quarter_number()
+    else:
+      await self.reload_quarter_number()
+  
+  async def reload_quarter_number(self):
+    BalanceBot.quarter_number = await self.data_store_class.run_in_executor(self.data_store_class.load_quarter_number)
+  
   async def remove_combinations(self, collection):
     combinations = self.guild.combinations
     combinations_to_remove = []
@@ -370,6 +503,128 @@ class BalanceBot:
       self.guild.remove_driver(driver)
       await self.interface.print('Removed driver {0}. Fixed teams, calculated balance, and any combinations including this driver have been cleared.'.format(driver.name))
     
+  async def remove_event(self, name):
+    event = await self.find_event(name)
+    if not event:
+      return
+    self.guild.remove_event(event.name)
+    await self.interface.print('Removed event {0}.'.format(event.name))
+  
+  # Rebalances every event including one of the changed drivers. The events are solved together, so events
+  # with the same drivers, team sizes and combinations share a single search.
+  async def report_event_rebalances(self, changed_drivers, old_gaps):
+    changed_ids = set(driver.id for driver in changed_drivers)
+    events = [event for event in self.guild.events.values() if event.has_any_driver(changed_ids)]
+    events = [event for event in events if not BalanceBot.reason_balance_not_possible(event.name, len(event.driver_ids), event.team_sizes)]
+    if not events:
+      return
+    await self.interface.indicate_progress()
+    new_balances = await asyncio.gather(*[self.solve_event_balance(event) for event in events])
+    threshold = self.guild.balance_threshold
+    for event, new_balance in zip(events, new_balances):
+      if new_balance is None:
+        continue
+      old_gap = old_gaps.get(event.name, 0)
+      new_gap = new_balance.irating_gap()
+      changed = self.set_event_balance(event, new_balance)
+      outside_threshold = ', and the iRating gap is outside of the balance threshold ({0})'.format(round(threshold, 2)) if threshold and new_gap > threshold else ''
+      if changed:
+        await self.print_collection(new_balance, 'The optimal balance of event {0} has changed{1}'.format(event.name, outside_threshold))
+      elif outside_threshold:
+        await self.print_collection(new_balance, 'The optimal balance of event {0} has not changed{1}'.format(event.name, outside_threshold))
+      else:
+        await self.interface.print('The optimal balance of event {0} has not changed.\nThe iRating gap has changed from {1} to {2}.'.format(event.name, round(old_gap, 2), round(new_gap, 2)))
+  
+  # Rebalances after iRatings have changed, and reports how the balance or fixed teams' gap has moved from old_gap.
+  async def report_rebalance(self, old_gap):
+    threshold = self.guild.balance_threshold
+    if self.guild.teams.size() > 0:
+      new_gap = self.guild.teams.irating_gap()
+      if threshold and new_gap > threshold:
+        verb = 'remains' if old_gap > threshold else 'has moved'
+        message = "**WARNING**: The iRating gap of the fixed teams {0} outside of the balance threshold ({1})".format(verb, round(threshold, 2))
+        teams_to_show = self.guild.teams
+      else:
+        message = "The iRating gap of the fixed teams has changed from {0} to {1}.".format(round(old_gap, 2), round(new_gap, 2))
+        teams_to_show = None
+    else:
+      possible = await self.check_balance_possible(print_reason_not_possible=False)
+      if not possible:
+        return
+      old_balance = self.guild.balance
+      await self.interface.indicate_progress()
+      new_balance = await self.solve_balance()
+      self.guild.set_balance(new_balance)
+      new_gap = new_balance.irating_gap()
+      if new_balance == old_balance:
+        if threshold:
+          if new_gap > threshold:
+            if old_gap > threshold:
+              conjunction, verb = 'and', 'remains'
+            else:
+              conjunction, verb = 'but', 'has moved'
+            message = "The optimal balance of team members has not changed, {0} the iRating gap {1} outside of the balance threshold ({2})".format(conjunction, verb, round(threshold, 2))
+            teams_to_show = new_balance
+          else:
+            message = "The optimal balance of team members has not changed.\nThe iRating gap has changed from {0} to {1}, which is inside the balance threshold ({2}).".format(round(old_gap, 2), round(new_gap, 2), round(threshold, 2))
+            teams_to_show = None
+        else:
+          message = "The optimal balance of team members has not changed.\nThe iRating gap has changed from {0} to {1}.".format(round(old_gap, 2), round(new_gap, 2))
+          teams_to_show = None
+      else:
+        teams_to_show = new_balance
+        if threshold:
+          if new_gap > threshold:
+            if old_gap > threshold:
+              conjunction, verb = 'but', 'remains'
+            else:
+              conjunction, verb = 'and', 'has moved'
+            message = "The optimal balance of team members has changed, {0} the iRating gap {1} outside of the balance threshold ({2})".format(conjunction, verb, round(threshold, 2))
+          else:
+            if old_gap > threshold:
+              conjunction, verb = 'and', 'has moved'
+            else:
+              conjunction, verb = 'but', 'remains'
+            message = "The optimal balance of team members has changed, {0} the iRating gap {1} inside the balance threshold ({2})".format(conjunction, verb, round(threshold, 2))
+        else:
+          message = "The optimal balance of team members has changed"
+    if teams_to_show:
+      await self.print_collection(teams_to_show, message)
+    else:
+      await self.interface.print(message)
+  
+  # Returns a tuple of the driver to add and a failure message, exactly one of which is None.
+  async def resolve_new_driver(self, driver_identifier, lookup_slots):
+    async with lookup_slots:
+      try:
+        if isinstance(driver_identifier, str):
+          driver_name = driver_identifier
+          if Driver.find_by_name(self.guild.get_drivers(), driver_name):
+            return None, 'Driver {0} has already been added.'.format(driver_name)
+          driver_id, failure = await self.find_driver_id(driver_name)
+          if failure:
+            return None, failure
+        else:
+          driver_id = driver_identifier
+          if Driver.find(self.guild.get_drivers(), driver_id):
+            return None, 'Driver with iRacing ID {0} has already been added.'.format(driver_id)
+          driver_name = await self.find_driver_name(driver_id)
+          if not driver_name:
+            return None, 'No driver was found with the iRacing ID {0}.'.format(driver_id)
+          if Driver.find_by_name(self.guild.get_drivers(), driver_name):
+            return None, 'Driver {0} has already been added.'.format(driver_name)
+        driver_irating = await self.find_driver_irating(driver_id)
+      except Exception:
+        logging.exception('Error looking up driver {0}'.format(driver_identifier))
+        return None, 'Sorry, I encountered an error looking up {0}.'.format(driver_identifier)
+    return Driver(driver_id, driver_name, driver_irating), None
+  
+  async def save_guild(self):
+    saves = self.guild.pending_saves()
+    if saves:
+      with span('save_guild', fields=len(saves)):
+        await self.data_store_class.run_in_executor(lambda: [save(value) for save, value in saves])
+  
   async def set_balance_threshold(self, threshold_value):
     if not isinstance(threshold_value, int):
       await self.interface.print('Balance threshold must be an integer.')
@@ -380,6 +635,60 @@ class BalanceBot:
     self.guild.set_balance_threshold(threshold_value)
     await self.interface.print('Set balance threshold for {0} to {1}.'.format(self.guild.name, threshold_value))
   
+  # Stores a newly calculated balance for an event. Returns whether it differs from the event's previous balance.
+  def set_event_balance(self, event, balance):
+    balance_ids = BalanceBot.id_lists(balance)
+    if balance_ids == event.balance:
+      return False
+    event = event.copy()
+    event.balance = balance_ids
+    self.guild.set_event(event)
+    return True
+  
+  async def set_event_date(self, event_date_str):
+    try:
+      dt.strptime(event_date_str, EVENT_DATE_FORMAT)
+    except ValueError:
+      await self.interface.print('Event date must be given as YYYY-MM-DD.')
+      return
+    monitoring_data = dict(self.guild.monitoring_data)
+    monitoring_data['event_date'] = event_date_str
+    self.guild.set_monitoring_data(monitoring_data)
+    await self.interface.print('Set event date for {0} to {1}. I will check iRatings more often in the days leading up to it.'.format(self.guild.name, event_date_str))
+  
+  async def set_event_drivers(self, name, driver_identifiers):
+    event = await self.find_event(name)
+    if not event:
+      return
+    drivers = []
+    for driver_identifier in driver_identifiers:
+      driver = self.identify_driver(driver_identifier)
+      if not driver:
+        await self.alert_driver_does_not_exist(driver_identifier)
+        return
+      if driver in drivers:
+        await self.alert_driver_already_specified(driver.name)
+        return
+      drivers.append(driver)
+    event = event.copy()
+    event.set_driver_ids([driver.id for driver in drivers])
+    self.guild.set_event(event)
+    await self.interface.print('Set {0} driver(s) for event {1}: {2}.'.format(len(drivers), event.name, ', '.join([driver.name for driver in drivers])))
+  
+  async def set_event_team_sizes(self, name, team_sizes):
+    event = await self.find_event(name)
+    if not event:
+      return
+    message = BalanceBot.team_sizes_error(team_sizes)
+    if message:
+      await self.interface.print(message)
+      return
+    event = event.copy()
+    event.team_sizes = sorted(team_sizes)
+    event.clear_balance()
+    self.guild.set_event(event)
+    await self.interface.print('Set team sizes for event {0} to {1}.'.format(event.name, ', '.join([str(team_size) for team_size in event.team_sizes])))
+  
   def set_guild_name(self, name):
     self.guild.set_name(name)
   
@@ -390,13 +699,10 @@ class BalanceBot:
     self.guild.set_monitoring_data(data)
   
   async def set_team_sizes(self, team_sizes):
-    if not team_sizes:
-      await self.interface.print('No valid team sizes specified. Team sizes must be integers between 2 and 10.')
+    message = BalanceBot.team_sizes_error(team_sizes)
+    if message:
+      await self.interface.print(message)
       return
-    for team_size in team_sizes:
-      if not team_size >= 2 and team_size <= 10:
-        await self.interface.print('Team size {0} is not valid. Team sizes must be integers between 2 and 10.'.format(str(team_size)))
-        return
     team_sizes.sort()
     self.guild.set_team_sizes(team_sizes)
     team_sizes_str = ', '.join([str(team_size) for team_size in team_sizes])
@@ -437,6 +743,65 @@ class BalanceBot:
       return
     await self.interface.print('Balance threshold for {0} has been set to {1}.'.format(self.guild.name, threshold))
   
+  async def show_event_balance(self, name):
+    event = await self.find_event(name)
+    if not event:
+      return
+    reason = BalanceBot.reason_balance_not_possible(event.name, len(event.driver_ids), event.team_sizes)
+    if reason:
+      await self.interface.print(reason)
+      return
+    await self.interface.indicate_progress()
+    new_balance = await self.solve_event_balance(event)
+    if new_balance is None:
+      await self.interface.print('No balance of event {0} satisfies its driver combinations.'.format(event.name))
+      return
+    self.set_event_balance(event, new_balance)
+    await self.print_collection(new_balance, 'Optimal balance of event {0}'.format(event.name))
+  
+  async def show_event_date(self):
+    event_date_str = self.guild.monitoring_data.get('event_date')
+    if not event_date_str:
+      await self.interface.print('Event date has not been set for {0}.'.format(self.guild.name))
+      return
+    await self.interface.print('Event date for {0} has been set to {1}.'.format(self.guild.name, event_date_str))
+  
+  async def show_history(self, days=None):
+    days = days or DEFAULT_HISTORY_DAYS
+    if not self.guild.has_drivers():
+      await self.interface.print('No {0} drivers have been added.'.format(self.guild.name))
+      return
+    since = time.time() - days * 24 * 60 * 60
+    drivers = self.guild.get_drivers()
+    driver_ids = [driver.id for driver in drivers]
+    histories = await self.data_store_class.run_in_executor(lambda: [self.irating_history.history(driver_id, since) for driver_id in driver_ids])
+    message = 'iRating history of {0} drivers over the last {1} day(s):\n'.format(self.guild.name, days)
+    for driver, (baseline, records) in sorted(zip(drivers, histories), key=lambda pair: pair[0].irating, reverse=True):
+      if not records:
+        message += '  {0}: {1} (no change)\n'.format(driver.name, driver.irating)
+        continue
+      start = baseline[1] if baseline else records[0][1]
+      end = records[-1][1]
+      change_count = len(records) if baseline else len(records) - 1 # Without a baseline, the first record is where the driver was added.
+      message += '  {0}: {1} to {2} ({3:+d}, {4} change(s))\n'.format(driver.name, start, end, end - start, change_count)
+    await self.interface.print(message)
+  
+  async def show_robustness(self):
+    if not RobustnessSimulator.available():
+      await self.interface.print('Robustness analysis requires numpy, which is not installed.')
+      return
+    if self.guild.teams.size() > 0:
+      collection, description = self.guild.teams, 'fixed teams'
+    elif self.guild.balance.size() > 0:
+      collection, description = self.guild.balance, 'current optimal balance'
+    else:
+      await self.interface.print('There are no fixed teams or calculated balance of {0} drivers to analyse.'.format(self.guild.name))
+      return
+    await self.interface.indicate_progress()
+    simulator = RobustnessSimulator(self.days_until_event())
+    report = await asyncio.get_event_loop().run_in_executor(SOLVER_EXECUTOR, simulator.analyse, collection, self.guild.balance_threshold)
+    await self.interface.print('For the {0} of {1} drivers: {2}.'.format(description, self.guild.name, self.describe_robustness(report, self.guild.balance_threshold, simulator)))
+  
   async def show_status(self):
     message_parts = []
     message_parts.append('Current status of data for {0}:'.format(self.guild.name))
@@ -471,19 +836,39 @@ class BalanceBot:
     message = '\n'.join(message_parts)
     await self.interface.print(message)
     
+  async def solve_balance(self):
+    return await BalanceBot.solver.solve(self.guild.get_drivers(), self.guild.team_sizes, self.guild.combinations)
+  
+  async def solve_event_balance(self, event):
+    combinations = self.guild.driver_collection(event.combinations)
+    return await BalanceBot.solver.solve(self.guild.event_drivers(event), event.team_sizes, combinations)
+  
+  # Returns why the given team sizes are not valid, or None if they are.
+  def team_sizes_error(team_sizes):
+    if not team_sizes:
+      return 'No valid team sizes specified. Team sizes must be integers between {0} and {1}.'.format(MIN_TEAM_SIZE, MAX_TEAM_SIZE)
+    for team_size in team_sizes:
+      if not MIN_TEAM_SIZE <= team_size <= MAX_TEAM_SIZE:
+        return 'Team size {0} is not valid. Team sizes must be integers between {1} and {2}.'.format(team_size, MIN_TEAM_SIZE, MAX_TEAM_SIZE)
+    return None
+  
   async def update_driver_irating(self, driver, print_unchanged=False):
-    new_irating = await self.find_driver_irating(driver.id)
+    with span('fetch_irating', cust_id=driver.id):
+      new_irating = await self.find_driver_irating(driver.id)
     if new_irating != driver.irating:
       await self.interface.print("The iRating of driver {0} has changed from {1} to {2}.".format(driver.name, driver.irating, new_irating))
       driver.irating = new_irating
       self.guild.save_driver(driver)
+      await self.record_iratings([driver])
+      if self.rating_events:
+        self.rating_events.publish(driver.id, new_irating, self.guild.get_id())
       return True
     elif print_unchanged:
       await self.interface.print("The iRating of driver {0} has not changed since the most recently cached update ({1}).".format(driver.name, driver.last_updated))
     return False
   
   async def update_quarter_number(self):
-    self.quarter_number = await self.get_quarter_number()
-    self.data_store_class.save_quarter_number(self.quarter_number)
+    BalanceBot.quarter_number = await self.get_quarter_number()
+    await self.data_store_class.run_in_executor(self.data_store_class.save_quarter_number, BalanceBot.quarter_number)
     
   
\ No newline at end of file
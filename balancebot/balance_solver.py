@@ -0,0 +1,86 @@
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import time
+
+from balancebot.balancer          import Balancer
+from balancebot.driver            import Driver
+from balancebot.driver_collection import DriverCollection
+from balancebot.driver_set        import DriverSet
+from balancebot.metrics           import Histogram
+from balancebot.tracing           import span
+
+RESULT_CACHE_SIZE  = 256
+SOLVE_NODE_BUCKETS = (10, 100, 1000, 10000, 100000, 1000000, 10000000)
+SOLVER_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix='balancer') # Keeps searches off the event loop, and off the data executor.
+
+# Runs balance searches in the background, sharing a single search between every request for the same roster.
+# Rosters are identified by a fingerprint of driver IDs and iRatings, team sizes and combinations, so a request
+# made while an identical search is in flight (from a command, a background recheck, or another guild with the
+# same roster) waits for that search instead of starting its own. Results of the most recent searches are kept too,
+# so events and guilds with the same roster reuse them until an iRating changes.
+class BalanceSolver:
+  def __init__(self, cache_size=RESULT_CACHE_SIZE):
+    self.cache_size = cache_size
+    self.cached_searches = 0
+    self.durations = Histogram()
+    self.nodes = Histogram(SOLVE_NODE_BUCKETS)
+    self.searches = 0
+    self.shared_searches = 0
+    self._in_flight = {}
+    self._results = OrderedDict()
+  
+  def fingerprint(drivers, team_sizes, combinations):
+    return (tuple(sorted((driver.id, driver.irating) for driver in drivers)),
+            tuple(sorted(team_sizes)),
+            tuple(sorted(tuple(sorted(driver.id for driver in driver_set.drivers)) for driver_set in combinations.driver_sets)))
+  
+  def remember(self, key, search):
+    if search.cancelled() or search.exception():
+      return
+    self._results[key] = search.result()
+    self._results.move_to_end(key)
+    while len(self._results) > self.cache_size:
+      self._results.popitem(last=False)
+  
+  # Maps a search result back onto the requester's own driver objects, since each guild keeps and updates its own.
+  def rebind(collection, drivers):
+    if collection is None:
+      return None
+    drivers_by_id = {driver.id: driver for driver in drivers}
+    rebound = DriverCollection()
+    for driver_set in collection.driver_sets:
+      rebound_set = DriverSet()
+      for driver in driver_set.drivers:
+        rebound_set.add_driver(drivers_by_id[driver.id])
+      rebound.add_driver_set(rebound_set)
+    return rebound
+  
+  def search(self, drivers, team_sizes, combinations):
+    balancer = Balancer(drivers, team_sizes, combinations)
+    started_at = time.perf_counter()
+    balance = balancer.optimal_balance()
+    self.durations.observe(time.perf_counter() - started_at)
+    self.nodes.observe(balancer.nodes_searched)
+    return balance
+  
+  async def solve(self, drivers, team_sizes, combinations):
+    drivers = list(drivers)
+    key = BalanceSolver.fingerprint(drivers, team_sizes, combinations)
+    if key in self._results:
+      self.cached_searches += 1
+      self._results.move_to_end(key)
+      return BalanceSolver.rebind(self._results[key], drivers)
+    search = self._in_flight.get(key)
+    with span('solve', drivers=len(drivers), shared=search is not None):
+      if search:
+        self.shared_searches += 1
+      else:
+        self.searches += 1
+        snapshot = [Driver(driver.id, driver.name, driver.irating, driver.last_updated) for driver in drivers] # Not changed under the search.
+        search = asyncio.get_event_loop().run_in_executor(SOLVER_EXECUTOR, self.search, snapshot, list(team_sizes), combinations)
+        self._in_flight[key] = search
+        search.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        search.add_done_callback(lambda _: self.remember(key, search))
+      balance = await asyncio.shield(search) # One requester being cancelled shouldn't cancel the search for the others.
+    return BalanceSolver.rebind(balance, drivers)
@@ -4,7 +4,7 @@ from balancebot.driver_set        import DriverSet
 from balancebot.driver_collection import DriverCollection
 
 class Balancer:
-  def __init__(self, drivers, team_sizes, combinations):
+  def __init__(self, drivers, team_sizes, combinations, keep=1):
     if isinstance(drivers, DriverSet):
       self.drivers = list(drivers.drivers)
     elif isinstance(drivers, set):
@@ -17,6 +17,16 @@ class Balancer:
     
     self.best_collection = None
     self.best_collection_gap = None
+    self.best_collections = {} # Collection -> gap, for the `keep` best collections. Only used when keeping more than one.
+    self.keep = keep
+    self.nodes_searched = 0
+  
+  # Returns up to `keep` distinct collections, best balanced first.
+  def best_balances(self):
+    self.optimal_balance()
+    if self.keep == 1:
+      return [self.best_collection] if self.best_collection else []
+    return sorted(self.best_collections, key=self.best_collections.get)
   
   def optimal_balance(self):
     for size_pattern in Balancer.possible_size_patterns(self.driver_count, self.team_sizes):
@@ -28,10 +38,13 @@ class Balancer:
     team_size = remaining_size_pattern[0]
     for driver_set in Balancer.unique_driver_sets(remaining_drivers, team_size):
       if Balancer.driver_set_respects_combinations(driver_set, self.combinations):
+        self.nodes_searched += 1
         new_collection = current_collection.copy()
         new_collection.add_driver_set(driver_set)
         new_size_pattern = remaining_size_pattern[1:]
         if len(new_size_pattern) == 0:
+          if self.keep > 1:
+            self.remember_collection(new_collection)
           if self.best_collection_gap == None or new_collection.irating_gap() < self.best_collection_gap:
             self.best_collection = new_collection
             self.best_collection_gap = new_collection.irating_gap()
@@ -40,6 +53,17 @@ class Balancer:
         self.search_possible_collections(new_collection, new_remaining_drivers, new_size_pattern)
   
   
+  def remember_collection(self, collection):
+    if collection in self.best_collections:
+      return # Teams of the same size can be found in either order.
+    gap = collection.irating_gap()
+    if len(self.best_collections) >= self.keep:
+      worst = max(self.best_collections, key=self.best_collections.get)
+      if gap >= self.best_collections[worst]:
+        return
+      del self.best_collections[worst]
+    self.best_collections[collection] = gap
+  
   def possible_size_patterns(driver_count, team_sizes):
     patterns = []
     # Find the maximum number of driver_sets. Note // for floor division
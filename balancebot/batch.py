@@ -0,0 +1,124 @@
+from collections import OrderedDict
+import csv
+import json
+import os
+import time
+
+from balancebot.balance_bot       import BalanceBot
+from balancebot.balance_solver    import BalanceSolver
+from balancebot.balancer          import Balancer
+from balancebot.driver            import Driver
+from balancebot.driver_collection import DriverCollection
+from balancebot.driver_set        import DriverSet
+
+CSV_LIST_SEPARATOR = ';'
+
+# Rosters for balancing outside Discord. Each roster is a dict with a name, team sizes, drivers as (id, name, iRating)
+# and combinations as lists of driver IDs, so it can be passed to worker processes as it is.
+
+def load_rosters(path):
+  if path.endswith('.csv'):
+    return load_csv_rosters(path)
+  with open(path) as file:
+    data = json.load(file)
+  rosters = data if isinstance(data, list) else [data]
+  default_name = os.path.splitext(os.path.basename(path))[0]
+  return [roster_from_json(roster, '{0}[{1}]'.format(default_name, index) if len(rosters) > 1 else default_name) for index, roster in enumerate(rosters)]
+
+def roster_from_json(data, default_name):
+  return {
+    'name': data.get('name', default_name),
+    'team_sizes': [int(size) for size in data.get('team_sizes', [])],
+    'drivers': [(int(driver['id']), driver.get('name'), driver.get('irating')) for driver in data.get('drivers', [])],
+    'combinations': [[int(cust_id) for cust_id in combination] for combination in data.get('combinations', [])],
+  }
+
+# One driver per row, with columns roster (optional), id, name, irating, team_sizes and combination. Team sizes are
+# semicolon-separated and may be given on any row of the roster; drivers with the same combination label are kept together.
+def load_csv_rosters(path):
+  default_name = os.path.splitext(os.path.basename(path))[0]
+  rosters = OrderedDict()
+  with open(path, newline='') as file:
+    for row in csv.DictReader(file):
+      name = row.get('roster') or default_name
+      roster = rosters.setdefault(name, {'name': name, 'team_sizes': [], 'drivers': [], 'combinations': OrderedDict()})
+      if row.get('team_sizes') and not roster['team_sizes']:
+        roster['team_sizes'] = [int(size) for size in row['team_sizes'].split(CSV_LIST_SEPARATOR) if size.strip()]
+      irating = row.get('irating')
+      roster['drivers'].append((int(row['id']), row.get('name') or None, int(irating) if irating else None))
+      if row.get('combination'):
+        roster['combinations'].setdefault(row['combination'], []).append(int(row['id']))
+  for roster in rosters.values():
+    roster['combinations'] = list(roster['combinations'].values())
+  return list(rosters.values())
+
+# Fills in driver names missing from a roster from the bot's driver name cache.
+def fill_names(roster, identity_cache):
+  drivers = []
+  for cust_id, name, irating in roster['drivers']:
+    drivers.append((cust_id, name or identity_cache.find_name(cust_id) or str(cust_id), irating))
+  return dict(roster, drivers=drivers)
+
+def build_inputs(roster):
+  drivers = [Driver(cust_id, name, irating) for cust_id, name, irating in roster['drivers']]
+  combinations = DriverCollection()
+  for combination in roster['combinations']:
+    driver_set = DriverSet()
+    for cust_id in combination:
+      driver_set.add_driver(Driver.find(drivers, cust_id))
+    combinations.add_driver_set(driver_set)
+  return drivers, roster['team_sizes'], combinations
+
+def fingerprint(roster):
+  drivers, team_sizes, combinations = build_inputs(roster)
+  return BalanceSolver.fingerprint(drivers, team_sizes, combinations)
+
+# Returns the reason a roster cannot be balanced, or None. Team sizes and driver counts are checked as the bot checks them.
+def validation_error(roster):
+  ids = [cust_id for cust_id, _, _ in roster['drivers']]
+  missing = [str(cust_id) for cust_id, _, irating in roster['drivers'] if irating is None]
+  if missing:
+    return 'No iRating given for driver(s) {0}.'.format(', '.join(missing))
+  if len(set(ids)) != len(ids):
+    return 'Drivers are listed more than once.'
+  unknown = [str(cust_id) for combination in roster['combinations'] for cust_id in combination if cust_id not in ids]
+  if unknown:
+    return 'Combinations include driver(s) {0} who are not on the roster.'.format(', '.join(unknown))
+  combined = [cust_id for combination in roster['combinations'] for cust_id in combination]
+  repeated = sorted(set(str(cust_id) for cust_id in combined if combined.count(cust_id) > 1))
+  if repeated:
+    return 'Driver(s) {0} are in more than one combination.'.format(', '.join(repeated))
+  if roster['team_sizes']:
+    error = BalanceBot.team_sizes_error(roster['team_sizes'])
+    if error:
+      return error
+  return BalanceBot.reason_balance_not_possible(roster['name'], len(ids), roster['team_sizes'])
+
+# Runs in a worker process.
+def solve_roster(roster):
+  error = validation_error(roster)
+  if error:
+    return {'roster': roster['name'], 'error': error}
+  started_at = time.perf_counter()
+  drivers, team_sizes, combinations = build_inputs(roster)
+  balancer = Balancer(drivers, team_sizes, combinations)
+  balance = balancer.optimal_balance()
+  return dict({'roster': roster['name']}, **balance_result(balance), nodes=balancer.nodes_searched, seconds=round(time.perf_counter() - started_at, 6))
+
+def balance_result(balance):
+  if balance is None:
+    return {'error': 'No arrangement of teams respects the combinations.'}
+  return {
+    'irating_gap': round(balance.irating_gap(), 2),
+    'teams': [{'average_irating': round(driver_set.average_irating(), 2),
+               'drivers': [{'id': driver.id, 'name': driver.name, 'irating': driver.irating} for driver in driver_set.ordered_drivers()]}
+              for driver_set in balance.ordered_driver_sets()],
+  }
+
+# Labels a result shared between identical rosters with the given roster's own name and driver names.
+def with_roster_names(result, roster):
+  names = {cust_id: name for cust_id, name, _ in roster['drivers']}
+  result = dict(result, roster=roster['name'])
+  if 'teams' in result:
+    result['teams'] = [dict(team, drivers=[dict(driver, name=names[driver['id']]) for driver in team['drivers']]) for team in result['teams']]
+  return result
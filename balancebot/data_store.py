@@ -1,29 +1,50 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import contextlib
 from datetime import datetime as dt
 from enum import Enum
+import functools
 import json
 import logging
 import os
 import pathlib
+import shutil
+import tempfile
+try:
+  import fcntl
+except ImportError: # Not available on Windows, where only a single process is supported.
+  fcntl = None
 
 from balancebot.driver            import Driver
 from balancebot.driver_set        import DriverSet
 from balancebot.driver_collection import DriverCollection
+from balancebot.sharding          import is_own_guild
 
 DATA_DIRECTORY = 'data'
-DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S' # Only used by the legacy drivers format.
+DRIVERS_FORMAT_VERSION = 2
 FILE_EXT = '.json'
 
+# A single worker keeps writes in the order they were made, and off the event loop.
+EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix='data_store')
+
 class FileName(Enum):
   balance           = 'balance'
   balance_threshold = 'balance_threshold'
   combinations      = 'combinations'
+  driver_identities = 'driver_identities'
   drivers           = 'drivers'
+  events            = 'events'
+  monitored_guilds  = 'monitored_guilds'
   monitoring_data   = 'monitoring_data'
   quarter_number    = 'quarter_number'
   team_sizes        = 'team_sizes'
   teams             = 'teams'
 
 class DataStore:
+  shard_id = 0
+  shard_count = 1
+  
   def __init__(self, guild_id):
     self.guild_id = guild_id
     
@@ -31,34 +52,70 @@ class DataStore:
     self.balance_threshold_file = self.guild_file_path(FileName.balance_threshold.value)
     self.combinations_file      = self.guild_file_path(FileName.combinations.value)
     self.drivers_file           = self.guild_file_path(FileName.drivers.value)
+    self.events_file            = self.guild_file_path(FileName.events.value)
     self.monitoring_data_file   = self.guild_file_path(FileName.monitoring_data.value)
     self.team_sizes_file        = self.guild_file_path(FileName.team_sizes.value)
     self.teams_file             = self.guild_file_path(FileName.teams.value)
-    
-    if not self.is_data_initialized():
-      self.initialize_data()
   
   def data_subdirectory_numbers():
     return [int(file.name) for file in os.scandir(DATA_DIRECTORY) if file.is_dir()]
   
+  def guild_ids():
+    return [guild_id for guild_id in DataStore.data_subdirectory_numbers() if is_own_guild(guild_id, DataStore.shard_id, DataStore.shard_count)]
+  
+  # Restricts this process to the guilds of one shard. Guild files are only ever written by their own shard's process,
+  # and files shared between shards are either per-shard or written under a file lock.
+  def configure_shard(shard_id, shard_count):
+    DataStore.shard_id = shard_id
+    DataStore.shard_count = shard_count
+  
+  @contextlib.contextmanager
+  def file_lock(file_name):
+    if not fcntl:
+      yield
+      return
+    pathlib.Path(DATA_DIRECTORY).mkdir(exist_ok=True)
+    with open(os.path.join(DATA_DIRECTORY, file_name + '.lock'), 'w') as lock_file:
+      fcntl.flock(lock_file, fcntl.LOCK_EX)
+      try:
+        yield
+      finally:
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+  
   def guild_dir_path(self):
     return os.path.join(DATA_DIRECTORY, str(self.guild_id))
   
   def guild_file_path(self, file_name):
     return os.path.join(self.guild_dir_path(), file_name + FILE_EXT)
   
-  def is_data_initialized(self):
-    return os.path.isdir(self.guild_dir_path())
-  
-  def initialize_data(self):
-    pathlib.Path(self.guild_dir_path()).mkdir()
-    self.save_balance(DriverCollection())
-    self.save_balance_threshold(None)
-    self.save_monitoring_data({})
-    self.save_combinations(DriverCollection())
-    self.save_drivers(DriverSet())
-    self.save_team_sizes([])
-    self.save_teams(DriverCollection())
+  # Guilds which have a notification channel and drivers, i.e. which background rechecks need to visit.
+  # Built from the guild files the first time it is needed, then kept up to date as guilds are saved.
+  def monitored_guild_ids():
+    file_path = DataStore.monitored_guilds_file_path()
+    guild_ids = DataStore.json_load_file(file_path, None)
+    if guild_ids is None:
+      guild_ids = [guild_id for guild_id in DataStore.guild_ids() if DataStore(guild_id).is_monitored()]
+      DataStore.json_write_file(file_path, guild_ids)
+    return guild_ids
+  
+  def is_monitored(self):
+    has_channel = self.load_monitoring_data().get('channel_id') is not None
+    return has_channel and self.load_drivers().size() > 0
+  
+  def save_monitored(self, monitored):
+    guild_ids = set(DataStore.monitored_guild_ids())
+    if (self.guild_id in guild_ids) == monitored:
+      return
+    if monitored:
+      guild_ids.add(self.guild_id)
+    else:
+      guild_ids.discard(self.guild_id)
+    DataStore.json_write_file(DataStore.monitored_guilds_file_path(), sorted(guild_ids))
+  
+  def monitored_guilds_file_path():
+    if DataStore.shard_count == 1:
+      return DataStore.global_file_path(FileName.monitored_guilds.value)
+    return DataStore.global_file_path('{0}.shard{1}of{2}'.format(FileName.monitored_guilds.value, DataStore.shard_id, DataStore.shard_count))
     
   # Data access methods below sorted by data type rather than name of method.
   
@@ -80,8 +137,19 @@ class DataStore:
   def save_combinations(self, combinations):
     DataStore.save_driver_collection(self.combinations_file, combinations)
   
+  # Drivers are stored column-wise, with last updated times as epoch seconds:
+  # {"version": 2, "ids": [...], "names": [...], "iratings": [...], "last_updated": [...]}
+  # Files in the legacy format ({id: [name, irating, "YYYY-mm-dd HH:MM:SS"]}) are read as well, and upgraded on the next save.
   def load_drivers(self):
     data = DataStore.json_load_file(self.drivers_file, {})
+    if data.get('version') != DRIVERS_FORMAT_VERSION:
+      return DataStore.load_legacy_drivers(data)
+    drivers = DriverSet()
+    for id, name, irating, last_updated in zip(data['ids'], data['names'], data['iratings'], data['last_updated']):
+      drivers.add_driver(Driver(id, name, irating, last_updated=dt.fromtimestamp(last_updated)))
+    return drivers
+  
+  def load_legacy_drivers(data):
     drivers = DriverSet()
     for id, attrs in data.items():
       name, irating, last_updated_str = attrs
@@ -90,12 +158,23 @@ class DataStore:
     return drivers
   
   def save_drivers(self, driver_set):
-    data = {}
-    for driver in driver_set.drivers:
-      last_updated_str = dt.strftime(driver.last_updated, DATETIME_FORMAT)
-      data[driver.id] = [driver.name, driver.irating, last_updated_str]
-    DataStore.json_write_file(self.drivers_file, data) 
+    drivers = list(driver_set.drivers)
+    data = {
+      'version':      DRIVERS_FORMAT_VERSION,
+      'ids':          [driver.id for driver in drivers],
+      'names':        [driver.name for driver in drivers],
+      'iratings':     [driver.irating for driver in drivers],
+      'last_updated': [int(driver.last_updated.timestamp()) for driver in drivers],
+    }
+    DataStore.json_write_file(self.drivers_file, data)
     
+  # {name: {"drivers": [id, ...], "team_sizes": [...], "combinations": [[id, ...], ...], "balance": [[id, ...], ...]}}
+  def load_events(self):
+    return DataStore.json_load_file(self.events_file, {})
+  
+  def save_events(self, data):
+    DataStore.json_write_file(self.events_file, data)
+  
   def load_monitoring_data(self):
     return DataStore.json_load_file(self.monitoring_data_file, {})
   
@@ -103,7 +182,7 @@ class DataStore:
     DataStore.json_write_file(self.monitoring_data_file, data)
   
   def load_team_sizes(self):
-    return DataStore.json_load_simple_key(self.team_sizes_file, FileName.team_sizes.value)
+    return DataStore.json_load_simple_key(self.team_sizes_file, FileName.team_sizes.value) or []
     
   def save_team_sizes(self, team_sizes):
     return DataStore.json_write_simple_key(self.team_sizes_file, FileName.team_sizes.value, team_sizes)
@@ -124,7 +203,8 @@ class DataStore:
       with open(filename, 'r') as file:
         return json.load(file)
     except json.JSONDecodeError:
-      logging.warning('Error parsing JSON file.')
+      logging.error('Error parsing JSON file {0}. Keeping a copy at {0}.corrupt and using defaults.'.format(filename))
+      shutil.copyfile(filename, filename + '.corrupt')
       return fallback
       
   def json_load_simple_key(filename, key):
@@ -132,9 +212,22 @@ class DataStore:
     value = data.get(key)
     return value
   
+  # Writes to a temporary file first, so that a crash mid-write leaves the previous contents intact.
+  # Guild directories are created by their first write.
   def json_write_file(filename, data):
-    with open(filename, 'w') as file:
-      json.dump(data, file)
+    directory, basename = os.path.split(filename)
+    pathlib.Path(directory).mkdir(parents=True, exist_ok=True)
+    file_descriptor, temp_filename = tempfile.mkstemp(dir=directory, prefix='.' + basename, suffix='.tmp')
+    try:
+      with os.fdopen(file_descriptor, 'w') as file:
+        json.dump(data, file)
+        file.flush()
+        os.fsync(file.fileno())
+      os.replace(temp_filename, filename)
+    except:
+      if os.path.exists(temp_filename):
+        os.remove(temp_filename)
+      raise
   
   def json_write_simple_key(filename, key, value):
     DataStore.json_write_file(filename, {key: value})
@@ -155,10 +248,30 @@ class DataStore:
     data = [[driver.id for driver in driver_set.drivers] for driver_set in driver_collection.driver_sets]
     DataStore.json_write_file(filename, data)
   
+  async def run_in_executor(function, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(EXECUTOR, functools.partial(function, *args))
+  
   def load_quarter_number():
     file_path = DataStore.global_file_path(FileName.quarter_number.value)
     return DataStore.json_load_simple_key(file_path, FileName.quarter_number.value)
     
   def save_quarter_number(quarter_number):
     file_path = DataStore.global_file_path(FileName.quarter_number.value)
-    return DataStore.json_write_simple_key(file_path, FileName.quarter_number.value, quarter_number)
\ No newline at end of file
+    return DataStore.json_write_simple_key(file_path, FileName.quarter_number.value, quarter_number)
+  
+  def load_driver_identities():
+    file_path = DataStore.global_file_path(FileName.driver_identities.value)
+    return DataStore.json_load_file(file_path, {})
+  
+  # Merges with entries saved by other processes, keeping the most recent lookup of each driver, and returns the result.
+  def save_driver_identities(data):
+    file_path = DataStore.global_file_path(FileName.driver_identities.value)
+    with DataStore.file_lock(FileName.driver_identities.value):
+      merged = DataStore.json_load_file(file_path, {})
+      for cust_id, entry in data.items():
+        cust_id = str(cust_id)
+        if cust_id not in merged or merged[cust_id][1] < entry[1]:
+          merged[cust_id] = entry
+      DataStore.json_write_file(file_path, merged)
+    return merged
\ No newline at end of file
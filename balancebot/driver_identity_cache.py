@@ -0,0 +1,60 @@
+import time
+
+STALE_AFTER_SECONDS = 30 * 24 * 60 * 60 # Drivers can change their name on iRacing, so don't trust a lookup forever.
+
+# Bidirectional cache of iRacing customer ID <-> driver name, shared across all guilds and persisted between runs.
+class DriverIdentityCache:
+  def __init__(self, data_store_class):
+    self.data_store_class = data_store_class
+    self.dirty = False
+    self.hits = 0
+    self.misses = 0
+    self._ids = {}
+    self._names = {}
+    for cust_id, (name, looked_up_at) in data_store_class.load_driver_identities().items():
+      self.add_entry(int(cust_id), name, looked_up_at)
+  
+  def add_entry(self, cust_id, name, looked_up_at):
+    old_entry = self._names.get(cust_id)
+    if old_entry and self._ids.get(old_entry[0]) == cust_id:
+      del self._ids[old_entry[0]]
+    self._names[cust_id] = (name, looked_up_at)
+    self._ids[name] = cust_id
+  
+  def find_id(self, name, now=None):
+    cust_id = self._ids.get(name)
+    if cust_id is None or self.is_stale(self._names[cust_id][1], now):
+      self.misses += 1
+      return None
+    self.hits += 1
+    return cust_id
+  
+  def find_name(self, cust_id, now=None):
+    entry = self._names.get(cust_id)
+    if entry is None or self.is_stale(entry[1], now):
+      self.misses += 1
+      return None
+    self.hits += 1
+    return entry[0]
+  
+  def is_stale(self, looked_up_at, now=None):
+    now = now or time.time()
+    return now - looked_up_at > STALE_AFTER_SECONDS
+  
+  def remember(self, cust_id, name, now=None):
+    self.add_entry(cust_id, name, now or time.time())
+    self.dirty = True
+  
+  async def save(self):
+    if not self.dirty:
+      return
+    data = {cust_id: [name, looked_up_at] for cust_id, (name, looked_up_at) in self._names.items()}
+    self.dirty = False
+    merged = await self.data_store_class.run_in_executor(self.data_store_class.save_driver_identities, data)
+    for cust_id, (name, looked_up_at) in merged.items(): # Pick up lookups made by other processes in the meantime.
+      entry = self._names.get(int(cust_id))
+      if not entry or entry[1] < looked_up_at:
+        self.add_entry(int(cust_id), name, looked_up_at)
+  
+  def size(self):
+    return len(self._names)
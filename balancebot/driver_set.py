@@ -18,6 +18,12 @@ class DriverSet:
   def add_driver(self, driver):
     self.drivers.add(driver)
   
+  def copy(self):
+    new = DriverSet()
+    for driver in self.drivers:
+      new.add_driver(driver)
+    return new
+  
   def average_irating(self):
     if self.size() == 0:
       return None
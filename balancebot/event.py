@@ -0,0 +1,40 @@
+# One of several events a guild can balance drivers for at the same time, each with its own subset of the guild's
+# drivers, team sizes, combinations and balance. Drivers are referred to by ID, and looked up in the guild's roster
+# when needed, so events always see the guild's latest iRatings.
+class Event:
+  def __init__(self, name, driver_ids=(), team_sizes=(), combinations=(), balance=()):
+    self.name = name
+    self.driver_ids = set(driver_ids)
+    self.team_sizes = sorted(team_sizes)
+    self.combinations = [list(combination) for combination in combinations]
+    self.balance = [list(team) for team in balance]
+  
+  def from_data(name, data):
+    return Event(name, data.get('drivers', []), data.get('team_sizes', []), data.get('combinations', []), data.get('balance', []))
+  
+  def clear_balance(self):
+    self.balance = []
+  
+  def copy(self):
+    return Event(self.name, self.driver_ids, self.team_sizes, self.combinations, self.balance)
+  
+  def has_any_driver(self, driver_ids):
+    return not self.driver_ids.isdisjoint(driver_ids)
+  
+  def remove_driver(self, driver_id):
+    self.driver_ids.discard(driver_id)
+    self.combinations = [combination for combination in self.combinations if driver_id not in combination]
+    self.clear_balance()
+  
+  def set_driver_ids(self, driver_ids):
+    self.driver_ids = set(driver_ids)
+    self.combinations = [combination for combination in self.combinations if self.driver_ids.issuperset(combination)]
+    self.clear_balance()
+  
+  def to_data(self):
+    return {
+      'drivers':      sorted(self.driver_ids),
+      'team_sizes':   self.team_sizes,
+      'combinations': self.combinations,
+      'balance':      self.balance,
+    }
@@ -0,0 +1,29 @@
+from collections import Counter
+from types import SimpleNamespace
+
+class FakeChannel:
+  def __init__(self, id, guild_name, client):
+    self.id = id
+    self.guild = SimpleNamespace(name=guild_name, channels=[self])
+    self.mention = '#{0}'.format(guild_name)
+    self.client = client
+  
+  async def send(self, message):
+    self.client.calls['send'] += 1
+  
+  async def trigger_typing(self):
+    self.client.calls['trigger_typing'] += 1
+
+# Stands in for discord.Client in background rechecks: channels never block and only count the calls made to them.
+class FakeDiscordClient:
+  def __init__(self):
+    self.calls = Counter()
+    self.channels = {}
+    self.user = SimpleNamespace(mention='@Fake Bot')
+  
+  def add_channel(self, channel_id, guild_name):
+    self.channels[channel_id] = FakeChannel(channel_id, guild_name, self)
+    return self.channels[channel_id]
+  
+  def get_channel(self, channel_id):
+    return self.channels.get(channel_id)
@@ -0,0 +1,91 @@
+import asyncio
+from collections import Counter
+import random
+from types import SimpleNamespace
+
+FIRST_CUST_ID = 100000
+SUBSESSIONS_PER_DRIVER = 1000 # Subsession IDs encode the driver they were generated for.
+
+class FakeIRacingError(ConnectionError): # Counted as an outage by ResilientClient, like real network errors.
+  pass
+
+class FakeResponse:
+  def __init__(self, data):
+    self.data = data
+  
+  def json(self):
+    return self.data
+
+class FakeChartData:
+  def __init__(self, value):
+    self.value = value
+  
+  def current(self):
+    return self
+
+# Stands in for the subset of pyracing.Client used by the bot, backed by a pool of synthetic drivers.
+# Every call waits for a configurable latency, and may fail at a configurable rate.
+class FakeIRacingClient:
+  def __init__(self, driver_count=1000, latency=0.05, latency_jitter=0.02, error_rate=0, rating_change_rate=0.1, quarter_number=1, seed=None):
+    self.latency = latency
+    self.latency_jitter = latency_jitter
+    self.error_rate = error_rate
+    self.rating_change_rate = rating_change_rate
+    self.quarter_number = quarter_number
+    self.random = random.Random(seed)
+    self.calls = Counter()
+    self.iratings = {}
+    self.names = {}
+    for cust_id in FakeIRacingClient.synthetic_cust_ids(driver_count):
+      self.iratings[cust_id] = self.random.randint(500, 5000)
+      self.names[cust_id] = 'Synthetic Driver {0}'.format(cust_id)
+  
+  async def call(self, method_name):
+    self.calls[method_name] += 1
+    delay = self.latency + self.random.uniform(-self.latency_jitter, self.latency_jitter)
+    await asyncio.sleep(max(delay, 0))
+    if self.random.random() < self.error_rate:
+      raise FakeIRacingError('Synthetic failure in {0}'.format(method_name))
+  
+  def call_count(self):
+    return sum(self.calls.values())
+  
+  # Ratings drift between races, so a share of lookups see a new value.
+  def current_irating(self, cust_id):
+    if self.random.random() < self.rating_change_rate:
+      self.iratings[cust_id] += self.random.randint(-60, 60)
+    return self.iratings[cust_id]
+  
+  def synthetic_cust_ids(driver_count):
+    return range(FIRST_CUST_ID, FIRST_CUST_ID + driver_count)
+  
+  async def _build_request(self, url, params):
+    await self.call('_build_request')
+    search_terms = params.get('searchTerms', '')
+    racers = [{'custid': cust_id, 'name': name.replace(' ', '+')} for cust_id, name in self.names.items() if name == search_terms]
+    return FakeResponse({'searchRacers': racers})
+  
+  async def current_seasons(self, only_active=True):
+    await self.call('current_seasons')
+    return [SimpleNamespace(season_quarter=self.quarter_number)]
+  
+  async def driver_status(self, cust_id):
+    await self.call('driver_status')
+    return SimpleNamespace(name=self.names[cust_id].replace(' ', '+'))
+  
+  async def event_results(self, cust_id, quarter, **kwargs):
+    await self.call('event_results')
+    if cust_id not in self.iratings:
+      return []
+    subsession_id = cust_id * SUBSESSIONS_PER_DRIVER + self.random.randrange(SUBSESSIONS_PER_DRIVER)
+    return [SimpleNamespace(subsession_id=subsession_id)]
+  
+  async def irating(self, cust_id, category):
+    await self.call('irating')
+    return FakeChartData(self.iratings.get(cust_id, 1350))
+  
+  async def subsession_data(self, subsession_id):
+    await self.call('subsession_data')
+    cust_id = subsession_id // SUBSESSIONS_PER_DRIVER
+    driver = SimpleNamespace(cust_id=cust_id, irating_new=self.current_irating(cust_id))
+    return SimpleNamespace(driver=[driver])
@@ -1,16 +1,20 @@
+from balancebot.driver            import Driver
 from balancebot.driver_set        import DriverSet
 from balancebot.driver_collection import DriverCollection
+from balancebot.event             import Event
 
 class Guild:
   def __init__(self, id, data_store):
     self._id         = id
     self.name       = None
     self._data_store = data_store
+    self._dirty      = set()
     
     self._drivers          = data_store.load_drivers()
     self.balance           = data_store.load_balance(self._drivers)
     self.balance_threshold = data_store.load_balance_threshold()
     self.combinations      = data_store.load_combinations(self._drivers)
+    self.events            = {name: Event.from_data(name, data) for name, data in data_store.load_events().items()}
     self.monitoring_data   = data_store.load_monitoring_data()
     self.team_sizes        = data_store.load_team_sizes()
     self.teams             = data_store.load_teams(self._drivers)
@@ -18,44 +22,96 @@ class Guild:
   def add_combinations(self, combinations):
     for combination in combinations.driver_sets:
       self.combinations.add_driver_set(combination)
-    self._data_store.save_combinations(self.combinations)
+    self.mark_dirty('combinations')
   
   def add_driver(self, driver):
     self._drivers.add_driver(driver)
-    self._data_store.save_drivers(self._drivers)
+    self.mark_dirty('drivers')
+  
+  def add_drivers(self, drivers):
+    for driver in drivers:
+      self._drivers.add_driver(driver)
+    self.mark_dirty('drivers')
   
   def clear_balance(self):
     self.balance = DriverCollection()
-    self._data_store.save_balance(self.balance)
+    self.mark_dirty('balance')
     
   def clear_combinations(self):
     self.combinations = DriverCollection()
-    self._data_store.save_combinations(self.combinations)
+    self.mark_dirty('combinations')
   
   def clear_drivers(self):
     self.clear_balance()
     self.clear_combinations()
     self.clear_teams()
+    for event in list(self.events.values()):
+      event = event.copy()
+      event.set_driver_ids([])
+      self.set_event(event)
     self._drivers = DriverSet()
-    self._data_store.save_drivers(self._drivers)
+    self.mark_dirty('drivers')
   
   def clear_teams(self):
     self.teams = DriverCollection()
-    self._data_store.save_teams(self.teams)
+    self.mark_dirty('teams')
+  
+  # Builds a collection of the guild's drivers from lists of driver IDs, as stored by events.
+  def driver_collection(self, id_lists):
+    collection = DriverCollection()
+    for driver_ids in id_lists:
+      driver_set = DriverSet()
+      for driver_id in driver_ids:
+        driver = Driver.find(self.get_drivers(), driver_id)
+        if driver:
+          driver_set.add_driver(driver)
+      collection.add_driver_set(driver_set)
+    return collection
   
   def driver_count(self):
     return self._drivers.size()
   
+  def event_drivers(self, event):
+    return [driver for driver in self.get_drivers() if driver.id in event.driver_ids]
+  
+  def get_id(self):
+    return self._id
+  
   def get_drivers(self):
     return self._drivers.drivers
   
   def has_drivers(self):
     return self.driver_count() > 0
     
+  def is_monitored(self):
+    return self.monitoring_data.get('channel_id') is not None and self.has_drivers()
+  
+  def mark_dirty(self, field):
+    self._dirty.add(field)
+    
+  # Returns a save function and a snapshot of the value to save for each field changed since the last call,
+  # so that each field is written once however many times it was changed, and the writes can happen off the event loop.
+  def pending_saves(self):
+    snapshots = {
+      'balance':           lambda: (self._data_store.save_balance, self.balance.copy()),
+      'balance_threshold': lambda: (self._data_store.save_balance_threshold, self.balance_threshold),
+      'combinations':      lambda: (self._data_store.save_combinations, self.combinations.copy()),
+      'drivers':           lambda: (self._data_store.save_drivers, self._drivers.copy()),
+      'events':            lambda: (self._data_store.save_events, {name: event.to_data() for name, event in self.events.items()}),
+      'monitoring_data':   lambda: (self._data_store.save_monitoring_data, dict(self.monitoring_data)),
+      'team_sizes':        lambda: (self._data_store.save_team_sizes, list(self.team_sizes)),
+      'teams':             lambda: (self._data_store.save_teams, self.teams.copy()),
+    }
+    saves = [snapshots[field]() for field in sorted(self._dirty)]
+    if self._dirty & {'drivers', 'monitoring_data'}:
+      saves.append((self._data_store.save_monitored, self.is_monitored()))
+    self._dirty.clear()
+    return saves
+  
   def remove_combinations(self, combinations):
     for combination in combinations:
       self.combinations.remove_driver_set(combination)
-    self._data_store.save_combinations(self.combinations)
+    self.mark_dirty('combinations')
   
   def remove_driver(self, driver):
     if self.teams:
@@ -67,36 +123,50 @@ class Guild:
       if combination.has_driver(driver):
         combinations_to_remove.append(combination)
     self.remove_combinations(combinations_to_remove)
+    for event in list(self.events.values()):
+      if driver.id in event.driver_ids:
+        event = event.copy()
+        event.remove_driver(driver.id)
+        self.set_event(event)
     self._drivers.remove_driver(driver)
-    self._data_store.save_drivers(self._drivers)
+    self.mark_dirty('drivers')
+  
+  def remove_event(self, name):
+    del self.events[name]
+    self.mark_dirty('events')
   
   def save_driver(self, driver):
     self._drivers = self._drivers.with_updated_driver(driver)
-    self._data_store.save_drivers(self._drivers)
+    self.mark_dirty('drivers')
   
   def set_balance(self, balance):
     self.balance = balance
-    self._data_store.save_balance(self.balance)
+    self.mark_dirty('balance')
     
   def set_balance_threshold(self, balance_threshold):
     self.balance_threshold = balance_threshold
-    self._data_store.save_balance_threshold(self.balance_threshold)
+    self.mark_dirty('balance_threshold')
   
   def set_channel_id(self, channel_id):
     self.channel_id = channel_id
     self._data_store.save_channel_id(channel_id)
   
+  # Events are never changed in place: changes are made to a copy, which then replaces the event once it is complete.
+  def set_event(self, event):
+    self.events[event.name] = event
+    self.mark_dirty('events')
+  
   def set_monitoring_data(self, data):
     self.monitoring_data = data
-    self._data_store.save_monitoring_data(data)
+    self.mark_dirty('monitoring_data')
   
   def set_name(self, name):
     self.name = name
   
   def set_team_sizes(self, team_sizes):
     self.team_sizes = team_sizes
-    self._data_store.save_team_sizes(team_sizes)
+    self.mark_dirty('team_sizes')
   
   def set_teams(self, teams):
     self.teams = teams
-    self._data_store.save_teams(self.teams)
\ No newline at end of file
+    self.mark_dirty('teams')
\ No newline at end of file
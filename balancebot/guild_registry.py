@@ -0,0 +1,54 @@
+import asyncio
+
+from balancebot.guild   import Guild
+from balancebot.tracing import span
+
+# Keeps each guild loaded for the life of the process. Guilds are flushed to the data store at the end of each
+# command or background recheck, so the registry only has to be invalidated when an operation fails partway
+# or the stored data changes from elsewhere.
+class GuildRegistry:
+  def __init__(self, data_store_class):
+    self.data_store_class = data_store_class
+    self.hits = 0
+    self.misses = 0
+    self._guilds = {}
+    self._locks = {}
+  
+  def get(self, guild_id):
+    guild = self._guilds.get(guild_id)
+    if guild:
+      self.hits += 1
+      return guild
+    self.misses += 1
+    guild = Guild(guild_id, self.data_store_class(guild_id))
+    self._guilds[guild_id] = guild
+    return guild
+  
+  # Like get, but loads the guild off the event loop.
+  async def load(self, guild_id):
+    guild = self._guilds.get(guild_id)
+    if guild:
+      self.hits += 1
+      return guild
+    self.misses += 1
+    with span('load_guild'):
+      guild = await self.data_store_class.run_in_executor(lambda: Guild(guild_id, self.data_store_class(guild_id)))
+    return self._guilds.setdefault(guild_id, guild) # Another request may have loaded it in the meantime.
+  
+  def invalidate(self, guild_id):
+    self._guilds.pop(guild_id, None)
+  
+  def invalidate_all(self):
+    self._guilds.clear()
+  
+  # Held by commands and background rechecks for the duration of an operation on the guild.
+  def lock(self, guild_id):
+    if guild_id not in self._locks:
+      self._locks[guild_id] = asyncio.Lock()
+    return self._locks[guild_id]
+  
+  def is_loaded(self, guild_id):
+    return guild_id in self._guilds
+  
+  def size(self):
+    return len(self._guilds)
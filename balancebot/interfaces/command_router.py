@@ -0,0 +1,38 @@
+from collections import defaultdict
+from collections import namedtuple
+import re
+
+from balancebot.metrics import Histogram
+
+UNRECOGNIZED = 'unrecognized'
+WORD_RE = re.compile(r'\S+')
+
+Route = namedtuple('Route', ['name', 'handler', 'parser'])
+
+# Matches commands to routes by their longest prefix of whole words, using a trie built when the routes are added,
+# and records how long each command took to handle.
+class CommandRouter:
+  def __init__(self):
+    self.latencies = defaultdict(Histogram)
+    self._root = {}
+  
+  def add(self, name, handler, parser=None):
+    node = self._root
+    for word in name.split():
+      node = node.setdefault(word, {})
+    node[None] = Route(name, handler, parser)
+  
+  # Returns the route and the text following its name, or (None, text) if no route matches.
+  def match(self, text):
+    node = self._root
+    match = (None, text)
+    for word in WORD_RE.finditer(text):
+      node = node.get(word.group())
+      if node is None:
+        break
+      if None in node:
+        match = (node[None], text[word.end():].strip())
+    return match
+  
+  def record(self, name, seconds):
+    self.latencies[name].observe(seconds)
@@ -2,10 +2,18 @@ from datetime import datetime as dt
 import discord
 import re
 from textwrap import dedent
+import time
 
+from balancebot.interfaces.command_router import CommandRouter
+from balancebot.interfaces.command_router import UNRECOGNIZED
+from balancebot.tracing                   import span
+
+MESSAGE_LENGTH_LIMIT = 2000
 MESSAGE_TEXT_RE = re.compile(r'<@!*\d+> (.*)')
+TYPING_INTERVAL_SECONDS = 5
 TEAM_SEPARATOR = ';'
 DRIVER_SEPARATOR = ','
+EVENT_SEPARATOR = ':'
 
 class DiscordChannel:
   
@@ -13,10 +21,52 @@ class DiscordChannel:
     self.bot = None
     self.channel = None
     self.client = client
+    self.last_typing_at = None
     self.message = None
+    self.pending_output = []
+  
+  async def apply_rating_changes(self, guild_id, iratings):
+    return await self.perform_in_notification_channel(guild_id, lambda: self.bot.apply_rating_changes(iratings))
+  
+  # Joins messages into as few chunks under Discord's length limit as possible, splitting only between lines
+  # unless a single line is itself too long.
+  def chunk_messages(messages):
+    chunks = []
+    current = ''
+    for line in '\n'.join(messages).split('\n'):
+      while len(line) > MESSAGE_LENGTH_LIMIT:
+        if current:
+          chunks.append(current)
+          current = ''
+        chunks.append(line[:MESSAGE_LENGTH_LIMIT])
+        line = line[MESSAGE_LENGTH_LIMIT:]
+      candidate = current + '\n' + line if current else line
+      if len(candidate) > MESSAGE_LENGTH_LIMIT:
+        chunks.append(current)
+        candidate = line
+      current = candidate
+    if current.strip():
+      chunks.append(current)
+    return chunks
+  
+  async def flush_output(self):
+    messages, self.pending_output = self.pending_output, []
+    if not messages:
+      return
+    with span('discord_send', messages=len(messages)):
+      for chunk in DiscordChannel.chunk_messages(messages):
+        await self.channel.send(chunk)
+  
+  def format_bucket(seconds):
+    return '{0:g}'.format(seconds * 1000)
   
+  # Discord shows the typing indicator for several seconds, so there is no need to refresh it on every step of a long operation.
   async def indicate_progress(self):
-    await self.channel.trigger_typing() 
+    now = time.monotonic()
+    if self.last_typing_at is not None and now - self.last_typing_at < TYPING_INTERVAL_SECONDS:
+      return
+    self.last_typing_at = now
+    await self.channel.trigger_typing()
   
   def is_monitoring_possible(self):
     channel_id = self.bot.get_monitoring_data().get('channel_id')
@@ -30,7 +80,7 @@ class DiscordChannel:
       
       **drivers** - show list of added drivers for this server
       **add driver** Driver Name *Driver ID* - add this driver to the driver list for this server.
-          You can comma-separate multiple drivers.
+          You can comma-separate multiple drivers. I will look them all up at once and let you know if any of them couldn't be added.
           You can write just the driver name, and I will look up the driver ID for you.
           I will periodically check each driver's iRating and cache it if it's changed.
       **remove driver** Driver Name - remove this driver from the driver list for this server.
@@ -39,6 +89,7 @@ class DiscordChannel:
       
       **recheck rating** Driver Name - manually trigger a recheck of the named driver's road iRating.
       **recheck rating all** - manually trigger a recheck of all drivers' road iRatings.
+      **history** *n* - show how each driver's road iRating has changed over the last *n* days (30 if not specified).
     
       **team sizes** - shows the allowed team sizes for the current event. I will only allow for teams of these sizes when calculating balance.
           Once team sizes are set (and drivers are added), I will report on the optimal balance as it changes.
@@ -54,6 +105,8 @@ class DiscordChannel:
     commands_list_part_2 = dedent('''
       **balance** - show most recently calculated optimal balance of team members into teams.
       **recalculate balance** - manually trigger a recheck of the optimal balance based on most recently cached road iRatings.
+      **robustness** - simulate how iRatings might drift before the event, and show how likely the fixed teams (or the optimal balance) are to stay inside the balance threshold.
+      **rank balances** *n* - show the *n* best balances (5 if not specified), ranked by how likely they are to stay inside the balance threshold until the event.
       
       **teams** - show fixed teams for the upcoming event.
           I will monitor the balance of these teams to make sure it does not fall outside of the configured threshold. 
@@ -69,6 +122,21 @@ class DiscordChannel:
       **set notification channel** - set this channel as the channel I should use to send notifications.
       **notification channel** - check which channel has been configured for notifications
       
+      **command stats** - show how long I have taken to handle each command since I was last restarted.
+      
+      **event date** - show the date of the upcoming event.
+      **set event date** *YYYY-MM-DD* - set the date of the upcoming event. I will check iRatings more often in the days leading up to it.
+      
+      **events** - show the events of this server, if you're running several at once. Each event has its own drivers (from this server's driver list), team sizes and combinations.
+      **add event** Event Name - add an event.
+      **remove event** Event Name - remove an event.
+      **set event drivers** Event Name: Driver Name, Driver Name, ... - set which drivers take part in the event.
+      **set event team sizes** Event Name: *m*, *n*, ... - set the allowed team sizes for the event.
+      **combine event drivers** Event Name: Driver Name, Driver Name, ... - only consider sets of teams for the event where the named drivers are on a team together.
+      **clear event combinations** Event Name - clear all combinations of the event.
+      **event balance** Event Name - calculate the optimal balance of the event's drivers.
+          As iRatings change, I will report on the optimal balance of every event including the changed drivers.
+      
       Remember to tag me at the beginning of a command message with {0.mention} !
     ''').strip().format(self.client.user)
     await self.print(commands_list_part_2)
@@ -80,110 +148,161 @@ class DiscordChannel:
       return int(last_id_part)
     return identifier
   
-  def parse_driver_identifiers(self, command_text, command_prefix, collection=False):
-    drivers_text = self.parse_target(command_text, command_prefix)
+  def parse_driver_identifiers(self, drivers_text, collection=False):
     if collection:
       return [[self.parse_driver_identifier(driver) for driver in team_text.split(DRIVER_SEPARATOR)] for team_text in drivers_text.split(TEAM_SEPARATOR)]
     else:
       return [self.parse_driver_identifier(driver) for driver in drivers_text.replace(TEAM_SEPARATOR, DRIVER_SEPARATOR).split(DRIVER_SEPARATOR)]
   
+  # Splits 'Event Name: arguments' into the event name and the arguments, parsed with the given parser.
+  def parse_event_argument(self, argument_text, parser):
+    name, _, rest = argument_text.partition(EVENT_SEPARATOR)
+    return name.strip(), parser(self, rest)
+  
+  def parse_integer(self, text):
+    text = text.strip()
+    return int(text) if text.isnumeric() else None
+  
   def parse_integer_list(self, list_text):
     return [int(int_text.strip()) for int_text in list_text.split(DRIVER_SEPARATOR) if int_text.strip().isnumeric()]
   
-  def parse_target(self, command_text, command_prefix):
-    return command_text.split(command_prefix)[1].strip()
+  async def perform_background_recheck(self, guild_id, driver_ids=None):
+    return await self.perform_in_notification_channel(guild_id, lambda: self.bot.background_recheck(driver_ids))
   
-  async def perform_background_recheck(self, guild_id):
-    self.bot.initialize_guild(guild_id)
+  # Runs a background operation for a guild, reporting to its notification channel. Returns the drivers whose
+  # iRating changed, or no drivers if the guild has no notification channel.
+  async def perform_in_notification_channel(self, guild_id, operation):
+    await self.bot.initialize_guild(guild_id)
     channel_id = self.bot.get_monitoring_data().get('channel_id')
     if not channel_id:
-      return
+      return []
     self.channel = self.client.get_channel(channel_id)
     if not self.channel:
-      return
+      return []
     self.bot.set_guild_name(self.channel.guild.name)
-    await self.bot.background_recheck()
+    try:
+      changed_drivers = await operation()
+      await self.bot.save_guild()
+    finally:
+      await self.flush_output()
+    return changed_drivers
   
+  # Output is buffered for the duration of a request and sent by flush_output.
   async def print(self, message):
     if self.channel:
-      await self.channel.send(message)
+      self.pending_output.append(message)
   
   async def process_request(self, message):
     self.message = message
     self.channel = message.channel
-    self.bot.initialize_guild(message.channel.guild.id)
+    await self.bot.initialize_guild(message.channel.guild.id)
     self.bot.set_guild_name(message.channel.guild.name)
     cmd = self.strip_mention().strip()
-    if cmd.startswith('list commands'):
-      await self.list_commands()
-    elif cmd.startswith('status'):
-      await self.bot.show_status()
-    elif cmd.startswith('drivers'):
-      await self.bot.list_drivers()
-    elif cmd.startswith('add driver'):
-      await self.bot.add_drivers(self.parse_driver_identifiers(cmd, 'add driver'))
-    elif cmd.startswith('remove driver'):
-      await self.bot.remove_drivers(self.parse_driver_identifiers(cmd, 'remove driver'))
-    elif cmd.startswith('clear drivers'):
-      await self.bot.clear_drivers()
-    elif cmd.startswith('recheck rating'):
-      target = self.parse_target(cmd, 'recheck rating')
-      if target == 'all':
-        await self.bot.recheck_all_ratings()
-      else:
-        await self.bot.recheck_ratings(self.parse_driver_identifiers(cmd, 'recheck rating'))
-    elif cmd.startswith('team sizes'):
-      await self.bot.list_team_sizes()
-    elif cmd.startswith('set team sizes'):
-      team_sizes = self.parse_integer_list(self.parse_target(cmd, 'set team sizes'))
-      await self.bot.set_team_sizes(team_sizes)
-    elif cmd.startswith('combinations'):
-      await self.bot.list_combinations()
-    elif cmd.startswith('combine drivers'):
-      await self.bot.add_combinations(self.parse_driver_identifiers(cmd, 'combine drivers', collection=True))
-    elif cmd.startswith('remove combination'):
-      await self.bot.remove_combinations(self.parse_driver_identifiers(cmd, 'remove combination', collection=True))
-    elif cmd.startswith('clear combinations'):
-      await self.bot.clear_combinations()
-    elif cmd.startswith('balance threshold'):
-      await self.bot.show_balance_threshold()
-    elif cmd.startswith('set balance threshold'):
-      await self.bot.set_balance_threshold(int(self.parse_target(cmd, 'set balance threshold')))
-    elif cmd.startswith('balance'):
-      await self.bot.list_balance()
-    elif cmd.startswith('recalculate balance'):
-      await self.bot.recalculate_balance()
-    elif cmd.startswith('teams'):
-      await self.bot.list_teams()
-    elif cmd.startswith('set teams'):
-      if self.parse_target(cmd, 'set teams') == 'according to balance':
-        await self.bot.set_teams_according_to_balance()
-      else:
-        await self.bot.set_teams(self.parse_driver_identifiers(cmd, 'set teams', collection=True))
-    elif cmd.startswith('clear teams'):
-      await self.bot.clear_teams()
-    elif cmd.startswith('notification channel'):
-      channel_id = self.bot.get_monitoring_data().get('channel_id')
-      if channel_id:  
-        found_channel = discord.utils.find(lambda c: c.id == channel_id and c.type == discord.ChannelType.text, self.channel.guild.channels)
-        if found_channel:
-          await self.print('I am currently sending notifications to {0}.'.format(found_channel.mention))
-        else:
-          await self.print("Oops, the channel I am currently sending notifications to doesn't seem to exist anymore. If desired, please set a new channel.")
+    started_at = time.perf_counter()
+    route, argument_text = COMMANDS.match(cmd)
+    try:
+      if route:
+        argument = route.parser(self, argument_text) if route.parser else None
+        await route.handler(self, argument)
       else:
-        await self.print('No channel is currently configured for notifications.')
-    elif cmd.startswith('set notification channel'):
-      monitoring_data = {'channel_id': self.channel.id}
-      self.bot.set_monitoring_data(monitoring_data)
-      await self.print('Set {0} as the notification channel.'.format(self.channel.mention))
-    elif cmd.startswith('test background recheck'):
-      await self.bot.background_recheck()
-    else:
-      await self.bot.alert_unrecognized_command()
+        await self.bot.alert_unrecognized_command()
+      await self.bot.save_guild()
+    finally:
+      await self.flush_output()
+      COMMANDS.record(route.name if route else UNRECOGNIZED, time.perf_counter() - started_at)
+  
+  async def set_notification_channel(self):
+    monitoring_data = dict(self.bot.get_monitoring_data())
+    monitoring_data['channel_id'] = self.channel.id
+    self.bot.set_monitoring_data(monitoring_data)
+    await self.print('Set {0} as the notification channel.'.format(self.channel.mention))
   
   def set_bot(self, bot):
     self.bot = bot
   
+  async def show_command_stats(self):
+    if not COMMANDS.latencies:
+      await self.print('No commands have been handled yet.')
+      return
+    lines = ['Command handling times since startup:']
+    for name, histogram in sorted(COMMANDS.latencies.items()):
+      lines.append('**{0}** - {1} handled, mean {2:.0f} ms, p50 under {3} ms, p95 under {4} ms'.format(
+        name, histogram.count, histogram.mean() * 1000, DiscordChannel.format_bucket(histogram.quantile(0.5)), DiscordChannel.format_bucket(histogram.quantile(0.95))))
+    await self.print('\n'.join(lines))
+  
+  async def show_notification_channel(self):
+    channel_id = self.bot.get_monitoring_data().get('channel_id')
+    if channel_id:  
+      found_channel = discord.utils.find(lambda c: c.id == channel_id and c.type == discord.ChannelType.text, self.channel.guild.channels)
+      if found_channel:
+        await self.print('I am currently sending notifications to {0}.'.format(found_channel.mention))
+      else:
+        await self.print("Oops, the channel I am currently sending notifications to doesn't seem to exist anymore. If desired, please set a new channel.")
+    else:
+      await self.print('No channel is currently configured for notifications.')
+  
   def strip_mention(self):
     re_match = MESSAGE_TEXT_RE.match(self.message.content)
-    return re_match.group(1)
\ No newline at end of file
+    return re_match.group(1)
+
+def driver_identifiers(channel, text):
+  return channel.parse_driver_identifiers(text)
+
+def driver_collection(channel, text):
+  return channel.parse_driver_identifiers(text, collection=True)
+
+def event_argument(parser):
+  return lambda channel, text: channel.parse_event_argument(text, parser)
+
+def integer(channel, text):
+  return channel.parse_integer(text)
+
+def integer_list(channel, text):
+  return channel.parse_integer_list(text)
+
+def stripped_text(channel, argument_text):
+  return argument_text.strip()
+
+def text(channel, argument_text):
+  return argument_text
+
+COMMANDS = CommandRouter()
+COMMANDS.add('list commands', lambda channel, _: channel.list_commands())
+COMMANDS.add('status', lambda channel, _: channel.bot.show_status())
+COMMANDS.add('drivers', lambda channel, _: channel.bot.list_drivers())
+COMMANDS.add('add driver', lambda channel, driver_ids: channel.bot.add_drivers(driver_ids), driver_identifiers)
+COMMANDS.add('remove driver', lambda channel, driver_ids: channel.bot.remove_drivers(driver_ids), driver_identifiers)
+COMMANDS.add('clear drivers', lambda channel, _: channel.bot.clear_drivers())
+COMMANDS.add('recheck rating', lambda channel, driver_ids: channel.bot.recheck_ratings(driver_ids), driver_identifiers)
+COMMANDS.add('recheck rating all', lambda channel, _: channel.bot.recheck_all_ratings())
+COMMANDS.add('history', lambda channel, days: channel.bot.show_history(days), integer)
+COMMANDS.add('team sizes', lambda channel, _: channel.bot.list_team_sizes())
+COMMANDS.add('set team sizes', lambda channel, team_sizes: channel.bot.set_team_sizes(team_sizes), integer_list)
+COMMANDS.add('combinations', lambda channel, _: channel.bot.list_combinations())
+COMMANDS.add('combine drivers', lambda channel, combinations: channel.bot.add_combinations(combinations), driver_collection)
+COMMANDS.add('remove combination', lambda channel, combinations: channel.bot.remove_combinations(combinations), driver_collection)
+COMMANDS.add('clear combinations', lambda channel, _: channel.bot.clear_combinations())
+COMMANDS.add('balance', lambda channel, _: channel.bot.list_balance())
+COMMANDS.add('balance threshold', lambda channel, _: channel.bot.show_balance_threshold())
+COMMANDS.add('set balance threshold', lambda channel, threshold: channel.bot.set_balance_threshold(threshold), integer)
+COMMANDS.add('robustness', lambda channel, _: channel.bot.show_robustness())
+COMMANDS.add('rank balances', lambda channel, count: channel.bot.rank_balances(count), integer)
+COMMANDS.add('recalculate balance', lambda channel, _: channel.bot.recalculate_balance())
+COMMANDS.add('teams', lambda channel, _: channel.bot.list_teams())
+COMMANDS.add('set teams', lambda channel, teams: channel.bot.set_teams(teams), driver_collection)
+COMMANDS.add('set teams according to balance', lambda channel, _: channel.bot.set_teams_according_to_balance())
+COMMANDS.add('clear teams', lambda channel, _: channel.bot.clear_teams())
+COMMANDS.add('notification channel', lambda channel, _: channel.show_notification_channel())
+COMMANDS.add('set notification channel', lambda channel, _: channel.set_notification_channel())
+COMMANDS.add('event date', lambda channel, _: channel.bot.show_event_date())
+COMMANDS.add('set event date', lambda channel, event_date: channel.bot.set_event_date(event_date), text)
+COMMANDS.add('events', lambda channel, _: channel.bot.list_events())
+COMMANDS.add('add event', lambda channel, name: channel.bot.add_event(name), stripped_text)
+COMMANDS.add('remove event', lambda channel, name: channel.bot.remove_event(name), stripped_text)
+COMMANDS.add('set event drivers', lambda channel, argument: channel.bot.set_event_drivers(*argument), event_argument(driver_identifiers))
+COMMANDS.add('set event team sizes', lambda channel, argument: channel.bot.set_event_team_sizes(*argument), event_argument(integer_list))
+COMMANDS.add('combine event drivers', lambda channel, argument: channel.bot.add_event_combinations(*argument), event_argument(driver_collection))
+COMMANDS.add('clear event combinations', lambda channel, name: channel.bot.clear_event_combinations(name), stripped_text)
+COMMANDS.add('event balance', lambda channel, name: channel.bot.show_event_balance(name), stripped_text)
+COMMANDS.add('command stats', lambda channel, _: channel.show_command_stats())
+COMMANDS.add('test background recheck', lambda channel, _: channel.bot.background_recheck())
@@ -0,0 +1,62 @@
+from collections import defaultdict
+import mmap
+import os
+import struct
+import time
+
+from balancebot.data_store import DATA_DIRECTORY
+
+HISTORY_FILE = 'irating_history.bin'
+RECORD = struct.Struct('<IqI') # cust_id, timestamp (epoch seconds), irating
+CUST_ID = struct.Struct('<I')
+
+# Append-only log of iRating changes, shared by all guilds. Records are fixed width, so the log is read through
+# mmap and an in-memory index of each driver's record offsets, touching only the records asked for.
+class IRatingHistory:
+  def __init__(self, path=None):
+    self.path = path or os.path.join(DATA_DIRECTORY, HISTORY_FILE)
+    self._indexed_size = 0
+    self._mmap = None
+    self._offsets = defaultdict(list)
+  
+  def append(self, cust_id, irating, timestamp=None):
+    record = RECORD.pack(cust_id, int(timestamp or time.time()), irating)
+    with open(self.path, 'ab') as file:
+      end = file.seek(0, os.SEEK_END)
+      if end % RECORD.size:
+        file.truncate(end - end % RECORD.size) # Drop a record left half-written by a crash.
+      file.write(record)
+  
+  def close(self):
+    if self._mmap:
+      self._mmap.close()
+      self._mmap = None
+  
+  # Returns the latest record before `since` (or None), and the records from `since` onwards, as (timestamp, irating).
+  def history(self, cust_id, since):
+    self.refresh()
+    baseline = None
+    records = []
+    for offset in self._offsets.get(cust_id, []):
+      _, timestamp, irating = RECORD.unpack_from(self._mmap, offset)
+      if timestamp < since:
+        baseline = (timestamp, irating)
+      else:
+        records.append((timestamp, irating))
+    return baseline, records
+  
+  # Indexes records appended since the last refresh, by this or any other process.
+  def refresh(self):
+    if not os.path.isfile(self.path):
+      return
+    size = os.path.getsize(self.path)
+    size -= size % RECORD.size
+    if size <= self._indexed_size:
+      return
+    self.close()
+    with open(self.path, 'rb') as file:
+      self._mmap = mmap.mmap(file.fileno(), size, access=mmap.ACCESS_READ)
+    for offset in range(self._indexed_size, size, RECORD.size):
+      cust_id, = CUST_ID.unpack_from(self._mmap, offset)
+      self._offsets[cust_id].append(offset)
+    self._indexed_size = size
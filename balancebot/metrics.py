@@ -0,0 +1,74 @@
+import bisect
+import math
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Cumulative-bucket histogram in the style of Prometheus, cheap enough to record every observation.
+class Histogram:
+  def __init__(self, buckets=DEFAULT_BUCKETS):
+    self.buckets = tuple(buckets)
+    self.bucket_counts = [0] * (len(self.buckets) + 1) # Last slot counts observations above the largest bucket.
+    self.count = 0
+    self.sum = 0
+  
+  def cumulative_counts(self):
+    counts = []
+    running = 0
+    for bucket_count in self.bucket_counts[:-1]:
+      running += bucket_count
+      counts.append(running)
+    return list(zip(self.buckets, counts))
+  
+  def mean(self):
+    return self.sum / self.count if self.count else None
+  
+  def observe(self, value):
+    self.bucket_counts[bisect.bisect_left(self.buckets, value)] += 1
+    self.count += 1
+    self.sum += value
+  
+  # Upper bound of the bucket containing the given quantile; observations above the largest bucket report it as infinite.
+  def quantile(self, quantile):
+    if not self.count:
+      return None
+    target = quantile * self.count
+    running = 0
+    for bucket, bucket_count in zip(self.buckets, self.bucket_counts):
+      running += bucket_count
+      if running >= target:
+        return bucket
+    return float('inf')
+
+# Builds a scrape response in the Prometheus text exposition format.
+class PrometheusWriter:
+  def __init__(self):
+    self.lines = []
+  
+  def family(self, name, metric_type, description):
+    self.lines.append('# HELP {0} {1}'.format(name, description))
+    self.lines.append('# TYPE {0} {1}'.format(name, metric_type))
+  
+  def format_labels(labels):
+    if not labels:
+      return ''
+    escaped = ['{0}="{1}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"')) for key, value in sorted(labels.items())]
+    return '{' + ','.join(escaped) + '}'
+  
+  def format_value(value):
+    if value == math.inf:
+      return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+  
+  def histogram(self, name, histogram, labels=None):
+    labels = labels or {}
+    for bucket, count in histogram.cumulative_counts():
+      self.sample(name + '_bucket', count, dict(labels, le=PrometheusWriter.format_value(float(bucket))))
+    self.sample(name + '_bucket', histogram.count, dict(labels, le='+Inf'))
+    self.sample(name + '_sum', histogram.sum, labels)
+    self.sample(name + '_count', histogram.count, labels)
+  
+  def sample(self, name, value, labels=None):
+    self.lines.append('{0}{1} {2}'.format(name, PrometheusWriter.format_labels(labels), PrometheusWriter.format_value(value)))
+  
+  def text(self):
+    return '\n'.join(self.lines) + '\n'
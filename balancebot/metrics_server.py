@@ -0,0 +1,72 @@
+import logging
+try:
+  from aiohttp import web
+except ImportError: # Installed alongside discord.py, but the endpoint is optional.
+  web = None
+
+from balancebot.balance_bot                import BalanceBot
+from balancebot.interfaces.discord_channel import COMMANDS
+from balancebot.metrics                    import PrometheusWriter
+
+DEFAULT_HOST = '127.0.0.1'
+
+# Serves the bot's latency histograms and counters on /metrics, for scraping by Prometheus.
+class MetricsServer:
+  def __init__(self, rechecker, port, host=DEFAULT_HOST):
+    self.rechecker = rechecker
+    self.host = host
+    self.port = port
+    self.runner = None
+  
+  def render(self):
+    writer = PrometheusWriter()
+    writer.family('balancebot_command_duration_seconds', 'histogram', 'Time taken to handle a command, including saving.')
+    for name, histogram in sorted(COMMANDS.latencies.items()):
+      writer.histogram('balancebot_command_duration_seconds', histogram, {'command': name})
+    latencies = getattr(self.rechecker.ir_client, 'latencies', None)
+    if latencies:
+      writer.family('balancebot_iracing_call_duration_seconds', 'histogram', 'Time taken by each attempted iRacing call.')
+      for endpoint, histogram in sorted(latencies.histograms.items()):
+        writer.histogram('balancebot_iracing_call_duration_seconds', histogram, {'method': endpoint})
+    writer.family('balancebot_balance_solve_duration_seconds', 'histogram', 'Time taken to find an optimal balance.')
+    writer.histogram('balancebot_balance_solve_duration_seconds', BalanceBot.solver.durations)
+    writer.family('balancebot_balance_solve_nodes', 'histogram', 'Partial team arrangements searched to find an optimal balance.')
+    writer.histogram('balancebot_balance_solve_nodes', BalanceBot.solver.nodes)
+    writer.family('balancebot_balance_requests_total', 'counter', 'Balance requests, by whether they started a search, shared one already in flight, or reused a recent result.')
+    writer.sample('balancebot_balance_requests_total', BalanceBot.solver.searches, {'outcome': 'searched'})
+    writer.sample('balancebot_balance_requests_total', BalanceBot.solver.shared_searches, {'outcome': 'shared'})
+    writer.sample('balancebot_balance_requests_total', BalanceBot.solver.cached_searches, {'outcome': 'cached'})
+    writer.family('balancebot_recheck_cycle_duration_seconds', 'histogram', 'Time taken by a background recheck cycle.')
+    writer.histogram('balancebot_recheck_cycle_duration_seconds', self.rechecker.cycle_durations)
+    writer.family('balancebot_guild_rechecks_total', 'counter', 'Guilds processed by background recheck cycles.')
+    writer.sample('balancebot_guild_rechecks_total', self.rechecker.guild_rechecks)
+    writer.family('balancebot_recheck_cycle_guilds', 'gauge', 'Guilds processed by the latest background recheck cycle.')
+    writer.sample('balancebot_recheck_cycle_guilds', self.rechecker.last_cycle_guild_count)
+    caches = {'driver_identity': self.rechecker.identity_cache, 'guild': self.rechecker.guild_registry}
+    writer.family('balancebot_cache_hits_total', 'counter', 'Cache lookups answered from memory.')
+    for name, cache in caches.items():
+      writer.sample('balancebot_cache_hits_total', cache.hits, {'cache': name})
+    writer.family('balancebot_cache_misses_total', 'counter', 'Cache lookups which had to be loaded or fetched.')
+    for name, cache in caches.items():
+      writer.sample('balancebot_cache_misses_total', cache.misses, {'cache': name})
+    writer.family('balancebot_cache_hit_ratio', 'gauge', 'Share of cache lookups answered from memory.')
+    for name, cache in caches.items():
+      lookups = cache.hits + cache.misses
+      writer.sample('balancebot_cache_hit_ratio', cache.hits / lookups if lookups else 0.0, {'cache': name})
+    return writer.text()
+  
+  async def serve_metrics(self, request):
+    return web.Response(text=self.render(), content_type='text/plain', charset='utf-8')
+  
+  async def start(self):
+    if self.runner:
+      return
+    if not web:
+      logging.warning('aiohttp is not installed, so the metrics endpoint is disabled.')
+      return
+    app = web.Application()
+    app.router.add_get('/metrics', self.serve_metrics)
+    self.runner = web.AppRunner(app)
+    await self.runner.setup()
+    await web.TCPSite(self.runner, self.host, self.port).start()
+    logging.info('Serving metrics on http://{0}:{1}/metrics'.format(self.host, self.port))
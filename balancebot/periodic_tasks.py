@@ -0,0 +1,27 @@
+import logging
+from periodic import Periodic
+
+# The process's background loops. discord.py fires on_ready again after every reconnect, so starting is idempotent:
+# the loops are started once, after a warm start, and keep running on the client's event loop across reconnects.
+class PeriodicTasks:
+  def __init__(self, rechecker, sync_period_seconds, tick_seconds, quarter_check_period_seconds):
+    self.rechecker = rechecker
+    self.periods = [(sync_period_seconds, rechecker.sync_recheck_schedule),
+                    (tick_seconds, rechecker.perform_background_rechecks),
+                    (quarter_check_period_seconds, rechecker.check_quarter_number)]
+    self.periodics = []
+    self.started = False
+  
+  async def start(self):
+    if self.started:
+      logging.info('Reconnected; background tasks are already running.')
+      return
+    self.started = True
+    try:
+      await self.rechecker.warm_start()
+    except Exception: # The loops load what they need as they run, so start them regardless.
+      logging.exception('Warm start failed; starting background tasks without it.')
+    for period, function in self.periods:
+      periodic = Periodic(period, function)
+      await periodic.start()
+      self.periodics.append(periodic)
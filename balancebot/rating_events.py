@@ -0,0 +1,75 @@
+import asyncio
+from collections import defaultdict
+import contextvars
+import time
+
+DEBOUNCE_SECONDS  = 5
+MAX_DELAY_SECONDS = 60
+
+# Passes iRating changes found while rechecking one guild on to every other guild whose roster includes the driver.
+# Changes for a guild are collected until none have arrived for DEBOUNCE_SECONDS (or MAX_DELAY_SECONDS have passed
+# since the first), then handed to the handler together, so a guild is rebalanced once per burst of changes.
+class RatingEventBus:
+  def __init__(self, handler, debounce_seconds=DEBOUNCE_SECONDS, max_delay_seconds=MAX_DELAY_SECONDS):
+    self.handler = handler
+    self.debounce_seconds = debounce_seconds
+    self.max_delay_seconds = max_delay_seconds
+    self.published = 0
+    self.delivered = 0
+    self._subscribers = defaultdict(set) # cust_id -> guild_ids
+    self._rosters = {} # guild_id -> cust_ids
+    self._pending = {} # guild_id -> {cust_id: irating}
+    self._first_pending_at = {}
+    self._timers = {}
+    self._deliveries = set()
+  
+  def deliver(self, guild_id):
+    self._timers.pop(guild_id, None)
+    self._first_pending_at.pop(guild_id, None)
+    iratings = self._pending.pop(guild_id, None)
+    if not iratings:
+      return
+    self.delivered += 1
+    delivery = asyncio.ensure_future(self.handler(guild_id, iratings))
+    self._deliveries.add(delivery) # Keep a reference until it finishes.
+    delivery.add_done_callback(self._deliveries.discard)
+  
+  def publish(self, cust_id, irating, source_guild_id=None):
+    self.published += 1
+    for guild_id in self._subscribers.get(cust_id, ()):
+      if guild_id == source_guild_id:
+        continue
+      self._pending.setdefault(guild_id, {})[cust_id] = irating
+      self.schedule(guild_id)
+  
+  def schedule(self, guild_id):
+    now = time.monotonic()
+    first_pending_at = self._first_pending_at.setdefault(guild_id, now)
+    delay = min(self.debounce_seconds, max(first_pending_at + self.max_delay_seconds - now, 0))
+    timer = self._timers.pop(guild_id, None)
+    if timer:
+      timer.cancel()
+    # Deliveries run in a fresh context, so they are not traced as part of whichever guild's recheck published first.
+    self._timers[guild_id] = asyncio.get_event_loop().call_later(delay, self.deliver, guild_id, context=contextvars.Context())
+  
+  def subscribe(self, guild_id, cust_ids):
+    cust_ids = set(cust_ids)
+    for cust_id in self._rosters.get(guild_id, set()) - cust_ids:
+      self._subscribers[cust_id].discard(guild_id)
+      if not self._subscribers[cust_id]:
+        del self._subscribers[cust_id]
+    for cust_id in cust_ids:
+      self._subscribers[cust_id].add(guild_id)
+    self._rosters[guild_id] = cust_ids
+  
+  def subscribers(self, cust_id):
+    return set(self._subscribers.get(cust_id, ()))
+  
+  def unsubscribe(self, guild_id):
+    self.subscribe(guild_id, [])
+    del self._rosters[guild_id]
+    timer = self._timers.pop(guild_id, None)
+    if timer:
+      timer.cancel()
+    self._pending.pop(guild_id, None)
+    self._first_pending_at.pop(guild_id, None)
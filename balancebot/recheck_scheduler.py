@@ -0,0 +1,88 @@
+from datetime import datetime as dt
+from datetime import timedelta
+import heapq
+
+DEFAULT_INTERVAL     = timedelta(minutes=15)
+ACTIVE_INTERVAL      = timedelta(minutes=5)
+MAX_INTERVAL         = timedelta(hours=24)
+BACKOFF_FACTOR       = 2
+EVENT_BOOST_DAYS     = 3
+EVENT_BOOST_INTERVAL = timedelta(minutes=10)
+
+class RecheckScheduler:
+  def __init__(self):
+    self._queue = [] # Heap of (next_check, guild_id, driver_id). May contain stale entries, see _entries.
+    self._entries = {} # (guild_id, driver_id) -> [next_check, interval]. next_check is None while a check is in flight.
+    self._event_dates = {}
+
+  def due_checks(self, now=None):
+    now = now or dt.now()
+    due = {}
+    while self._queue and self._queue[0][0] <= now:
+      next_check, guild_id, driver_id = heapq.heappop(self._queue)
+      entry = self._entries.get((guild_id, driver_id))
+      if not entry or entry[0] != next_check:
+        continue # Driver was removed or rescheduled since this heap entry was pushed.
+      entry[0] = None
+      due.setdefault(guild_id, []).append(driver_id)
+    return due
+
+  def guild_ids(self):
+    return set(guild_id for guild_id, _ in self._entries)
+
+  def is_scheduled(self, guild_id, driver_id):
+    return (guild_id, driver_id) in self._entries
+
+  def next_check(self, guild_id, driver_id):
+    entry = self._entries.get((guild_id, driver_id))
+    return entry[0] if entry else None
+
+  def next_interval(self, guild_id, interval, changed, now):
+    if changed:
+      interval = ACTIVE_INTERVAL
+    else:
+      interval = min(interval * BACKOFF_FACTOR, MAX_INTERVAL)
+    if self.is_event_upcoming(guild_id, now):
+      interval = min(interval, EVENT_BOOST_INTERVAL)
+    return interval
+
+  def is_event_upcoming(self, guild_id, now):
+    event_date = self._event_dates.get(guild_id)
+    if not event_date:
+      return False
+    event_end = event_date + timedelta(days=1) # Event dates are midnight of the event day; keep boosting through it.
+    return event_date - now <= timedelta(days=EVENT_BOOST_DAYS) and now < event_end
+
+  def record_check(self, guild_id, driver_id, changed, now=None):
+    now = now or dt.now()
+    entry = self._entries.get((guild_id, driver_id))
+    if not entry:
+      return
+    entry[1] = self.next_interval(guild_id, entry[1], changed, now)
+    self.push(guild_id, driver_id, now + entry[1])
+
+  def remove_guild(self, guild_id):
+    for key in [key for key in self._entries if key[0] == guild_id]:
+      del self._entries[key]
+    self._event_dates.pop(guild_id, None)
+
+  def push(self, guild_id, driver_id, next_check):
+    self._entries[(guild_id, driver_id)][0] = next_check
+    heapq.heappush(self._queue, (next_check, guild_id, driver_id))
+
+  # Brings the schedule for a guild in line with its current roster: new drivers are due immediately,
+  # removed drivers are dropped, and drivers already known keep their place in the queue.
+  def sync_guild(self, guild_id, driver_ids, event_date=None, now=None):
+    now = now or dt.now()
+    driver_ids = set(driver_ids)
+    self._event_dates[guild_id] = event_date
+    for key in [key for key in self._entries if key[0] == guild_id and key[1] not in driver_ids]:
+      del self._entries[key]
+    for driver_id in driver_ids:
+      entry = self._entries.get((guild_id, driver_id))
+      if not entry:
+        self._entries[(guild_id, driver_id)] = [None, DEFAULT_INTERVAL]
+        self.push(guild_id, driver_id, now)
+      elif entry[0] and self.is_event_upcoming(guild_id, now) and entry[0] > now + EVENT_BOOST_INTERVAL:
+        entry[1] = min(entry[1], EVENT_BOOST_INTERVAL)
+        self.push(guild_id, driver_id, now + entry[1])
@@ -0,0 +1,142 @@
+import asyncio
+from collections import defaultdict
+from collections import deque
+import httpx
+import logging
+import random
+import time
+
+from balancebot.metrics import Histogram
+
+CALL_TIMEOUT_SECONDS      = 10
+RETRIES                   = 2
+RETRY_BACKOFF_SECONDS     = 0.5
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_RESET_SECONDS     = 60
+LATENCY_SAMPLES           = 1000
+OUTAGE_ERRORS             = (asyncio.TimeoutError, OSError, httpx.HTTPError) # Anything else is a bug, not iRacing being down.
+
+class IRacingUnavailable(Exception):
+  pass
+
+# Stops calling iRacing after repeated failures, then lets a single trial call through once the reset period has passed.
+class CircuitBreaker:
+  def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_seconds=BREAKER_RESET_SECONDS):
+    self.failure_threshold = failure_threshold
+    self.reset_seconds = reset_seconds
+    self.consecutive_failures = 0
+    self.opened_at = None
+    self.trial_in_flight = False
+  
+  def allow_request(self, now=None):
+    if self.opened_at is None:
+      return True
+    now = now or time.monotonic()
+    if now - self.opened_at < self.reset_seconds or self.trial_in_flight:
+      return False
+    self.trial_in_flight = True
+    return True
+  
+  # Lets another trial call through after one which ended without showing whether iRacing is back, e.g. by being cancelled.
+  def end_trial(self):
+    self.trial_in_flight = False
+  
+  def is_open(self):
+    return self.opened_at is not None
+  
+  def record_failure(self, now=None):
+    self.consecutive_failures += 1
+    self.trial_in_flight = False
+    if self.opened_at is not None or self.consecutive_failures >= self.failure_threshold:
+      if self.opened_at is None:
+        logging.warning('iRacing circuit breaker opened after {0} consecutive failures.'.format(self.consecutive_failures))
+      self.opened_at = now or time.monotonic()
+  
+  def record_success(self):
+    if self.opened_at is not None:
+      logging.info('iRacing circuit breaker closed.')
+    self.consecutive_failures = 0
+    self.opened_at = None
+    self.trial_in_flight = False
+
+# Keeps the most recent call durations per endpoint.
+class LatencyRecorder:
+  def __init__(self, max_samples=LATENCY_SAMPLES):
+    self.samples = defaultdict(lambda: deque(maxlen=max_samples))
+    self.counts = defaultdict(int)
+    self.histograms = defaultdict(Histogram)
+  
+  def percentiles(self, endpoint, quantiles=(0.5, 0.9, 0.99)):
+    ordered = sorted(self.samples[endpoint])
+    if not ordered:
+      return {}
+    return {quantile: ordered[min(int(quantile * len(ordered)), len(ordered) - 1)] for quantile in quantiles}
+  
+  def record(self, endpoint, seconds):
+    self.samples[endpoint].append(seconds)
+    self.counts[endpoint] += 1
+    self.histograms[endpoint].observe(seconds)
+  
+  def summary(self):
+    parts = []
+    for endpoint in sorted(self.samples):
+      p = self.percentiles(endpoint)
+      parts.append('{0}: n={1} p50={2:.3f}s p90={3:.3f}s p99={4:.3f}s'.format(endpoint, self.counts[endpoint], p[0.5], p[0.9], p[0.99]))
+    return '; '.join(parts)
+
+# Wraps a pyracing client with per-call timeouts, jittered retries and a circuit breaker.
+# Calls which cannot be completed raise IRacingUnavailable.
+class ResilientClient:
+  def __init__(self, client, timeout=CALL_TIMEOUT_SECONDS, retries=RETRIES, backoff=RETRY_BACKOFF_SECONDS, breaker=None, latencies=None):
+    self.client = client
+    self.timeout = timeout
+    self.retries = retries
+    self.backoff = backoff
+    self.breaker = breaker or CircuitBreaker()
+    self.latencies = latencies or LatencyRecorder()
+  
+  async def call(self, endpoint, *args, **kwargs):
+    for attempt in range(self.retries + 1):
+      if not self.breaker.allow_request():
+        raise IRacingUnavailable('iRacing circuit breaker is open.')
+      trial = self.breaker.trial_in_flight
+      started_at = time.perf_counter()
+      try:
+        result = await asyncio.wait_for(getattr(self.client, endpoint)(*args, **kwargs), self.timeout)
+      except TypeError:
+        # The iRacing client raises this for empty responses, which is an answer rather than an outage.
+        self.latencies.record(endpoint, time.perf_counter() - started_at)
+        self.breaker.record_success()
+        raise
+      except OUTAGE_ERRORS as error:
+        self.latencies.record(endpoint, time.perf_counter() - started_at)
+        self.breaker.record_failure()
+        logging.warning('iRacing {0} call failed (attempt {1} of {2}): {3!r}'.format(endpoint, attempt + 1, self.retries + 1, error))
+        if attempt == self.retries:
+          raise IRacingUnavailable('iRacing {0} call failed.'.format(endpoint)) from error
+        await asyncio.sleep(self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5))
+      else:
+        self.latencies.record(endpoint, time.perf_counter() - started_at)
+        self.breaker.record_success()
+        return result
+      finally:
+        if trial:
+          self.breaker.end_trial()
+  
+  async def _build_request(self, url, params):
+    return await self.call('_build_request', url, params)
+  
+  async def current_seasons(self, *args, **kwargs):
+    return await self.call('current_seasons', *args, **kwargs)
+  
+  async def driver_status(self, *args, **kwargs):
+    return await self.call('driver_status', *args, **kwargs)
+  
+  async def event_results(self, *args, **kwargs):
+    return await self.call('event_results', *args, **kwargs)
+  
+  async def irating(self, *args, **kwargs):
+    return await self.call('irating', *args, **kwargs)
+  
+  async def subsession_data(self, *args, **kwargs):
+    return await self.call('subsession_data', *args, **kwargs)
@@ -0,0 +1,59 @@
+from collections import namedtuple
+try:
+  import numpy
+except ImportError: # Optional; the robustness commands are unavailable without it.
+  numpy = None
+
+DEFAULT_HORIZON_DAYS = 7
+DEFAULT_SAMPLES      = 10000
+DRIFT_STDDEV_PER_DAY = 20 # iRating points. Drift is modelled as a random walk, so it grows with the square root of time.
+MAX_RANKED_BALANCES  = 10
+RANKED_BALANCES      = 5
+
+RobustnessReport = namedtuple('RobustnessReport', ['probability_inside', 'median_gap', 'p90_gap'])
+
+# Estimates how a balance might hold up until an event by sampling random iRating drifts for every driver at once,
+# and measuring the iRating gap between teams under each sample.
+class RobustnessSimulator:
+  def __init__(self, days=DEFAULT_HORIZON_DAYS, samples=DEFAULT_SAMPLES, stddev_per_day=DRIFT_STDDEV_PER_DAY, seed=None):
+    self.days = max(days, 1)
+    self.samples = samples
+    self.stddev = stddev_per_day * self.days ** 0.5
+    self.random = numpy.random.default_rng(seed)
+  
+  def available():
+    return numpy is not None
+  
+  def analyse(self, collection, threshold):
+    return self.rank([collection], threshold)[0][1]
+  
+  # Evaluates every collection against the same sampled drifts, and returns (collection, report) pairs with the
+  # collection most likely to stay inside the threshold first (or, without a threshold, the lowest median gap first).
+  def rank(self, collections, threshold):
+    driver_ids = sorted(set(driver.id for collection in collections for driver in collection.drivers()))
+    columns = {driver_id: column for column, driver_id in enumerate(driver_ids)}
+    iratings = numpy.zeros(len(driver_ids))
+    for collection in collections:
+      for driver in collection.drivers():
+        iratings[columns[driver.id]] = driver.irating
+    ratings = iratings + self.random.normal(0, self.stddev, size=(self.samples, len(driver_ids)))
+    reports = []
+    for collection in collections:
+      gaps = self.gap_samples(collection, ratings, columns)
+      probability = float(numpy.mean(gaps <= threshold)) if threshold else None
+      reports.append((collection, RobustnessReport(probability, float(numpy.median(gaps)), float(numpy.percentile(gaps, 90)))))
+    if threshold:
+      reports.sort(key=lambda report: (-report[1].probability_inside, report[1].median_gap))
+    else:
+      reports.sort(key=lambda report: report[1].median_gap)
+    return reports
+  
+  # Team averages for each sample come from one matrix product with a (drivers x teams) averaging matrix.
+  def gap_samples(self, collection, ratings, columns):
+    driver_sets = list(collection.driver_sets)
+    weights = numpy.zeros((ratings.shape[1], len(driver_sets)))
+    for team, driver_set in enumerate(driver_sets):
+      for driver in driver_set.drivers:
+        weights[columns[driver.id], team] = 1 / driver_set.size()
+    averages = ratings @ weights
+    return averages.max(axis=1) - averages.min(axis=1)
@@ -0,0 +1,13 @@
+import os
+
+# Discord assigns guilds to shards by this formula, so each shard process sees the messages of exactly these guilds.
+def shard_for_guild(guild_id, shard_count):
+  return (guild_id >> 22) % shard_count
+
+def is_own_guild(guild_id, shard_id, shard_count):
+  return shard_for_guild(guild_id, shard_count) == shard_id
+
+def shard_config_from_env():
+  shard_count = int(os.getenv('SHARD_COUNT') or 1)
+  shard_id = int(os.getenv('SHARD_ID') or 0)
+  return shard_id, shard_count
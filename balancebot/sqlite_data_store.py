@@ -0,0 +1,252 @@
+from datetime import datetime as dt
+import json
+import os
+import sqlite3
+
+from balancebot.data_store        import DATA_DIRECTORY, DataStore, FileName
+from balancebot.driver            import Driver
+from balancebot.driver_set        import DriverSet
+from balancebot.driver_collection import DriverCollection
+
+DATABASE_FILE = 'balancebot.sqlite3'
+OWN_SHARD_CONDITION = '(guild_id >> 22) % ? = ?' # Same formula as sharding.shard_for_guild, with (shard_count, shard_id) parameters.
+
+SCHEMA = '''
+  CREATE TABLE IF NOT EXISTS guilds (
+    guild_id          INTEGER PRIMARY KEY,
+    balance_threshold INTEGER,
+    team_sizes        TEXT NOT NULL DEFAULT '[]',
+    monitoring_data   TEXT NOT NULL DEFAULT '{}',
+    channel_id        INTEGER
+  );
+  CREATE INDEX IF NOT EXISTS guilds_channel_id ON guilds (channel_id) WHERE channel_id IS NOT NULL;
+  
+  CREATE TABLE IF NOT EXISTS drivers (
+    guild_id     INTEGER NOT NULL,
+    cust_id      INTEGER NOT NULL,
+    name         TEXT NOT NULL,
+    irating      INTEGER NOT NULL,
+    last_updated INTEGER NOT NULL,
+    PRIMARY KEY (guild_id, cust_id)
+  ) WITHOUT ROWID;
+  CREATE INDEX IF NOT EXISTS drivers_cust_id ON drivers (cust_id);
+  
+  CREATE TABLE IF NOT EXISTS driver_set_members (
+    guild_id  INTEGER NOT NULL,
+    kind      TEXT NOT NULL,
+    set_index INTEGER NOT NULL,
+    cust_id   INTEGER NOT NULL,
+    PRIMARY KEY (guild_id, kind, set_index, cust_id)
+  ) WITHOUT ROWID;
+  
+  CREATE TABLE IF NOT EXISTS events (
+    guild_id INTEGER NOT NULL,
+    name     TEXT NOT NULL,
+    data     TEXT NOT NULL,
+    PRIMARY KEY (guild_id, name)
+  ) WITHOUT ROWID;
+  
+  CREATE TABLE IF NOT EXISTS global_values (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+  );
+  
+  CREATE TABLE IF NOT EXISTS driver_identities (
+    cust_id      INTEGER PRIMARY KEY,
+    name         TEXT NOT NULL,
+    looked_up_at REAL NOT NULL
+  );
+'''
+
+# Same interface as DataStore, but keeps the data of all guilds in a single SQLite database.
+class SqliteDataStore:
+  _connection = None
+  shard_id = 0
+  shard_count = 1
+  
+  def __init__(self, guild_id):
+    self.guild_id = guild_id
+  
+  def connect(path=None):
+    if SqliteDataStore._connection:
+      SqliteDataStore._connection.close()
+    path = path or os.path.join(DATA_DIRECTORY, DATABASE_FILE)
+    SqliteDataStore._connection = sqlite3.connect(path, timeout=30, check_same_thread=False) # Used from the data store executor thread.
+    SqliteDataStore._connection.execute('PRAGMA journal_mode=WAL') # Lets shard processes read while another writes.
+    SqliteDataStore._connection.executescript(SCHEMA)
+    return SqliteDataStore._connection
+  
+  def connection():
+    return SqliteDataStore._connection or SqliteDataStore.connect()
+  
+  async def run_in_executor(function, *args):
+    return await DataStore.run_in_executor(function, *args)
+  
+  def configure_shard(shard_id, shard_count):
+    SqliteDataStore.shard_id = shard_id
+    SqliteDataStore.shard_count = shard_count
+  
+  def shard_parameters():
+    return (SqliteDataStore.shard_count, SqliteDataStore.shard_id)
+  
+  def guild_ids():
+    rows = SqliteDataStore.connection().execute('SELECT guild_id FROM guilds WHERE ' + OWN_SHARD_CONDITION, SqliteDataStore.shard_parameters())
+    return [row[0] for row in rows]
+  
+  def monitored_guild_ids():
+    rows = SqliteDataStore.connection().execute('''
+      SELECT guild_id FROM guilds
+      WHERE channel_id IS NOT NULL
+        AND EXISTS (SELECT 1 FROM drivers WHERE drivers.guild_id = guilds.guild_id)
+        AND ''' + OWN_SHARD_CONDITION, SqliteDataStore.shard_parameters())
+    return [row[0] for row in rows]
+  
+  # Guilds get their row on their first save, so loading a guild which has never stored anything doesn't write.
+  def create_guild_row(self, connection):
+    connection.execute('INSERT OR IGNORE INTO guilds (guild_id) VALUES (?)', (self.guild_id,))
+  
+  def save_monitored(self, monitored):
+    pass # Derived from the guilds and drivers tables by monitored_guild_ids.
+  
+  def load_guild_value(self, column):
+    row = SqliteDataStore.connection().execute('SELECT {0} FROM guilds WHERE guild_id = ?'.format(column), (self.guild_id,)).fetchone()
+    return row[0] if row else None
+  
+  def save_guild_values(self, **values):
+    assignments = ', '.join('{0} = ?'.format(column) for column in values)
+    with SqliteDataStore.connection() as connection:
+      self.create_guild_row(connection)
+      connection.execute('UPDATE guilds SET {0} WHERE guild_id = ?'.format(assignments), list(values.values()) + [self.guild_id])
+  
+  # Data access methods below sorted by data type rather than name of method.
+  
+  def load_balance(self, driver_set):
+    return self.load_driver_collection(FileName.balance.value, driver_set)
+  
+  def save_balance(self, balance):
+    self.save_driver_collection(FileName.balance.value, balance)
+  
+  def load_balance_threshold(self):
+    return self.load_guild_value('balance_threshold')
+  
+  def save_balance_threshold(self, balance_threshold):
+    self.save_guild_values(balance_threshold=balance_threshold)
+  
+  def load_combinations(self, driver_set):
+    return self.load_driver_collection(FileName.combinations.value, driver_set)
+  
+  def save_combinations(self, combinations):
+    self.save_driver_collection(FileName.combinations.value, combinations)
+  
+  def load_drivers(self):
+    rows = SqliteDataStore.connection().execute('SELECT cust_id, name, irating, last_updated FROM drivers WHERE guild_id = ?', (self.guild_id,))
+    drivers = DriverSet()
+    for cust_id, name, irating, last_updated in rows:
+      drivers.add_driver(Driver(cust_id, name, irating, last_updated=dt.fromtimestamp(last_updated)))
+    return drivers
+  
+  def save_drivers(self, driver_set):
+    rows = [(self.guild_id, driver.id, driver.name, driver.irating, int(driver.last_updated.timestamp())) for driver in driver_set.drivers]
+    with SqliteDataStore.connection() as connection:
+      self.create_guild_row(connection)
+      connection.execute('DELETE FROM drivers WHERE guild_id = ?', (self.guild_id,))
+      connection.executemany('INSERT INTO drivers (guild_id, cust_id, name, irating, last_updated) VALUES (?, ?, ?, ?, ?)', rows)
+  
+  def load_events(self):
+    rows = SqliteDataStore.connection().execute('SELECT name, data FROM events WHERE guild_id = ?', (self.guild_id,))
+    return {name: json.loads(data) for name, data in rows}
+  
+  def save_events(self, data):
+    rows = [(self.guild_id, name, json.dumps(event_data)) for name, event_data in data.items()]
+    with SqliteDataStore.connection() as connection:
+      self.create_guild_row(connection)
+      connection.execute('DELETE FROM events WHERE guild_id = ?', (self.guild_id,))
+      connection.executemany('INSERT INTO events (guild_id, name, data) VALUES (?, ?, ?)', rows)
+  
+  def load_monitoring_data(self):
+    return json.loads(self.load_guild_value('monitoring_data') or '{}')
+  
+  def save_monitoring_data(self, data):
+    self.save_guild_values(monitoring_data=json.dumps(data), channel_id=data.get('channel_id'))
+  
+  def load_team_sizes(self):
+    return json.loads(self.load_guild_value('team_sizes') or '[]')
+  
+  def save_team_sizes(self, team_sizes):
+    self.save_guild_values(team_sizes=json.dumps(team_sizes))
+  
+  def load_teams(self, driver_set):
+    return self.load_driver_collection(FileName.teams.value, driver_set)
+  
+  def save_teams(self, driver_sets):
+    self.save_driver_collection(FileName.teams.value, driver_sets)
+  
+  def load_driver_collection(self, kind, roster):
+    rows = SqliteDataStore.connection().execute('SELECT set_index, cust_id FROM driver_set_members WHERE guild_id = ? AND kind = ? ORDER BY set_index', (self.guild_id, kind))
+    sets = {}
+    for set_index, cust_id in rows:
+      driver_set = sets.setdefault(set_index, DriverSet())
+      driver = Driver.find(roster.drivers, cust_id)
+      if driver:
+        driver_set.add_driver(driver)
+    driver_collection = DriverCollection()
+    for driver_set in sets.values():
+      driver_collection.add_driver_set(driver_set)
+    return driver_collection
+  
+  def save_driver_collection(self, kind, driver_collection):
+    rows = [(self.guild_id, kind, set_index, driver.id) for set_index, driver_set in enumerate(driver_collection.driver_sets) for driver in driver_set.drivers]
+    with SqliteDataStore.connection() as connection:
+      self.create_guild_row(connection)
+      connection.execute('DELETE FROM driver_set_members WHERE guild_id = ? AND kind = ?', (self.guild_id, kind))
+      connection.executemany('INSERT INTO driver_set_members (guild_id, kind, set_index, cust_id) VALUES (?, ?, ?, ?)', rows)
+  
+  def load_global_value(key):
+    row = SqliteDataStore.connection().execute('SELECT value FROM global_values WHERE key = ?', (key,)).fetchone()
+    return json.loads(row[0]) if row else None
+  
+  def save_global_value(key, value):
+    with SqliteDataStore.connection() as connection:
+      connection.execute('INSERT OR REPLACE INTO global_values (key, value) VALUES (?, ?)', (key, json.dumps(value)))
+  
+  def load_quarter_number():
+    return SqliteDataStore.load_global_value(FileName.quarter_number.value)
+  
+  def save_quarter_number(quarter_number):
+    SqliteDataStore.save_global_value(FileName.quarter_number.value, quarter_number)
+  
+  def load_driver_identities():
+    rows = SqliteDataStore.connection().execute('SELECT cust_id, name, looked_up_at FROM driver_identities')
+    return {cust_id: [name, looked_up_at] for cust_id, name, looked_up_at in rows}
+  
+  # Keeps the most recent lookup of each driver, including those saved by other processes, and returns the result.
+  def save_driver_identities(data):
+    rows = [(int(cust_id), name, looked_up_at) for cust_id, (name, looked_up_at) in data.items()]
+    with SqliteDataStore.connection() as connection:
+      connection.executemany('''
+        INSERT INTO driver_identities (cust_id, name, looked_up_at) VALUES (?, ?, ?)
+        ON CONFLICT (cust_id) DO UPDATE SET name = excluded.name, looked_up_at = excluded.looked_up_at
+        WHERE excluded.looked_up_at > driver_identities.looked_up_at
+      ''', rows)
+    return SqliteDataStore.load_driver_identities()
+  
+  # Copies everything stored by the JSON DataStore into the database. Existing data for the same guilds is replaced.
+  def import_json_data(json_store_class):
+    guild_ids = json_store_class.guild_ids()
+    for guild_id in guild_ids:
+      json_store = json_store_class(guild_id)
+      sqlite_store = SqliteDataStore(guild_id)
+      drivers = json_store.load_drivers()
+      sqlite_store.save_drivers(drivers)
+      sqlite_store.save_balance(json_store.load_balance(drivers))
+      sqlite_store.save_balance_threshold(json_store.load_balance_threshold())
+      sqlite_store.save_combinations(json_store.load_combinations(drivers))
+      sqlite_store.save_events(json_store.load_events())
+      sqlite_store.save_monitoring_data(json_store.load_monitoring_data())
+      sqlite_store.save_team_sizes(json_store.load_team_sizes())
+      sqlite_store.save_teams(json_store.load_teams(drivers))
+    quarter_number = json_store_class.load_quarter_number()
+    if quarter_number:
+      SqliteDataStore.save_quarter_number(quarter_number)
+    SqliteDataStore.save_driver_identities(json_store_class.load_driver_identities())
+    return len(guild_ids)
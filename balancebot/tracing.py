@@ -0,0 +1,63 @@
+from collections import defaultdict
+import contextlib
+import contextvars
+import itertools
+import json
+import logging
+import time
+
+TRACE_LOGGER = logging.getLogger('balancebot.trace')
+TRACE_LOGGER.propagate = False # Spans go to their own JSON lines file, configured in main.py, and never to bot.log.
+
+CURRENT_SPAN = contextvars.ContextVar('current_span', default=None)
+SPAN_IDS = itertools.count(1)
+
+# A timed section of work. Spans nest by asyncio task context, so work started with asyncio.gather inside a span
+# is recorded as its children. Each span also totals the time spent in its direct children by name.
+class Span:
+  def __init__(self, name, parent, attributes):
+    self.name = name
+    self.parent = parent
+    self.attributes = attributes
+    self.span_id = next(SPAN_IDS)
+    self.trace_id = parent.trace_id if parent else self.span_id
+    self.child_durations = defaultdict(float)
+    self.duration = None
+    self.started_at = time.time()
+    self._started_at = time.perf_counter()
+  
+  def finish(self):
+    self.duration = time.perf_counter() - self._started_at
+    if self.parent:
+      self.parent.child_durations[self.name] += self.duration
+    if TRACE_LOGGER.hasHandlers():
+      TRACE_LOGGER.info(json.dumps(self.record()))
+  
+  def record(self):
+    return dict(self.attributes,
+                trace=self.trace_id,
+                span=self.span_id,
+                parent=self.parent.span_id if self.parent else None,
+                name=self.name,
+                start=round(self.started_at, 6),
+                duration=round(self.duration, 6))
+  
+  def set(self, **attributes):
+    self.attributes.update(attributes)
+  
+  def summary(self):
+    parts = ['{0} {1:.2f}s'.format(name, duration) for name, duration in sorted(self.child_durations.items(), key=lambda item: -item[1])]
+    return '{0:.2f}s ({1})'.format(self.duration, ', '.join(parts) or 'no traced work')
+
+@contextlib.contextmanager
+def span(name, **attributes):
+  new_span = Span(name, CURRENT_SPAN.get(), attributes)
+  token = CURRENT_SPAN.set(new_span)
+  try:
+    yield new_span
+  except Exception as error:
+    new_span.set(error=type(error).__name__)
+    raise
+  finally:
+    CURRENT_SPAN.reset(token)
+    new_span.finish()
@@ -0,0 +1,25 @@
+import os
+import signal
+import subprocess
+import sys
+
+# Runs main.py once per shard on this host. Each process handles the guilds Discord assigns to its shard,
+# and only reads and writes the data of those guilds.
+# Usage: python launch_shards.py [shard count] (defaults to SHARD_COUNT, or the number of CPUs)
+
+def main():
+  shard_count = int(sys.argv[1] if len(sys.argv) > 1 else os.getenv('SHARD_COUNT') or os.cpu_count())
+  processes = []
+  for shard_id in range(shard_count):
+    env = dict(os.environ, SHARD_ID=str(shard_id), SHARD_COUNT=str(shard_count))
+    processes.append(subprocess.Popen([sys.executable, 'main.py'], env=env))
+  def stop(signal_number, frame):
+    for process in processes:
+      process.terminate()
+  signal.signal(signal.SIGTERM, stop)
+  signal.signal(signal.SIGINT, stop)
+  exit_codes = [process.wait() for process in processes]
+  sys.exit(1 if any(exit_codes) else 0)
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,97 @@
+import logging
+logging.basicConfig(level=logging.WARNING,
+                    format='[%(asctime)s %(levelname)07s]:%(message)s')
+
+import argparse
+import asyncio
+import os
+import random
+import resource
+import tempfile
+import time
+
+from balancebot.background_rechecker  import BackgroundRechecker
+from balancebot.data_store            import DataStore, DATA_DIRECTORY
+from balancebot.driver                import Driver
+from balancebot.driver_identity_cache import DriverIdentityCache
+from balancebot.driver_set            import DriverSet
+from balancebot.fakes.discord_client  import FakeDiscordClient
+from balancebot.fakes.iracing_client  import FakeIRacingClient
+from balancebot.guild_registry        import GuildRegistry
+from balancebot.irating_history       import IRatingHistory
+from balancebot.recheck_scheduler     import RecheckScheduler
+from balancebot.resilient_client      import ResilientClient
+
+# Measures background recheck throughput against synthetic guilds and a fake iRacing service, in a throwaway data directory.
+
+def parse_args():
+  parser = argparse.ArgumentParser(description='Run background rechecks over synthetic guilds against a fake iRacing service.')
+  parser.add_argument('--guilds', type=int, default=1000)
+  parser.add_argument('--drivers-per-guild', type=int, default=8)
+  parser.add_argument('--driver-pool', type=int, default=5000, help='number of distinct synthetic drivers shared between guilds')
+  parser.add_argument('--team-sizes', type=str, default='4')
+  parser.add_argument('--latency', type=float, default=0.05, help='mean seconds per iRacing call')
+  parser.add_argument('--latency-jitter', type=float, default=0.02)
+  parser.add_argument('--error-rate', type=float, default=0)
+  parser.add_argument('--rating-change-rate', type=float, default=0.1)
+  parser.add_argument('--retry-backoff', type=float, default=0.5, help='base seconds between retries of failed iRacing calls')
+  parser.add_argument('--cycles', type=int, default=1)
+  parser.add_argument('--seed', type=int, default=None)
+  return parser.parse_args()
+
+def populate_guilds(args, di_client, rng):
+  team_sizes = [int(size) for size in args.team_sizes.split(',')]
+  cust_ids = list(FakeIRacingClient.synthetic_cust_ids(args.driver_pool))
+  for guild_id in range(1, args.guilds + 1):
+    data_store = DataStore(guild_id)
+    drivers = DriverSet()
+    for cust_id in rng.sample(cust_ids, args.drivers_per_guild):
+      drivers.add_driver(Driver(cust_id, 'Synthetic Driver {0}'.format(cust_id), 1350))
+    data_store.save_drivers(drivers)
+    data_store.save_team_sizes(team_sizes)
+    data_store.save_monitoring_data({'channel_id': guild_id})
+    di_client.add_channel(guild_id, 'Synthetic Guild {0}'.format(guild_id))
+
+async def run_cycles(args, rechecker, ir_client, di_client):
+  started_at = time.perf_counter()
+  await rechecker.warm_start()
+  print('Warm start: {0:.2f}s, {1} guilds loaded'.format(time.perf_counter() - started_at, rechecker.guild_registry.size()))
+  for cycle in range(1, args.cycles + 1):
+    rechecker.scheduler = RecheckScheduler() # Every driver is due, as in a full sweep.
+    started_at = time.perf_counter()
+    await rechecker.sync_recheck_schedule()
+    synced_at = time.perf_counter()
+    calls_before = ir_client.call_count()
+    try:
+      await rechecker.perform_background_rechecks()
+      outcome = 'completed'
+    except Exception as error:
+      outcome = 'aborted ({0!r})'.format(error)
+    finished_at = time.perf_counter()
+    calls = ir_client.call_count() - calls_before
+    recheck_seconds = finished_at - synced_at
+    print('Cycle {0} {1}: schedule sync {2:.2f}s, rechecks {3:.2f}s, {4} iRacing calls ({5:.1f}/s), {6} Discord calls'.format(
+      cycle, outcome, synced_at - started_at, recheck_seconds, calls, calls / recheck_seconds if recheck_seconds else 0, sum(di_client.calls.values())))
+  print('iRacing calls by method: {0}'.format(dict(ir_client.calls)))
+  print('iRacing latencies: {0}'.format(rechecker.ir_client.latencies.summary()))
+  print('Peak resident set size: {0:.1f} MiB'.format(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024)) # ru_maxrss is in KiB on Linux.
+
+def main():
+  args = parse_args()
+  rng = random.Random(args.seed)
+  with tempfile.TemporaryDirectory() as directory:
+    os.chdir(directory)
+    os.mkdir(DATA_DIRECTORY)
+    ir_client = FakeIRacingClient(driver_count=args.driver_pool,
+                                  latency=args.latency,
+                                  latency_jitter=args.latency_jitter,
+                                  error_rate=args.error_rate,
+                                  rating_change_rate=args.rating_change_rate,
+                                  seed=args.seed)
+    di_client = FakeDiscordClient()
+    populate_guilds(args, di_client, rng)
+    rechecker = BackgroundRechecker(ResilientClient(ir_client, backoff=args.retry_backoff), di_client, DataStore, DriverIdentityCache(DataStore), GuildRegistry(DataStore), IRatingHistory(), RecheckScheduler())
+    asyncio.run(run_cycles(args, rechecker, ir_client, di_client))
+
+if __name__ == '__main__':
+  main()
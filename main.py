@@ -1,42 +1,65 @@
 import logging
-logging.basicConfig(filename='bot.log',
+import logging.handlers
+import os
+log_name = 'bot.shard{0}'.format(os.getenv('SHARD_ID')) if os.getenv('SHARD_ID') else 'bot'
+logging.basicConfig(filename=log_name + '.log',
                     level=logging.INFO,
                     format='[%(asctime)s %(levelname)07s]:%(message)s')
+trace_handler = logging.handlers.RotatingFileHandler(log_name + '.trace.jsonl', maxBytes=10 * 1024 * 1024, backupCount=3)
+logging.getLogger('balancebot.trace').addHandler(trace_handler) # The default formatter writes each span as a bare JSON line.
 
 import asyncio
 import discord
 import dotenv
-import os
-from periodic import Periodic
 from pyracing import client as pyracing
 
-from balancebot.balance_bot                import BalanceBot
+from balancebot.background_rechecker       import BackgroundRechecker
 from balancebot.data_store                 import DataStore
-from balancebot.interfaces.discord_channel import DiscordChannel
+from balancebot.driver_identity_cache      import DriverIdentityCache
+from balancebot.guild_registry             import GuildRegistry
+from balancebot.irating_history            import IRatingHistory
+from balancebot.metrics_server             import MetricsServer
+from balancebot.periodic_tasks             import PeriodicTasks
+from balancebot.recheck_scheduler          import RecheckScheduler
+from balancebot.resilient_client           import IRacingUnavailable, ResilientClient
+from balancebot.sharding                   import shard_config_from_env
+from balancebot.sqlite_data_store          import SqliteDataStore
 
 BACKGROUND_RECHECK_PERIOD_MINUTES = 15
 QUARTER_CHECK_PERIOD_MINUTES = 60
+RECHECK_TICK_SECONDS = 60
 
 dotenv.load_dotenv()
-di_client = discord.Client()
-ir_client = pyracing.Client(os.getenv('IR_USERNAME'), os.getenv('IR_PASSWORD'))
-
-async def check_quarter_number():
-  bot = BalanceBot(ir_client, DataStore)
-  await bot.update_quarter_number()
-
-async def perform_background_rechecks():
-  for guild_id in DataStore.data_subdirectory_numbers():
-    bot = BalanceBot(ir_client, DataStore)
-    interface = DiscordChannel(di_client)
-    bot.set_interface(interface)
-    interface.set_bot(bot)
-    await interface.perform_background_recheck(guild_id)
+data_store_class = SqliteDataStore if os.getenv('DATA_STORE') == 'sqlite' else DataStore
+shard_id, shard_count = shard_config_from_env()
+data_store_class.configure_shard(shard_id, shard_count)
+# The bot only needs guild channels (to find its notification channel) and messages that mention it, so it asks Discord
+# for nothing else and keeps no member or message caches.
+intents = discord.Intents.none()
+intents.guilds = True
+intents.guild_messages = True
+client_options = dict(intents=intents,
+                      member_cache_flags=discord.MemberCacheFlags.none(),
+                      chunk_guilds_at_startup=False,
+                      max_messages=None)
+if shard_count > 1:
+  di_client = discord.Client(shard_id=shard_id, shard_count=shard_count, **client_options)
+else:
+  di_client = discord.Client(**client_options)
+ir_client = ResilientClient(pyracing.Client(os.getenv('IR_USERNAME'), os.getenv('IR_PASSWORD')))
+scheduler = RecheckScheduler()
+identity_cache = DriverIdentityCache(data_store_class)
+guild_registry = GuildRegistry(data_store_class)
+irating_history = IRatingHistory()
+rechecker = BackgroundRechecker(ir_client, di_client, data_store_class, identity_cache, guild_registry, irating_history, scheduler, cycle_period_seconds=RECHECK_TICK_SECONDS)
+periodic_tasks = PeriodicTasks(rechecker, BACKGROUND_RECHECK_PERIOD_MINUTES * 60, RECHECK_TICK_SECONDS, QUARTER_CHECK_PERIOD_MINUTES * 60)
+metrics_server = MetricsServer(rechecker, int(os.getenv('METRICS_PORT'))) if os.getenv('METRICS_PORT') else None
 
 @di_client.event
 async def on_ready():
-  await Periodic(BACKGROUND_RECHECK_PERIOD_MINUTES * 60, perform_background_rechecks).start()
-  await Periodic(QUARTER_CHECK_PERIOD_MINUTES * 60, check_quarter_number).start()
+  if metrics_server:
+    await metrics_server.start()
+  await periodic_tasks.start()
 
 @di_client.event
 async def on_message(message):
@@ -44,14 +67,19 @@ async def on_message(message):
     return
   if di_client.user == message.author:
     return
-  try:
-    bot = BalanceBot(ir_client, DataStore)
-    interface = DiscordChannel(di_client)
-    bot.set_interface(interface)
-    interface.set_bot(bot)
-    await interface.process_request(message)
-  except:
-    await bot.alert_error_received()
-    raise
+  guild_id = message.channel.guild.id
+  async with guild_registry.lock(guild_id): # Don't interleave with background rechecks or other commands for this guild.
+    try:
+      bot, interface = rechecker.new_bot()
+      await interface.process_request(message)
+    except IRacingUnavailable:
+      logging.exception('iRacing unavailable while processing request.')
+      await bot.alert_iracing_unavailable()
+      await interface.flush_output()
+    except:
+      guild_registry.invalidate(guild_id) # Don't keep state a failed command may have left half-changed.
+      await bot.alert_error_received()
+      await interface.flush_output()
+      raise
 
 di_client.run(os.getenv('TOKEN'))
\ No newline at end of file
@@ -0,0 +1,9 @@
+from balancebot.data_store        import DataStore
+from balancebot.sqlite_data_store import SqliteDataStore
+
+# One-shot copy of the JSON files under data/ into data/balancebot.sqlite3.
+# Stop the bot first, then set DATA_STORE=sqlite in .env before starting it again.
+
+if __name__ == '__main__':
+  guild_count = SqliteDataStore.import_json_data(DataStore)
+  print('Migrated data for {0} guilds.'.format(guild_count))
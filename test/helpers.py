@@ -0,0 +1,55 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+from balancebot.data_store        import DATA_DIRECTORY
+from balancebot.driver_collection import DriverCollection
+
+# Runs each test's coroutines on an event loop of its own, which is closed once the test is done.
+class EventLoopTestCase(unittest.TestCase):
+  def setUp(self):
+    self.loop = asyncio.new_event_loop()
+  
+  def tearDown(self):
+    self.loop.close()
+  
+  def run_until_complete(self, coroutine):
+    return self.loop.run_until_complete(coroutine)
+
+# Runs each test in an empty temporary working directory, so that data stores read and write their own files.
+class DataDirectoryTestCase(EventLoopTestCase):
+  def setUp(self):
+    super().setUp()
+    self.original_directory = os.getcwd()
+    self.directory = tempfile.TemporaryDirectory()
+    os.chdir(self.directory.name)
+    os.mkdir(DATA_DIRECTORY)
+  
+  def tearDown(self):
+    os.chdir(self.original_directory)
+    self.directory.cleanup()
+    super().tearDown()
+
+# Loads a guild with no teams, balance, combinations or settings. Subclasses provide the drivers.
+class StubDataStore:
+  def load_balance(self, driver_set):
+    return DriverCollection()
+  
+  def load_balance_threshold(self):
+    return None
+  
+  def load_combinations(self, driver_set):
+    return DriverCollection()
+  
+  def load_events(self):
+    return {}
+  
+  def load_monitoring_data(self):
+    return {}
+  
+  def load_team_sizes(self):
+    return []
+  
+  def load_teams(self, driver_set):
+    return DriverCollection()
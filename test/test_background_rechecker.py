@@ -0,0 +1,144 @@
+import asyncio
+from collections import Counter
+from datetime import datetime as dt
+
+from balancebot.background_rechecker  import BackgroundRechecker, MAX_CONCURRENT_GUILD_RECHECKS
+from balancebot.balance_bot           import BalanceBot
+from balancebot.data_store            import DataStore
+from balancebot.driver                import Driver
+from balancebot.driver_identity_cache import DriverIdentityCache
+from balancebot.driver_set            import DriverSet
+from balancebot.fakes.discord_client  import FakeDiscordClient
+from balancebot.fakes.iracing_client  import FakeIRacingClient
+from balancebot.guild_registry        import GuildRegistry
+from balancebot.irating_history       import IRatingHistory
+from balancebot.rating_events         import RatingEventBus
+from balancebot.recheck_scheduler     import RecheckScheduler, ACTIVE_INTERVAL
+
+from helpers import DataDirectoryTestCase
+
+# Tracks how many guild rechecks are running at once, overall and per guild, and whether guilds are saved under their lock.
+class CountingRechecker(BackgroundRechecker):
+  def __init__(self, *args, **kwargs):
+    super().__init__(*args, **kwargs)
+    self.in_flight = Counter()
+    self.rechecks = 0
+    self.max_in_flight = 0
+    self.max_in_flight_per_guild = 0
+    self.saves = []
+  
+  def new_bot(self):
+    bot, interface = super().new_bot()
+    perform_background_recheck = interface.perform_background_recheck
+    async def counted_recheck(guild_id, driver_ids=None):
+      self.in_flight[guild_id] += 1
+      self.rechecks += 1
+      self.max_in_flight = max(self.max_in_flight, sum(self.in_flight.values()))
+      self.max_in_flight_per_guild = max(self.max_in_flight_per_guild, self.in_flight[guild_id])
+      try:
+        return await perform_background_recheck(guild_id, driver_ids)
+      finally:
+        self.in_flight[guild_id] -= 1
+    interface.perform_background_recheck = counted_recheck
+    save_guild = bot.save_guild
+    async def recorded_save():
+      self.saves.append((bot.guild.get_id(), self.guild_registry.lock(bot.guild.get_id()).locked()))
+      await save_guild()
+    bot.save_guild = recorded_save
+    return bot, interface
+
+class RecheckerTestCase(DataDirectoryTestCase):
+  def setUp(self):
+    super().setUp()
+    BalanceBot.quarter_number = 1
+    self.ir_client = FakeIRacingClient(driver_count=50, latency=0.01, latency_jitter=0, rating_change_rate=0, seed=1)
+    self.di_client = FakeDiscordClient()
+    self.rechecker = CountingRechecker(self.ir_client, self.di_client, DataStore, DriverIdentityCache(DataStore),
+                                       GuildRegistry(DataStore), IRatingHistory(), RecheckScheduler())
+  
+  def add_guild(self, guild_id, cust_ids):
+    data_store = DataStore(guild_id)
+    drivers = DriverSet()
+    for cust_id in cust_ids:
+      drivers.add_driver(Driver(cust_id, 'Synthetic Driver {0}'.format(cust_id), self.ir_client.iratings[cust_id]))
+    data_store.save_drivers(drivers)
+    data_store.save_team_sizes([2])
+    data_store.save_monitoring_data({'channel_id': guild_id})
+    self.di_client.add_channel(guild_id, 'Guild {0}'.format(guild_id))
+
+class TestCycles(RecheckerTestCase):
+  def test_overlapping_cycle_is_skipped(self):
+    self.add_guild(1, [100000, 100001, 100002, 100003])
+    self.run_until_complete(self.rechecker.sync_recheck_schedule())
+    
+    async def overlapping_cycles():
+      first_cycle = asyncio.ensure_future(self.rechecker.perform_background_rechecks())
+      await asyncio.sleep(0)
+      with self.assertLogs(level='WARNING') as logs:
+        await self.rechecker.perform_background_rechecks()
+      await first_cycle
+      return logs.output
+    
+    logs = self.run_until_complete(overlapping_cycles())
+    self.assertTrue(any('Skipping background recheck cycle' in line for line in logs))
+    self.assertEqual(self.ir_client.calls['event_results'], 4,
+    "A cycle started while another is running should not recheck anything")
+    self.assertEqual(self.rechecker.rechecks, 1)
+  
+  def test_guild_rechecks_are_capped(self):
+    guild_count = MAX_CONCURRENT_GUILD_RECHECKS * 2
+    for guild_id in range(1, guild_count + 1):
+      self.add_guild(guild_id, [100000 + guild_id * 2, 100001 + guild_id * 2])
+    self.run_until_complete(self.rechecker.sync_recheck_schedule())
+    self.run_until_complete(self.rechecker.perform_background_rechecks())
+    self.assertEqual(self.rechecker.rechecks, guild_count)
+    self.assertEqual(self.rechecker.max_in_flight, MAX_CONCURRENT_GUILD_RECHECKS,
+    "Guilds should be rechecked concurrently, but no more than the limit at once")
+  
+  def test_rechecks_of_one_guild_are_serialised(self):
+    self.add_guild(1, [100000, 100001, 100002, 100003])
+    
+    async def concurrent_rechecks():
+      worker_slots = asyncio.Semaphore(MAX_CONCURRENT_GUILD_RECHECKS)
+      await asyncio.gather(self.rechecker.perform_guild_recheck(1, [100000, 100001], worker_slots, []),
+                           self.rechecker.perform_guild_recheck(1, [100002, 100003], worker_slots, []))
+    
+    self.run_until_complete(concurrent_rechecks())
+    self.assertEqual(self.ir_client.calls['event_results'], 4)
+    self.assertEqual(self.rechecker.max_in_flight_per_guild, 1,
+    "Rechecks of the same guild should wait for the guild's lock")
+
+class TestRatingPropagation(RecheckerTestCase):
+  def setUp(self):
+    super().setUp()
+    self.rechecker.rating_events = RatingEventBus(self.rechecker.propagate_rating_changes, debounce_seconds=0.01)
+    self.add_guild(1, [100000, 100001])
+    self.add_guild(2, [100000, 100002, 100003, 100004])
+    self.run_until_complete(self.rechecker.sync_recheck_schedule())
+    self.ir_client.iratings[100000] += 100
+    self.new_irating = self.ir_client.iratings[100000]
+    
+    async def recheck_first_guild():
+      worker_slots = asyncio.Semaphore(MAX_CONCURRENT_GUILD_RECHECKS)
+      await self.rechecker.perform_guild_recheck(1, [100000, 100001], worker_slots, [])
+      await asyncio.sleep(0.1) # Past the debounce, for the change to reach the second guild.
+    
+    self.run_until_complete(recheck_first_guild())
+  
+  def test_change_updates_and_rebalances_other_guild(self):
+    self.assertEqual(self.ir_client.calls['event_results'], 2,
+    "The shared driver should only be fetched by the guild which rechecked it")
+    saved_drivers = DataStore(2).load_drivers()
+    self.assertEqual(Driver.find(saved_drivers.drivers, 100000).irating, self.new_irating,
+    "The other guild's copy of the driver should be updated and saved")
+    self.assertEqual(DataStore(2).load_balance(saved_drivers).size(), 2,
+    "The other guild should be rebalanced")
+    self.assertIn((2, True), self.rechecker.saves)
+    self.assertNotIn((2, False), self.rechecker.saves,
+    "The other guild should only be saved while holding its lock")
+  
+  def test_other_guilds_checks_of_changed_drivers_are_moved_back(self):
+    self.assertGreater(self.rechecker.scheduler.next_check(2, 100000), dt.now() + ACTIVE_INTERVAL / 2,
+    "The other guild's check of the changed driver should be pushed back, as if it had just checked it")
+    self.assertLessEqual(self.rechecker.scheduler.next_check(2, 100002), dt.now(),
+    "The other guild's checks of unchanged drivers should stay due")
@@ -0,0 +1,192 @@
+import threading
+import unittest
+from unittest.mock import patch
+
+from balancebot.balance_bot           import BalanceBot, BULK_LOOKUP_CONCURRENCY
+from balancebot.balance_solver        import BalanceSolver
+from balancebot.data_store            import DataStore
+from balancebot.driver_identity_cache import DriverIdentityCache
+from balancebot.fakes.iracing_client  import FakeIRacingClient
+from balancebot.guild_registry        import GuildRegistry
+from balancebot.irating_history       import IRatingHistory
+from balancebot.robustness            import RobustnessSimulator
+
+from helpers import DataDirectoryTestCase
+
+class RecordingInterface:
+  def __init__(self):
+    self.messages = []
+  
+  async def indicate_progress(self):
+    pass
+  
+  def is_monitoring_possible(self):
+    return True
+  
+  async def print(self, message):
+    self.messages.append(message)
+
+class ConcurrencyTrackingClient(FakeIRacingClient):
+  def __init__(self, **kwargs):
+    super().__init__(latency=0.01, latency_jitter=0, rating_change_rate=0, seed=1, **kwargs)
+    self.in_flight = 0
+    self.max_in_flight = 0
+  
+  async def call(self, method_name):
+    self.in_flight += 1
+    self.max_in_flight = max(self.max_in_flight, self.in_flight)
+    try:
+      await super().call(method_name)
+    finally:
+      self.in_flight -= 1
+
+class BotTestCase(DataDirectoryTestCase):
+  def setUp(self):
+    super().setUp()
+    self.client = ConcurrencyTrackingClient(driver_count=20)
+    self.guild_registry = GuildRegistry(DataStore)
+    BalanceBot.quarter_number = None
+  
+  def new_bot(self, guild_id=1):
+    bot = BalanceBot(self.client, DataStore, DriverIdentityCache(DataStore), self.guild_registry, IRatingHistory())
+    bot.set_interface(RecordingInterface())
+    self.run_until_complete(bot.initialize_guild(guild_id))
+    return bot
+
+class TestAddDrivers(BotTestCase):
+  def test_several_names_are_added(self):
+    bot = self.new_bot()
+    self.run_until_complete(bot.add_drivers(['Synthetic Driver 100000', 'Synthetic Driver 100001', 100002]))
+    self.assertEqual(sorted(driver.id for driver in bot.guild.get_drivers()), [100000, 100001, 100002],
+    "Every driver found should be added")
+    self.assertEqual([driver.irating for driver in sorted(bot.guild.get_drivers(), key=lambda driver: driver.id)],
+                     [self.client.iratings[cust_id] for cust_id in (100000, 100001, 100002)],
+    "Added drivers should have their current iRating")
+  
+  def test_lookups_are_capped(self):
+    bot = self.new_bot()
+    self.run_until_complete(bot.add_drivers(list(FakeIRacingClient.synthetic_cust_ids(12))))
+    self.assertEqual(bot.guild.driver_count(), 12)
+    self.assertEqual(self.client.max_in_flight, BULK_LOOKUP_CONCURRENCY,
+    "Lookups should run concurrently, but no more than the limit at once")
+  
+  def test_failures_are_reported_without_dropping_successes(self):
+    bot = self.new_bot()
+    self.run_until_complete(bot.add_drivers(['Synthetic Driver 100000', 'Nobody In Particular', 999999, 100003]))
+    self.assertEqual(sorted(driver.id for driver in bot.guild.get_drivers()), [100000, 100003],
+    "Drivers which could be found should still be added")
+    summary = bot.interface.messages[-1]
+    self.assertIn('Added 2 driver(s)', summary)
+    self.assertIn('Could not add 2 driver(s)', summary)
+    self.assertIn('No driver was found with the name Nobody In Particular', summary)
+    self.assertIn('error looking up 999999', summary,
+    "Each failure should be reported along with the successes")
+
+class TestQuarterNumber(BotTestCase):
+  def tearDown(self):
+    DataStore.configure_shard(0, 1)
+    super().tearDown()
+  
+  def test_first_shard_asks_iracing(self):
+    bot = self.new_bot()
+    self.run_until_complete(bot.find_driver_irating(100000))
+    self.assertEqual(self.client.calls['current_seasons'], 1)
+    self.assertEqual(DataStore.load_quarter_number(), self.client.quarter_number)
+  
+  def test_other_shards_reload_saved_quarter_number(self):
+    DataStore.configure_shard(1, 2)
+    bot = self.new_bot()
+    DataStore.save_quarter_number(3) # By the first shard, once this one is running.
+    self.run_until_complete(bot.find_driver_irating(100000))
+    self.assertEqual(self.client.calls['current_seasons'], 0,
+    "Only the first shard should ask iRacing for the quarter number")
+    self.assertEqual(BalanceBot.quarter_number, 3,
+    "Other shards should use the quarter number saved by the first shard")
+
+class TestTeamSizes(BotTestCase):
+  def test_sizes_outside_the_allowed_range_are_rejected(self):
+    bot = self.new_bot()
+    for team_sizes in ([1, 3], [3, 11]):
+      self.run_until_complete(bot.set_team_sizes(team_sizes))
+    self.assertEqual(bot.guild.team_sizes, [],
+    "Team sizes below 2 or above 10 should not be set")
+    self.assertEqual(bot.interface.messages, ['Team size 1 is not valid. Team sizes must be integers between 2 and 10.',
+                                              'Team size 11 is not valid. Team sizes must be integers between 2 and 10.'])
+  
+  def test_valid_sizes_are_set_in_order(self):
+    bot = self.new_bot()
+    self.run_until_complete(bot.set_team_sizes([10, 2]))
+    self.assertEqual(bot.guild.team_sizes, [2, 10])
+
+@unittest.skipIf(not RobustnessSimulator.available(), 'numpy is not installed')
+class TestRobustness(BotTestCase):
+  def test_simulation_runs_off_the_event_loop(self):
+    bot = self.new_bot()
+    self.run_until_complete(bot.add_drivers(list(FakeIRacingClient.synthetic_cust_ids(4))))
+    bot.guild.set_team_sizes([2])
+    self.run_until_complete(bot.recalculate_balance())
+    threads = []
+    analyse = RobustnessSimulator.analyse
+    def recording_analyse(simulator, collection, threshold):
+      threads.append(threading.current_thread())
+      return analyse(simulator, collection, threshold)
+    with patch.object(RobustnessSimulator, 'analyse', recording_analyse):
+      self.run_until_complete(bot.show_robustness())
+    self.assertIn('For the current optimal balance', bot.interface.messages[-1])
+    self.assertEqual(len(threads), 1)
+    self.assertIsNot(threads[0], threading.main_thread(),
+    "The simulation should run on the solver executor, not the event loop")
+
+class TestEvents(BotTestCase):
+  def setUp(self):
+    super().setUp()
+    self.solver = BalanceBot.solver
+    BalanceBot.solver = BalanceSolver()
+    self.bot = self.new_bot()
+    self.run_until_complete(self.bot.add_drivers(list(FakeIRacingClient.synthetic_cust_ids(6))))
+    for name, driver_ids in [('Sprint', [100000, 100001, 100002, 100003]),
+                             ('Endurance', [100002, 100003, 100004, 100005]),
+                             ('Feature', [100005, 100004, 100003, 100002])]:
+      self.run_until_complete(self.bot.add_event(name))
+      self.run_until_complete(self.bot.set_event_drivers(name, driver_ids))
+      self.run_until_complete(self.bot.set_event_team_sizes(name, [2]))
+    self.bot.interface.messages = []
+  
+  def tearDown(self):
+    BalanceBot.solver = self.solver
+    super().tearDown()
+  
+  def recheck_after_change(self, cust_id):
+    self.client.iratings[cust_id] += 200
+    self.run_until_complete(self.bot.background_recheck([cust_id]))
+  
+  def test_only_events_with_a_changed_driver_are_rebalanced(self):
+    self.recheck_after_change(100000)
+    events = self.bot.guild.events
+    self.assertEqual(BalanceBot.solver.searches, 1)
+    self.assertEqual(len(events['Sprint'].balance), 2)
+    self.assertEqual((events['Endurance'].balance, events['Feature'].balance), ([], []),
+    "Events without the changed driver should not be rebalanced")
+    self.assertTrue(any('event Sprint' in message for message in self.bot.interface.messages))
+    self.assertFalse(any('event Endurance' in message for message in self.bot.interface.messages))
+  
+  def test_events_with_identical_rosters_are_solved_once(self):
+    self.recheck_after_change(100002)
+    events = self.bot.guild.events
+    self.assertEqual(BalanceBot.solver.searches, 2,
+    "Events with the same drivers, team sizes and combinations should share a search")
+    self.assertEqual(BalanceBot.solver.shared_searches + BalanceBot.solver.cached_searches, 1)
+    self.assertEqual(events['Endurance'].balance, events['Feature'].balance)
+    self.assertTrue(all(events[name].balance for name in events))
+  
+  def test_event_balance_keeps_combinations_together(self):
+    self.run_until_complete(self.bot.add_event_combinations('Sprint', [[100000, 100001]]))
+    self.run_until_complete(self.bot.show_event_balance('Sprint'))
+    self.assertIn([100000, 100001], self.bot.guild.events['Sprint'].balance,
+    "Combined drivers should be balanced onto the same team")
+    self.assertTrue(self.bot.interface.messages[-1].startswith('Optimal balance of event Sprint'))
+  
+  def test_event_drivers_must_be_guild_drivers(self):
+    self.run_until_complete(self.bot.set_event_drivers('Sprint', [100000, 'Nobody In Particular']))
+    self.assertEqual(self.bot.guild.events['Sprint'].driver_ids, {100000, 100001, 100002, 100003},
+    "An event's drivers should be left alone if any of the new drivers isn't in the guild")
@@ -0,0 +1,58 @@
+import asyncio
+
+from helpers import EventLoopTestCase
+
+from balancebot.balance_solver    import BalanceSolver
+from balancebot.driver            import Driver
+from balancebot.driver_collection import DriverCollection
+
+def roster():
+  return [Driver(1, 'A', 3000), Driver(2, 'B', 2000), Driver(3, 'C', 1500), Driver(4, 'D', 1000)]
+
+class TestSingleFlight(EventLoopTestCase):
+  def test_concurrent_identical_requests_share_one_search(self):
+    solver = BalanceSolver()
+    first_roster, second_roster = roster(), roster()
+    
+    async def solve_both():
+      return await asyncio.gather(solver.solve(first_roster, [2], DriverCollection()),
+                                  solver.solve(second_roster, [2], DriverCollection()))
+    
+    first, second = self.run_until_complete(solve_both())
+    self.assertEqual((solver.searches, solver.shared_searches), (1, 1))
+    self.assertEqual(first, second,
+    "Both requesters should get the same balance")
+    self.assertTrue(all(any(driver is own for own in second_roster) for driver in second.drivers()),
+    "Each requester's balance should hold its own driver objects")
+  
+  def test_different_ratings_are_searched_separately(self):
+    solver = BalanceSolver()
+    changed_roster = roster()
+    changed_roster[0].irating = 3100
+    
+    async def solve_both():
+      return await asyncio.gather(solver.solve(roster(), [2], DriverCollection()),
+                                  solver.solve(changed_roster, [2], DriverCollection()))
+    
+    self.run_until_complete(solve_both())
+    self.assertEqual((solver.searches, solver.shared_searches), (2, 0))
+  
+  def test_later_identical_requests_reuse_the_result(self):
+    solver = BalanceSolver()
+    self.run_until_complete(solver.solve(roster(), [2], DriverCollection()))
+    own_roster = roster()
+    balance = self.run_until_complete(solver.solve(own_roster, [2], DriverCollection()))
+    self.assertEqual((solver.searches, solver.cached_searches), (1, 1),
+    "Finished searches should be answered from the result cache")
+    self.assertTrue(all(any(driver is own for own in own_roster) for driver in balance.drivers()),
+    "Cached balances should hold the requester's own driver objects")
+  
+  def test_least_recently_used_results_are_evicted(self):
+    solver = BalanceSolver(cache_size=1)
+    changed_roster = roster()
+    changed_roster[0].irating = 3100
+    self.run_until_complete(solver.solve(roster(), [2], DriverCollection()))
+    self.run_until_complete(solver.solve(changed_roster, [2], DriverCollection()))
+    self.run_until_complete(solver.solve(roster(), [2], DriverCollection()))
+    self.assertEqual(solver.searches, 3,
+    "Only the most recent results should be kept")
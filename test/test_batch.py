@@ -0,0 +1,70 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from balancebot.batch import fingerprint, load_rosters, solve_roster, validation_error, with_roster_names
+
+def roster(name='Sprint', iratings=(3000, 2000, 1500, 1000), combinations=()):
+  return {'name': name,
+          'team_sizes': [2],
+          'drivers': [(index + 1, 'Driver {0}'.format(index + 1), irating) for index, irating in enumerate(iratings)],
+          'combinations': [list(combination) for combination in combinations]}
+
+class TestLoading(unittest.TestCase):
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+  
+  def tearDown(self):
+    shutil.rmtree(self.directory)
+  
+  def write(self, file_name, content):
+    path = os.path.join(self.directory, file_name)
+    with open(path, 'w') as file:
+      file.write(content)
+    return path
+  
+  def test_csv_rows_are_grouped_into_rosters(self):
+    path = self.write('events.csv', 'roster,id,name,irating,team_sizes,combination\n'
+                                    'a,1,One,3000,2;3,x\n'
+                                    'a,2,Two,2000,,x\n'
+                                    'b,3,Three,1500,2,\n')
+    rosters = load_rosters(path)
+    self.assertEqual([roster['name'] for roster in rosters], ['a', 'b'])
+    self.assertEqual(rosters[0]['team_sizes'], [2, 3])
+    self.assertEqual(rosters[0]['combinations'], [[1, 2]])
+    self.assertEqual(rosters[1]['drivers'], [(3, 'Three', 1500)])
+  
+  def test_single_json_roster_is_named_after_file(self):
+    path = self.write('sprint.json', '{"team_sizes": [2], "drivers": [{"id": 1, "irating": 1000}]}')
+    self.assertEqual(load_rosters(path), [{'name': 'sprint', 'team_sizes': [2], 'drivers': [(1, None, 1000)], 'combinations': []}])
+
+class TestSolving(unittest.TestCase):
+  def test_roster_is_balanced(self):
+    result = solve_roster(roster())
+    self.assertEqual(result['irating_gap'], 250)
+    self.assertEqual(sorted(len(team['drivers']) for team in result['teams']), [2, 2])
+  
+  def test_combinations_are_respected(self):
+    result = solve_roster(roster(combinations=[(1, 2)]))
+    self.assertIn([1, 2], [sorted(driver['id'] for driver in team['drivers']) for team in result['teams']])
+  
+  def test_invalid_roster_reports_error(self):
+    self.assertEqual(validation_error(roster(iratings=(3000, 2000, 1500, 1000, 500))), 'It is not possible to form teams of the specified size(s) with 5 drivers.')
+  
+  def test_overlapping_combinations_report_error(self):
+    result = solve_roster(roster(combinations=[(1, 2), (2, 3)]))
+    self.assertEqual(result, {'roster': 'Sprint', 'error': 'Driver(s) 2 are in more than one combination.'})
+  
+  def test_team_sizes_outside_the_allowed_range_report_error(self):
+    for team_sizes in ([0], [2, 11]):
+      invalid = dict(roster(), team_sizes=team_sizes)
+      self.assertEqual(validation_error(invalid), 'Team size {0} is not valid. Team sizes must be integers between 2 and 10.'.format(team_sizes[-1]))
+  
+  def test_identical_rosters_share_fingerprint_but_keep_names(self):
+    renamed = roster(name='Copy')
+    renamed['drivers'][0] = (1, 'Renamed', 3000)
+    self.assertEqual(fingerprint(roster()), fingerprint(renamed))
+    result = with_roster_names(solve_roster(roster()), renamed)
+    self.assertEqual(result['roster'], 'Copy')
+    self.assertIn('Renamed', [driver['name'] for team in result['teams'] for driver in team['drivers']])
@@ -0,0 +1,40 @@
+import unittest
+
+from balancebot.interfaces.command_router import CommandRouter
+
+def build_router():
+  router = CommandRouter()
+  for name in ['balance', 'balance threshold', 'set balance threshold', 'recheck rating', 'recheck rating all']:
+    router.add(name, name)
+  return router
+
+class TestMatching(unittest.TestCase):
+  def test_longest_prefix_wins_regardless_of_order(self):
+    route, argument = build_router().match('balance threshold')
+    self.assertEqual(route.name, 'balance threshold',
+    "The longest matching command should be chosen")
+  
+  def test_shorter_prefix_matches_when_longer_does_not(self):
+    route, argument = build_router().match('balance please')
+    self.assertEqual((route.name, argument), ('balance', 'please'))
+  
+  def test_argument_text_follows_command(self):
+    route, argument = build_router().match('set balance threshold 25')
+    self.assertEqual((route.name, argument), ('set balance threshold', '25'))
+  
+  def test_driver_names_are_not_mistaken_for_subcommands(self):
+    route, argument = build_router().match('recheck rating Allan Smith')
+    self.assertEqual((route.name, argument), ('recheck rating', 'Allan Smith'))
+  
+  def test_partial_words_do_not_match(self):
+    route, argument = build_router().match('balances')
+    self.assertIsNone(route,
+    "Commands should only match whole words")
+
+class TestLatencies(unittest.TestCase):
+  def test_latencies_are_recorded_per_command(self):
+    router = build_router()
+    router.record('balance', 0.02)
+    router.record('balance', 0.2)
+    self.assertEqual(router.latencies['balance'].count, 2)
+    self.assertEqual(router.latencies['balance'].quantile(0.5), 0.025)
@@ -0,0 +1,108 @@
+import asyncio
+from datetime import datetime as dt
+import os
+import tempfile
+import unittest
+
+from balancebot.data_store import DataStore, DRIVERS_FORMAT_VERSION
+from balancebot.driver     import Driver
+from balancebot.driver_set import DriverSet
+
+from helpers import DataDirectoryTestCase
+
+class TestJsonFiles(unittest.TestCase):
+  def setUp(self):
+    self.directory = tempfile.TemporaryDirectory()
+    self.filename = os.path.join(self.directory.name, 'drivers.json')
+  
+  def tearDown(self):
+    self.directory.cleanup()
+  
+  def test_write_replaces_contents_without_leaving_temporary_files(self):
+    DataStore.json_write_file(self.filename, {'a': 1})
+    DataStore.json_write_file(self.filename, {'b': 2})
+    self.assertEqual(DataStore.json_load_file(self.filename, None), {'b': 2},
+    "Written data should replace the previous contents")
+    self.assertEqual(os.listdir(self.directory.name), ['drivers.json'],
+    "No temporary files should be left behind")
+  
+  def test_corrupt_file_is_kept_aside(self):
+    with open(self.filename, 'w') as file:
+      file.write('{"a": ')
+    self.assertEqual(DataStore.json_load_file(self.filename, {}), {},
+    "Unparseable files should load as the fallback")
+    self.assertTrue(os.path.isfile(self.filename + '.corrupt'),
+    "A copy of the unparseable file should be kept")
+  
+  def test_run_in_executor_returns_result(self):
+    loop = asyncio.new_event_loop()
+    result = loop.run_until_complete(DataStore.run_in_executor(DataStore.json_load_file, self.filename, 'fallback'))
+    loop.close()
+    self.assertEqual(result, 'fallback')
+
+class TestDrivers(DataDirectoryTestCase):
+  def setUp(self):
+    super().setUp()
+    self.data_store = DataStore(1)
+  
+  def test_drivers_round_trip(self):
+    drivers = DriverSet()
+    drivers.add_driver(Driver(3659239, 'Megan Williams', 958, last_updated=dt(2021, 2, 3, 4, 5, 6)))
+    drivers.add_driver(Driver(1383412, 'Sadie Jones', 781, last_updated=dt(2021, 2, 4, 4, 5, 6)))
+    self.data_store.save_drivers(drivers)
+    loaded = self.data_store.load_drivers()
+    self.assertEqual(loaded, drivers)
+    self.assertEqual(Driver.find(loaded.drivers, 1383412).last_updated, dt(2021, 2, 4, 4, 5, 6),
+    "Last updated times should survive saving and loading")
+  
+  def test_legacy_drivers_are_read_and_upgraded_on_save(self):
+    DataStore.json_write_file(self.data_store.drivers_file, {'3659239': ['Megan Williams', 958, '2021-02-03 04:05:06']})
+    drivers = self.data_store.load_drivers()
+    megan = Driver.find(drivers.drivers, 3659239)
+    self.assertEqual((megan.name, megan.irating, megan.last_updated), ('Megan Williams', 958, dt(2021, 2, 3, 4, 5, 6)),
+    "Drivers saved in the legacy format should be loaded")
+    self.data_store.save_drivers(drivers)
+    self.assertEqual(DataStore.json_load_file(self.data_store.drivers_file, {}).get('version'), DRIVERS_FORMAT_VERSION,
+    "Saving should upgrade to the current format")
+
+class TestGuildFiles(DataDirectoryTestCase):
+  def test_guild_files_are_created_on_first_write(self):
+    data_store = DataStore(1)
+    self.assertEqual(data_store.load_team_sizes(), [])
+    self.assertEqual(DataStore.guild_ids(), [],
+    "Reading a guild's data should not create any files")
+    data_store.save_team_sizes([3])
+    self.assertEqual(DataStore.guild_ids(), [1])
+  
+  def test_monitored_guilds_are_indexed(self):
+    drivers = DriverSet()
+    drivers.add_driver(Driver(3659239, 'Megan Williams', 958))
+    monitored = DataStore(1)
+    monitored.save_drivers(drivers)
+    monitored.save_monitoring_data({'channel_id': 100})
+    DataStore(2).save_drivers(drivers)
+    self.assertEqual(DataStore.monitored_guild_ids(), [1],
+    "The index should be built from existing guild files")
+    DataStore(2).save_monitored(True)
+    monitored.save_monitored(False)
+    self.assertEqual(DataStore.monitored_guild_ids(), [2],
+    "The index should be kept up to date as guilds change")
+
+class TestSharding(DataDirectoryTestCase):
+  def tearDown(self):
+    DataStore.configure_shard(0, 1)
+    super().tearDown()
+  
+  def test_shard_only_sees_own_guilds(self):
+    shard_0_guild_id, shard_1_guild_id = 2 << 22, 3 << 22
+    drivers = DriverSet()
+    drivers.add_driver(Driver(3659239, 'Megan Williams', 958))
+    for guild_id in (shard_0_guild_id, shard_1_guild_id):
+      DataStore(guild_id).save_drivers(drivers)
+      DataStore(guild_id).save_monitoring_data({'channel_id': 100})
+    DataStore.configure_shard(1, 2)
+    self.assertEqual(DataStore.guild_ids(), [shard_1_guild_id])
+    self.assertEqual(DataStore.monitored_guild_ids(), [shard_1_guild_id],
+    "Each shard should only monitor its own guilds")
+    DataStore.configure_shard(0, 2)
+    self.assertEqual(DataStore.monitored_guild_ids(), [shard_0_guild_id])
@@ -3,12 +3,14 @@ import unittest
 from unittest.mock import AsyncMock
 from unittest.mock import Mock
 
-from balancebot.interfaces.discord_channel import DiscordChannel
+from balancebot.interfaces.discord_channel import COMMANDS, DiscordChannel
 
 class TestStatusRequest(unittest.TestCase):
   def test_status_request_delegates_to_bot_show_status(self):
     interface = DiscordChannel(None) # Discord client shouldn't matter for this request
     bot = Mock()
+    bot.initialize_guild = AsyncMock()
+    bot.save_guild = AsyncMock()
     bot.show_status = AsyncMock()
     interface.set_bot(bot)
     message = Mock()
@@ -18,4 +20,58 @@ class TestStatusRequest(unittest.TestCase):
     loop.run_until_complete(interface.process_request(message))
     loop.close()
     
-    bot.show_status.assert_awaited_once()
\ No newline at end of file
+    bot.show_status.assert_awaited_once()
+
+class TestCommandRouting(unittest.TestCase):
+  def process(self, content, bot):
+    interface = DiscordChannel(None)
+    bot.initialize_guild = AsyncMock()
+    bot.save_guild = AsyncMock()
+    interface.set_bot(bot)
+    message = Mock()
+    message.content = content
+    asyncio.new_event_loop().run_until_complete(interface.process_request(message))
+  
+  def test_longer_command_is_not_shadowed_by_its_prefix(self):
+    bot = Mock()
+    bot.show_balance_threshold = AsyncMock()
+    bot.list_balance = AsyncMock()
+    self.process('<@12345> balance threshold', bot)
+    bot.show_balance_threshold.assert_awaited_once()
+    bot.list_balance.assert_not_awaited()
+  
+  def test_arguments_are_parsed_for_the_command(self):
+    bot = Mock()
+    bot.set_balance_threshold = AsyncMock()
+    self.process('<@12345> set balance threshold 25', bot)
+    bot.set_balance_threshold.assert_awaited_once_with(25)
+  
+  def test_driver_identifiers_are_parsed(self):
+    bot = Mock()
+    bot.add_drivers = AsyncMock()
+    self.process('<@12345> add driver Jane Doe, John Smith 1234', bot)
+    bot.add_drivers.assert_awaited_once_with(['Jane Doe', 1234])
+  
+  def test_event_name_is_split_from_arguments(self):
+    bot = Mock()
+    bot.set_event_drivers = AsyncMock()
+    self.process('<@12345> set event drivers Summer Sprint: Jane Doe, John Smith 1234', bot)
+    bot.set_event_drivers.assert_awaited_once_with('Summer Sprint', ['Jane Doe', 1234])
+  
+  def test_failed_commands_are_timed(self):
+    bot = Mock()
+    bot.show_status = AsyncMock(side_effect=RuntimeError('Status failed'))
+    handled = COMMANDS.latencies['status'].count
+    with self.assertRaises(RuntimeError):
+      self.process('<@12345> status', bot)
+    self.assertEqual(COMMANDS.latencies['status'].count, handled + 1,
+    "Commands which fail should still be recorded in the latency histogram")
+
+class TestOutputChunking(unittest.TestCase):
+  def test_messages_are_combined_into_one_chunk(self):
+    self.assertEqual(DiscordChannel.chunk_messages(['one', 'two']), ['one\ntwo'])
+  
+  def test_chunks_stay_under_length_limit(self):
+    chunks = DiscordChannel.chunk_messages(['x' * 1500, 'y' * 1500, 'z' * 4500])
+    self.assertEqual([len(chunk) for chunk in chunks], [1500, 1500, 2000, 2000, 500],
+    "Chunks should split between messages where possible and split over-long lines")
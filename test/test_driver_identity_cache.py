@@ -0,0 +1,58 @@
+import asyncio
+import time
+import unittest
+
+from balancebot.driver_identity_cache import DriverIdentityCache
+from balancebot.driver_identity_cache import STALE_AFTER_SECONDS
+
+class MemoryDataStore:
+  saved = None
+  stored = {}
+  
+  def load_driver_identities():
+    return MemoryDataStore.stored
+  
+  def save_driver_identities(data):
+    MemoryDataStore.saved = data
+    return data
+  
+  async def run_in_executor(function, *args):
+    return function(*args)
+
+class TestLookup(unittest.TestCase):
+  def test_lookup_in_both_directions(self):
+    MemoryDataStore.stored = {}
+    cache = DriverIdentityCache(MemoryDataStore)
+    cache.remember(4831980, 'Jessica Smith')
+    self.assertEqual(cache.find_id('Jessica Smith'), 4831980,
+    "Remembered drivers should be found by name")
+    self.assertEqual(cache.find_name(4831980), 'Jessica Smith',
+    "Remembered drivers should be found by ID")
+  
+  def test_stale_entries_are_ignored(self):
+    MemoryDataStore.stored = {}
+    cache = DriverIdentityCache(MemoryDataStore)
+    cache.remember(4831980, 'Jessica Smith', now=time.time() - STALE_AFTER_SECONDS - 1)
+    self.assertIsNone(cache.find_id('Jessica Smith'),
+    "Stale entries should not be returned")
+  
+  def test_renamed_driver_is_not_found_by_old_name(self):
+    MemoryDataStore.stored = {}
+    cache = DriverIdentityCache(MemoryDataStore)
+    cache.remember(4831980, 'Jessica Smith')
+    cache.remember(4831980, 'Jessica Smith2')
+    self.assertIsNone(cache.find_id('Jessica Smith'),
+    "Drivers should not be found by a name they no longer have")
+
+class TestPersistence(unittest.TestCase):
+  def test_entries_survive_save_and_load(self):
+    MemoryDataStore.stored = {}
+    cache = DriverIdentityCache(MemoryDataStore)
+    cache.remember(4833703, 'Lauren Johnson')
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(cache.save())
+    loop.close()
+    MemoryDataStore.stored = {str(cust_id): entry for cust_id, entry in MemoryDataStore.saved.items()} # JSON keys are strings
+    reloaded = DriverIdentityCache(MemoryDataStore)
+    self.assertEqual(reloaded.find_id('Lauren Johnson'), 4833703,
+    "Saved entries should be loaded by a new cache")
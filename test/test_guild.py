@@ -0,0 +1,79 @@
+from balancebot.balance_bot       import BalanceBot
+from balancebot.driver            import Driver
+from balancebot.driver_set        import DriverSet
+from balancebot.event             import Event
+from balancebot.guild             import Guild
+
+from helpers import EventLoopTestCase, StubDataStore
+
+class RecordingDataStore(StubDataStore):
+  def __init__(self):
+    self.saves = []
+  
+  def load_drivers(self):
+    drivers = DriverSet()
+    drivers.add_driver(Driver(3818591, 'Friedrich Weber', 652))
+    drivers.add_driver(Driver(3980541, 'Karl Wagner', 1223))
+    return drivers
+  
+  def load_quarter_number():
+    return None
+  
+  async def run_in_executor(function, *args):
+    return function(*args)
+  
+  def __getattr__(self, name):
+    if not name.startswith('save_'):
+      raise AttributeError(name)
+    return lambda value: self.saves.append(name)
+
+# Saves guilds the way commands and background rechecks do, through the bot.
+class GuildTestCase(EventLoopTestCase):
+  def setUp(self):
+    super().setUp()
+    self.data_store = RecordingDataStore()
+    self.guild = Guild(1, self.data_store)
+    self.bot = BalanceBot(None, RecordingDataStore, None, None, None)
+    self.bot.guild = self.guild
+  
+  def save(self):
+    self.run_until_complete(self.bot.save_guild())
+
+class TestSave(GuildTestCase):
+  def test_changes_are_not_saved_until_guild_is_saved(self):
+    self.guild.set_team_sizes([3, 4])
+    self.assertEqual(self.data_store.saves, [],
+    "Changes should not be saved before the guild is saved")
+    self.save()
+    self.assertEqual(self.data_store.saves, ['save_team_sizes'])
+  
+  def test_each_changed_field_is_saved_once(self):
+    for driver in list(self.guild.get_drivers()):
+      driver.irating += 1
+      self.guild.save_driver(driver)
+    self.guild.remove_driver(Driver(3818591, 'Friedrich Weber', 652))
+    self.save()
+    self.assertEqual(sorted(self.data_store.saves), ['save_balance', 'save_combinations', 'save_drivers', 'save_monitored', 'save_teams'],
+    "Each changed field should be saved exactly once per save")
+  
+  def test_save_clears_changes(self):
+    self.guild.set_team_sizes([3, 4])
+    self.save()
+    self.save()
+    self.assertEqual(self.data_store.saves, ['save_team_sizes'],
+    "Fields should not be saved again once saved")
+
+class TestEvents(GuildTestCase):
+  def test_removed_driver_leaves_events(self):
+    self.guild.set_event(Event('Sprint', driver_ids=[3818591, 3980541], team_sizes=[1], combinations=[[3818591, 3980541]], balance=[[3818591], [3980541]]))
+    self.save()
+    self.guild.remove_driver(Driver(3818591, 'Friedrich Weber', 652))
+    event = self.guild.events['Sprint']
+    self.assertEqual((event.driver_ids, event.combinations, event.balance), ({3980541}, [], []),
+    "Removing a driver should drop it from events, along with their combinations and balance")
+    self.save()
+    self.assertIn('save_events', self.data_store.saves)
+  
+  def test_event_drivers_come_from_guild_roster(self):
+    self.guild.set_event(Event('Sprint', driver_ids=[3980541, 1]))
+    self.assertEqual([driver.name for driver in self.guild.event_drivers(self.guild.events['Sprint'])], ['Karl Wagner'])
@@ -0,0 +1,62 @@
+import unittest
+
+from balancebot.driver            import Driver
+from balancebot.driver_set        import DriverSet
+from balancebot.guild_registry    import GuildRegistry
+
+from helpers import StubDataStore
+
+class CountingDataStore(StubDataStore):
+  loads = 0
+  
+  def __init__(self, guild_id):
+    self.guild_id = guild_id
+  
+  def load_drivers(self):
+    CountingDataStore.loads += 1
+    drivers = DriverSet()
+    drivers.add_driver(Driver(4831980, 'Jessica Smith', 858))
+    return drivers
+  
+  def save_team_sizes(self, team_sizes):
+    pass
+
+class TestLoading(unittest.TestCase):
+  def test_guild_is_loaded_once(self):
+    CountingDataStore.loads = 0
+    registry = GuildRegistry(CountingDataStore)
+    registry.get(1)
+    registry.get(1)
+    self.assertEqual(CountingDataStore.loads, 1,
+    "A guild should only be loaded from the data store once")
+  
+  def test_changes_are_kept_in_memory(self):
+    registry = GuildRegistry(CountingDataStore)
+    registry.get(1).set_team_sizes([3, 4])
+    self.assertEqual(registry.get(1).team_sizes, [3, 4],
+    "Changes to a guild should be seen by later requests")
+  
+  def test_invalidated_guild_is_reloaded(self):
+    CountingDataStore.loads = 0
+    registry = GuildRegistry(CountingDataStore)
+    registry.get(1)
+    registry.invalidate(1)
+    registry.get(1)
+    self.assertEqual(CountingDataStore.loads, 2,
+    "An invalidated guild should be loaded again")
+
+class TestLocking(unittest.TestCase):
+  def test_same_lock_is_shared_per_guild(self):
+    registry = GuildRegistry(CountingDataStore)
+    self.assertIs(registry.lock(1), registry.lock(1),
+    "Commands and background rechecks should share a guild's lock")
+    self.assertIsNot(registry.lock(1), registry.lock(2),
+    "Different guilds should not block each other")
+  
+  def test_lock_survives_invalidation(self):
+    registry = GuildRegistry(CountingDataStore)
+    lock = registry.lock(1)
+    registry.get(1)
+    registry.invalidate(1)
+    self.assertIs(registry.lock(1), lock,
+    "Invalidating a guild should not hand out a second lock while the first may be held")
@@ -0,0 +1,55 @@
+import os
+import tempfile
+import unittest
+
+from balancebot.irating_history import IRatingHistory, RECORD
+
+class TestHistory(unittest.TestCase):
+  def setUp(self):
+    self.directory = tempfile.TemporaryDirectory()
+    self.path = os.path.join(self.directory.name, 'history.bin')
+  
+  def tearDown(self):
+    self.directory.cleanup()
+  
+  def test_records_are_returned_per_driver(self):
+    history = IRatingHistory(self.path)
+    history.append(4831980, 1500, timestamp=100)
+    history.append(4833703, 2000, timestamp=150)
+    history.append(4831980, 1540, timestamp=200)
+    baseline, records = history.history(4831980, since=0)
+    history.close()
+    self.assertIsNone(baseline)
+    self.assertEqual(records, [(100, 1500), (200, 1540)],
+    "Only the requested driver's records should be returned, in order")
+  
+  def test_latest_record_before_window_is_baseline(self):
+    history = IRatingHistory(self.path)
+    history.append(4831980, 1500, timestamp=100)
+    history.append(4831980, 1520, timestamp=150)
+    history.append(4831980, 1540, timestamp=200)
+    baseline, records = history.history(4831980, since=180)
+    history.close()
+    self.assertEqual(baseline, (150, 1520))
+    self.assertEqual(records, [(200, 1540)])
+  
+  def test_records_appended_after_first_read_are_seen(self):
+    history = IRatingHistory(self.path)
+    history.append(4831980, 1500, timestamp=100)
+    history.history(4831980, since=0)
+    IRatingHistory(self.path).append(4831980, 1540, timestamp=200)
+    _, records = history.history(4831980, since=0)
+    history.close()
+    self.assertEqual(len(records), 2,
+    "Records appended since the last read, including by other writers, should be seen")
+  
+  def test_half_written_record_is_dropped(self):
+    history = IRatingHistory(self.path)
+    history.append(4831980, 1500, timestamp=100)
+    with open(self.path, 'ab') as file:
+      file.write(b'\x01\x02\x03')
+    history.append(4831980, 1540, timestamp=200)
+    _, records = history.history(4831980, since=0)
+    history.close()
+    self.assertEqual(records, [(100, 1500), (200, 1540)])
+    self.assertEqual(os.path.getsize(self.path), RECORD.size * 2)
@@ -0,0 +1,85 @@
+from types import SimpleNamespace
+import unittest
+
+from balancebot.balance_bot    import BalanceBot
+from balancebot.balance_solver import BalanceSolver
+from balancebot.metrics        import Histogram
+from balancebot.metrics        import PrometheusWriter
+from balancebot.metrics_server import MetricsServer
+
+class TestHistogram(unittest.TestCase):
+  def test_observations_are_counted_in_buckets(self):
+    histogram = Histogram(buckets=(1, 10))
+    for value in [0.5, 1, 5, 50]:
+      histogram.observe(value)
+    self.assertEqual(histogram.cumulative_counts(), [(1, 2), (10, 3)],
+    "Bucket counts should be cumulative and include values equal to the bucket bound")
+    self.assertEqual((histogram.count, histogram.sum), (4, 56.5))
+  
+  def test_quantile_is_bucket_upper_bound(self):
+    histogram = Histogram(buckets=(1, 10))
+    for value in [0.5, 5, 5, 5]:
+      histogram.observe(value)
+    self.assertEqual(histogram.quantile(0.25), 1)
+    self.assertEqual(histogram.quantile(0.95), 10)
+  
+  def test_empty_histogram_has_no_quantile(self):
+    self.assertIsNone(Histogram().quantile(0.5))
+
+class TestPrometheusWriter(unittest.TestCase):
+  def test_histogram_exposition(self):
+    histogram = Histogram(buckets=(1,))
+    histogram.observe(0.5)
+    histogram.observe(2)
+    writer = PrometheusWriter()
+    writer.family('duration_seconds', 'histogram', 'Duration.')
+    writer.histogram('duration_seconds', histogram, {'command': 'status'})
+    self.assertEqual(writer.text().splitlines(), [
+      '# HELP duration_seconds Duration.',
+      '# TYPE duration_seconds histogram',
+      'duration_seconds_bucket{command="status",le="1.0"} 1',
+      'duration_seconds_bucket{command="status",le="+Inf"} 2',
+      'duration_seconds_sum{command="status"} 2.5',
+      'duration_seconds_count{command="status"} 2',
+    ])
+  
+  def test_label_values_are_escaped(self):
+    writer = PrometheusWriter()
+    writer.sample('calls_total', 1, {'method': 'a"b'})
+    self.assertEqual(writer.text(), 'calls_total{method="a\\"b"} 1\n')
+
+class TestMetricsServer(unittest.TestCase):
+  def setUp(self):
+    self.solver = BalanceBot.solver
+    BalanceBot.solver = BalanceSolver()
+  
+  def tearDown(self):
+    BalanceBot.solver = self.solver
+  
+  def test_solve_and_recheck_metrics_are_rendered(self):
+    BalanceBot.solver.searches, BalanceBot.solver.shared_searches, BalanceBot.solver.cached_searches = 3, 2, 1
+    BalanceBot.solver.durations.observe(0.002)
+    cycle_durations = Histogram()
+    cycle_durations.observe(1.5)
+    rechecker = SimpleNamespace(ir_client=object(), cycle_durations=cycle_durations, guild_rechecks=12, last_cycle_guild_count=4,
+                                identity_cache=SimpleNamespace(hits=3, misses=1), guild_registry=SimpleNamespace(hits=0, misses=0))
+    lines = MetricsServer(rechecker, port=0).render().splitlines()
+    for line in [
+      '# TYPE balancebot_balance_solve_duration_seconds histogram',
+      'balancebot_balance_solve_duration_seconds_count 1',
+      '# TYPE balancebot_balance_requests_total counter',
+      'balancebot_balance_requests_total{outcome="searched"} 3',
+      'balancebot_balance_requests_total{outcome="shared"} 2',
+      'balancebot_balance_requests_total{outcome="cached"} 1',
+      '# TYPE balancebot_recheck_cycle_duration_seconds histogram',
+      'balancebot_recheck_cycle_duration_seconds_sum 1.5',
+      'balancebot_recheck_cycle_duration_seconds_count 1',
+      'balancebot_guild_rechecks_total 12',
+      '# TYPE balancebot_recheck_cycle_guilds gauge',
+      'balancebot_recheck_cycle_guilds 4',
+      'balancebot_cache_hit_ratio{cache="driver_identity"} 0.75',
+      'balancebot_cache_hit_ratio{cache="guild"} 0.0',
+    ]:
+      self.assertIn(line, lines)
+    self.assertNotIn('# TYPE balancebot_iracing_call_duration_seconds histogram', lines,
+    "iRacing latencies should only be rendered when the client records them")
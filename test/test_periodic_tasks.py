@@ -0,0 +1,54 @@
+import asyncio
+import unittest
+
+from balancebot.periodic_tasks import PeriodicTasks
+
+class CountingRechecker:
+  def __init__(self, warm_start_error=None):
+    self.warm_start_error = warm_start_error
+    self.warm_starts = 0
+  
+  async def check_quarter_number(self):
+    pass
+  
+  async def perform_background_rechecks(self):
+    pass
+  
+  async def sync_recheck_schedule(self):
+    pass
+  
+  async def warm_start(self):
+    self.warm_starts += 1
+    if self.warm_start_error:
+      raise self.warm_start_error
+
+class TestStart(unittest.TestCase):
+  def start(self, rechecker, times):
+    tasks = PeriodicTasks(rechecker, 3600, 3600, 3600)
+    
+    async def start_and_stop():
+      for _ in range(times):
+        await tasks.start()
+      started = [periodic.started for periodic in tasks.periodics]
+      for periodic in tasks.periodics:
+        await periodic.stop()
+      return started
+    
+    loop = asyncio.new_event_loop()
+    started = loop.run_until_complete(start_and_stop())
+    loop.close()
+    return started
+  
+  def test_start_is_idempotent(self):
+    rechecker = CountingRechecker()
+    self.assertEqual(self.start(rechecker, times=3), [True, True, True],
+    "Each loop should be started once, however often on_ready fires")
+    self.assertEqual(rechecker.warm_starts, 1)
+  
+  def test_loops_start_when_warm_start_fails(self):
+    rechecker = CountingRechecker(warm_start_error=OSError('Disk unavailable'))
+    with self.assertLogs(level='ERROR'):
+      started = self.start(rechecker, times=2)
+    self.assertEqual(started, [True, True, True],
+    "A failed warm start should not stop the background loops from starting")
+    self.assertEqual(rechecker.warm_starts, 1)
@@ -0,0 +1,68 @@
+import asyncio
+
+from helpers import EventLoopTestCase
+
+from balancebot.rating_events import RatingEventBus
+from balancebot.tracing       import CURRENT_SPAN, span
+
+class TestRatingEvents(EventLoopTestCase):
+  def setUp(self):
+    super().setUp()
+    self.deliveries = []
+    self.delivery_spans = []
+    self.bus = RatingEventBus(self.handle, debounce_seconds=0.01, max_delay_seconds=1)
+  
+  async def handle(self, guild_id, iratings):
+    self.deliveries.append((guild_id, iratings))
+    self.delivery_spans.append(CURRENT_SPAN.get())
+  
+  def run_publishes(self, *publishes):
+    async def publish_and_wait():
+      for publish in publishes:
+        self.bus.publish(*publish)
+      await asyncio.sleep(0.05)
+    self.run_until_complete(publish_and_wait())
+  
+  def test_changes_reach_only_guilds_with_the_driver(self):
+    self.bus.subscribe(1, [100, 101])
+    self.bus.subscribe(2, [101])
+    self.bus.subscribe(3, [102])
+    self.run_publishes((101, 2000))
+    self.assertEqual(sorted(self.deliveries), [(1, {101: 2000}), (2, {101: 2000})])
+  
+  def test_source_guild_is_not_notified(self):
+    self.bus.subscribe(1, [100])
+    self.bus.subscribe(2, [100])
+    self.run_publishes((100, 2000, 1))
+    self.assertEqual(self.deliveries, [(2, {100: 2000})],
+    "The guild which found the change has already applied it")
+  
+  def test_bursts_of_changes_are_delivered_together(self):
+    self.bus.subscribe(1, [100, 101])
+    self.run_publishes((100, 2000), (101, 1500), (100, 2010))
+    self.assertEqual(self.deliveries, [(1, {100: 2010, 101: 1500})])
+  
+  def test_deliveries_are_not_traced_as_part_of_the_publisher(self):
+    self.bus.subscribe(1, [100])
+    async def publish_in_span():
+      with span('guild', guild_id=2):
+        self.bus.publish(100, 2000, 2)
+      await asyncio.sleep(0.05)
+    self.run_until_complete(publish_in_span())
+    self.assertEqual(self.delivery_spans, [None],
+    "Deliveries should start outside the publishing guild's span")
+  
+  def test_resubscribing_drops_removed_drivers(self):
+    self.bus.subscribe(1, [100, 101])
+    self.bus.subscribe(1, [101])
+    self.assertEqual(self.bus.subscribers(100), set())
+    self.assertEqual(self.bus.subscribers(101), {1})
+  
+  def test_unsubscribed_guild_gets_no_pending_changes(self):
+    self.bus.subscribe(1, [100])
+    async def publish_then_unsubscribe():
+      self.bus.publish(100, 2000)
+      self.bus.unsubscribe(1)
+      await asyncio.sleep(0.05)
+    self.run_until_complete(publish_then_unsubscribe())
+    self.assertEqual(self.deliveries, [])
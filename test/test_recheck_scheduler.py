@@ -0,0 +1,80 @@
+from datetime import datetime as dt
+from datetime import timedelta
+import unittest
+
+from balancebot.recheck_scheduler import RecheckScheduler
+from balancebot.recheck_scheduler import ACTIVE_INTERVAL, DEFAULT_INTERVAL, EVENT_BOOST_INTERVAL, MAX_INTERVAL
+
+NOW = dt(2021, 3, 1, 12, 0, 0)
+
+class TestDueChecks(unittest.TestCase):
+  def test_new_drivers_are_due_immediately(self):
+    scheduler = RecheckScheduler()
+    scheduler.sync_guild(1, [101, 102], now=NOW)
+    due = scheduler.due_checks(now=NOW)
+    self.assertEqual(sorted(due[1]), [101, 102],
+    "Newly scheduled drivers should be due immediately")
+  
+  def test_drivers_in_flight_are_not_due_again(self):
+    scheduler = RecheckScheduler()
+    scheduler.sync_guild(1, [101], now=NOW)
+    scheduler.due_checks(now=NOW)
+    self.assertEqual(scheduler.due_checks(now=NOW + MAX_INTERVAL), {},
+    "Drivers whose check has not yet been recorded should not be handed out again")
+  
+  def test_removed_drivers_are_not_due(self):
+    scheduler = RecheckScheduler()
+    scheduler.sync_guild(1, [101, 102], now=NOW)
+    scheduler.sync_guild(1, [101], now=NOW)
+    self.assertEqual(scheduler.due_checks(now=NOW), {1: [101]},
+    "Drivers removed from the roster should not be checked")
+
+class TestIntervals(unittest.TestCase):
+  def test_unchanged_drivers_back_off(self):
+    scheduler = RecheckScheduler()
+    scheduler.sync_guild(1, [101], now=NOW)
+    scheduler.due_checks(now=NOW)
+    scheduler.record_check(1, 101, changed=False, now=NOW)
+    self.assertEqual(scheduler.next_check(1, 101), NOW + DEFAULT_INTERVAL * 2,
+    "Drivers whose iRating has not changed should be checked less often")
+  
+  def test_back_off_is_capped(self):
+    scheduler = RecheckScheduler()
+    scheduler.sync_guild(1, [101], now=NOW)
+    for _ in range(20):
+      scheduler.due_checks(now=NOW + MAX_INTERVAL * 100)
+      scheduler.record_check(1, 101, changed=False, now=NOW)
+    self.assertEqual(scheduler.next_check(1, 101), NOW + MAX_INTERVAL,
+    "Back-off should not exceed the maximum interval")
+  
+  def test_changed_drivers_are_checked_frequently(self):
+    scheduler = RecheckScheduler()
+    scheduler.sync_guild(1, [101], now=NOW)
+    scheduler.due_checks(now=NOW)
+    scheduler.record_check(1, 101, changed=True, now=NOW)
+    self.assertEqual(scheduler.next_check(1, 101), NOW + ACTIVE_INTERVAL,
+    "Drivers whose iRating has changed should be checked frequently")
+  
+  def test_upcoming_event_boosts_checks(self):
+    scheduler = RecheckScheduler()
+    scheduler.sync_guild(1, [101], event_date=NOW + timedelta(days=1), now=NOW)
+    scheduler.due_checks(now=NOW)
+    scheduler.record_check(1, 101, changed=False, now=NOW)
+    self.assertEqual(scheduler.next_check(1, 101), NOW + EVENT_BOOST_INTERVAL,
+    "Drivers should be checked more often in the days before an event")
+  
+  def test_event_day_boosts_checks(self):
+    scheduler = RecheckScheduler()
+    scheduler.sync_guild(1, [101], event_date=dt(2021, 3, 1), now=NOW)
+    scheduler.due_checks(now=NOW)
+    scheduler.record_check(1, 101, changed=False, now=NOW)
+    self.assertEqual(scheduler.next_check(1, 101), NOW + EVENT_BOOST_INTERVAL,
+    "Drivers should still be checked more often on the day of the event")
+  
+  def test_past_event_does_not_boost_checks(self):
+    scheduler = RecheckScheduler()
+    scheduler.sync_guild(1, [101], event_date=NOW - timedelta(days=1), now=NOW)
+    scheduler.due_checks(now=NOW)
+    scheduler.record_check(1, 101, changed=False, now=NOW)
+    self.assertEqual(scheduler.next_check(1, 101), NOW + DEFAULT_INTERVAL * 2,
+    "Events which have already happened should not boost checks")
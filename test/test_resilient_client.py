@@ -0,0 +1,109 @@
+import asyncio
+import unittest
+
+from balancebot.resilient_client import CircuitBreaker, IRacingUnavailable, ResilientClient
+
+def run_until_complete(coroutine):
+  loop = asyncio.new_event_loop()
+  try:
+    return loop.run_until_complete(coroutine)
+  finally:
+    loop.close()
+
+class FlakyClient:
+  def __init__(self, failures):
+    self.failures = failures
+    self.calls = 0
+  
+  async def driver_status(self, cust_id):
+    self.calls += 1
+    if self.calls <= self.failures:
+      raise ConnectionError('Connection reset')
+    return cust_id
+  
+  async def event_results(self, cust_id):
+    self.calls += 1
+    raise TypeError('Empty response')
+  
+  async def irating(self, cust_id, category):
+    self.calls += 1
+    await asyncio.sleep(60)
+  
+  async def subsession_data(self, subsession_id):
+    self.calls += 1
+    raise KeyError(subsession_id)
+
+class TestRetries(unittest.TestCase):
+  def test_failed_calls_are_retried(self):
+    client = ResilientClient(FlakyClient(failures=2), retries=2, backoff=0)
+    result = run_until_complete(client.driver_status(4831980))
+    self.assertEqual(result, 4831980,
+    "Calls which fail fewer times than the retry limit should succeed")
+  
+  def test_calls_failing_every_retry_raise_unavailable(self):
+    client = ResilientClient(FlakyClient(failures=3), retries=2, backoff=0)
+    with self.assertRaises(IRacingUnavailable):
+      run_until_complete(client.driver_status(4831980))
+  
+  def test_empty_responses_are_not_retried(self):
+    flaky = FlakyClient(failures=0)
+    client = ResilientClient(flaky, retries=2, backoff=0)
+    with self.assertRaises(TypeError):
+      run_until_complete(client.event_results(4831980))
+    self.assertEqual(flaky.calls, 1,
+    "Empty responses should be passed through without retrying")
+  
+  def test_client_bugs_are_raised_without_retrying(self):
+    flaky = FlakyClient(failures=0)
+    client = ResilientClient(flaky, retries=2, backoff=0)
+    with self.assertRaises(KeyError):
+      run_until_complete(client.subsession_data(4831980))
+    self.assertEqual((flaky.calls, client.breaker.consecutive_failures), (1, 0),
+    "Errors other than timeouts, network and HTTP errors should not be retried or counted as outages")
+  
+  def test_latency_is_recorded_per_endpoint(self):
+    client = ResilientClient(FlakyClient(failures=1), retries=2, backoff=0)
+    run_until_complete(client.driver_status(4831980))
+    self.assertEqual(client.latencies.counts['driver_status'], 2,
+    "Every attempt should be recorded")
+
+class TestCircuitBreaker(unittest.TestCase):
+  def test_open_breaker_fails_fast(self):
+    flaky = FlakyClient(failures=100)
+    client = ResilientClient(flaky, retries=0, backoff=0, breaker=CircuitBreaker(failure_threshold=2))
+    for _ in range(2):
+      with self.assertRaises(IRacingUnavailable):
+        run_until_complete(client.driver_status(4831980))
+    with self.assertRaises(IRacingUnavailable):
+      run_until_complete(client.driver_status(4831980))
+    self.assertEqual(flaky.calls, 2,
+    "Calls should not reach iRacing while the breaker is open")
+  
+  def test_breaker_allows_single_trial_after_reset_period(self):
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=60)
+    breaker.record_failure(now=100)
+    self.assertFalse(breaker.allow_request(now=130))
+    self.assertTrue(breaker.allow_request(now=161))
+    self.assertFalse(breaker.allow_request(now=161),
+    "Only one trial call should be let through while half-open")
+    breaker.record_success()
+    self.assertTrue(breaker.allow_request(now=162),
+    "A successful trial should close the breaker")
+  
+  def test_cancelled_trial_lets_next_trial_through(self):
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0)
+    breaker.record_failure()
+    flaky = FlakyClient(failures=0)
+    client = ResilientClient(flaky, retries=0, backoff=0, breaker=breaker)
+    
+    async def cancel_trial():
+      trial = asyncio.ensure_future(client.irating(4831980, 2))
+      await asyncio.sleep(0)
+      trial.cancel()
+      with self.assertRaises(asyncio.CancelledError):
+        await trial
+    
+    run_until_complete(cancel_trial())
+    self.assertEqual(run_until_complete(client.driver_status(4831980)), 4831980,
+    "A cancelled trial call should not leave the breaker open for good")
+    self.assertFalse(breaker.is_open())
@@ -0,0 +1,53 @@
+import time
+import unittest
+
+from balancebot.balancer          import Balancer
+from balancebot.driver            import Driver
+from balancebot.driver_collection import DriverCollection
+from balancebot.driver_set        import DriverSet
+from balancebot.robustness        import RobustnessSimulator
+
+def drivers():
+  return [Driver(index, 'Driver {0}'.format(index), irating) for index, irating in enumerate([3200, 2900, 2500, 2400, 2100, 1800, 1500, 1200], 1)]
+
+def collection(*teams):
+  collection = DriverCollection()
+  for team in teams:
+    driver_set = DriverSet()
+    for driver in team:
+      driver_set.add_driver(driver)
+    collection.add_driver_set(driver_set)
+  return collection
+
+class TestBestBalances(unittest.TestCase):
+  def test_best_balances_are_distinct_and_ordered(self):
+    balances = Balancer(drivers(), [4], DriverCollection(), keep=5).best_balances()
+    self.assertEqual(len(set(balances)), 5,
+    "The same teams found in a different order should only be kept once")
+    gaps = [balance.irating_gap() for balance in balances]
+    self.assertEqual(gaps, sorted(gaps))
+    self.assertEqual(balances[0], Balancer(drivers(), [4], DriverCollection()).optimal_balance())
+
+@unittest.skipIf(not RobustnessSimulator.available(), 'numpy is not installed')
+class TestRobustnessSimulator(unittest.TestCase):
+  def test_closer_balance_is_more_robust(self):
+    roster = drivers()
+    close = collection(roster[0::2], roster[1::2])
+    far = collection(roster[:4], roster[4:])
+    ranked = RobustnessSimulator(days=7, seed=1).rank([far, close], threshold=300)
+    self.assertEqual(ranked[0][0], close)
+    self.assertGreater(ranked[0][1].probability_inside, ranked[1][1].probability_inside)
+  
+  def test_without_drift_gap_matches_current_gap(self):
+    roster = drivers()
+    balance = collection(roster[0::2], roster[1::2])
+    report = RobustnessSimulator(stddev_per_day=0, seed=1).analyse(balance, threshold=None)
+    self.assertAlmostEqual(report.median_gap, balance.irating_gap())
+    self.assertIsNone(report.probability_inside)
+  
+  def test_typical_roster_is_fast(self):
+    roster = drivers()
+    balances = Balancer(roster, [4], DriverCollection(), keep=5).best_balances()
+    started_at = time.perf_counter()
+    RobustnessSimulator(seed=1).rank(balances, threshold=100)
+    self.assertLess(time.perf_counter() - started_at, 0.5)
@@ -0,0 +1,13 @@
+import unittest
+
+from balancebot.sharding import shard_for_guild
+
+class TestShardForGuild(unittest.TestCase):
+  def test_single_shard_owns_every_guild(self):
+    self.assertEqual(shard_for_guild(803081668910383174, 1), 0)
+  
+  def test_guilds_are_assigned_by_discord_formula(self):
+    # The snowflake from Discord's reference docs; its timestamp part (guild_id >> 22) is 41944705796.
+    self.assertEqual([shard_for_guild(175928847299117063, shard_count) for shard_count in (2, 3, 4, 16)], [0, 2, 0, 4])
+    self.assertEqual([shard_for_guild(803081668910383174, shard_count) for shard_count in (2, 3, 4, 16)], [0, 1, 0, 4],
+    "Guilds should be assigned to the shard Discord sends their events to")
@@ -0,0 +1,127 @@
+import unittest
+
+from balancebot.data_store        import DataStore
+from balancebot.driver            import Driver
+from balancebot.driver_set        import DriverSet
+from balancebot.driver_collection import DriverCollection
+from balancebot.sqlite_data_store import SqliteDataStore
+
+from helpers import DataDirectoryTestCase
+
+def sample_drivers():
+  drivers = DriverSet()
+  drivers.add_driver(Driver(9875796, 'Gerhard Schneider', 1545))
+  drivers.add_driver(Driver(6001789, 'Hans Richter', 2152))
+  drivers.add_driver(Driver(2247084, 'Andreas Hartmann', 610))
+  drivers.add_driver(Driver(2565069, 'Martin Köhler', 930))
+  return drivers
+
+class TestRoundTrip(unittest.TestCase):
+  def setUp(self):
+    SqliteDataStore.connect(':memory:')
+  
+  def test_drivers_round_trip(self):
+    store = SqliteDataStore(1)
+    drivers = sample_drivers()
+    store.save_drivers(drivers)
+    loaded = store.load_drivers()
+    self.assertEqual(loaded, drivers,
+    "Saved drivers should be loaded")
+    self.assertEqual(Driver.find(loaded.drivers, 6001789).irating, 2152,
+    "Saved iRatings should be loaded")
+  
+  def test_collections_round_trip(self):
+    store = SqliteDataStore(1)
+    drivers = sample_drivers()
+    ordered = sorted(drivers.drivers, key=lambda driver: driver.id)
+    teams = DriverCollection()
+    for index in (0, 2):
+      team = DriverSet()
+      team.add_driver(ordered[index])
+      team.add_driver(ordered[index + 1])
+      teams.add_driver_set(team)
+    store.save_drivers(drivers)
+    store.save_teams(teams)
+    self.assertEqual(store.load_teams(store.load_drivers()), teams,
+    "Saved teams should be loaded")
+  
+  def test_events_round_trip(self):
+    store = SqliteDataStore(1)
+    events = {'Sprint': {'drivers': [2247084, 2565069], 'team_sizes': [1], 'combinations': [], 'balance': [[2247084], [2565069]]}}
+    store.save_events(events)
+    store.save_events(events)
+    self.assertEqual(store.load_events(), events,
+    "Saved events should be loaded")
+  
+  def test_guild_data_is_separate(self):
+    SqliteDataStore(1).save_team_sizes([3, 4])
+    SqliteDataStore(2).save_team_sizes([2])
+    self.assertEqual(SqliteDataStore(1).load_team_sizes(), [3, 4],
+    "Guilds should not overwrite each other's data")
+
+  def test_loading_a_new_guild_does_not_write(self):
+    store = SqliteDataStore(1)
+    store.load_drivers()
+    store.load_team_sizes()
+    self.assertEqual(SqliteDataStore.guild_ids(), [],
+    "Guilds should only be stored once they save something")
+    store.save_drivers(sample_drivers())
+    self.assertEqual(SqliteDataStore.guild_ids(), [1])
+
+class TestJsonImport(DataDirectoryTestCase):
+  def setUp(self):
+    super().setUp()
+    SqliteDataStore.connect(':memory:')
+  
+  def test_every_field_is_imported(self):
+    drivers = sample_drivers()
+    ordered = sorted(drivers.drivers, key=lambda driver: driver.id)
+    teams = DriverCollection()
+    for index in (0, 2):
+      team = DriverSet()
+      team.add_driver(ordered[index])
+      team.add_driver(ordered[index + 1])
+      teams.add_driver_set(team)
+    combinations = DriverCollection()
+    combinations.add_driver_set(list(teams.driver_sets)[0])
+    events = {'Sprint': {'drivers': [2247084, 2565069], 'team_sizes': [1], 'combinations': [], 'balance': []}}
+    json_store = DataStore(1)
+    json_store.save_drivers(drivers)
+    json_store.save_balance(teams)
+    json_store.save_balance_threshold(25)
+    json_store.save_combinations(combinations)
+    json_store.save_events(events)
+    json_store.save_monitoring_data({'channel_id': 100, 'event_date': '2021-03-01'})
+    json_store.save_team_sizes([2])
+    json_store.save_teams(teams)
+    DataStore.save_quarter_number(2)
+    DataStore.save_driver_identities({9875796: ['Gerhard Schneider', 1614556800.0]})
+    
+    self.assertEqual(SqliteDataStore.import_json_data(DataStore), 1)
+    store = SqliteDataStore(1)
+    loaded_drivers = store.load_drivers()
+    self.assertEqual(loaded_drivers, drivers)
+    self.assertEqual(store.load_balance(loaded_drivers), teams)
+    self.assertEqual(store.load_balance_threshold(), 25)
+    self.assertEqual(store.load_combinations(loaded_drivers), combinations)
+    self.assertEqual(store.load_events(), events)
+    self.assertEqual(store.load_monitoring_data(), {'channel_id': 100, 'event_date': '2021-03-01'})
+    self.assertEqual(store.load_team_sizes(), [2])
+    self.assertEqual(store.load_teams(loaded_drivers), teams)
+    self.assertEqual(SqliteDataStore.load_quarter_number(), 2)
+    self.assertEqual(SqliteDataStore.load_driver_identities(), {9875796: ['Gerhard Schneider', 1614556800.0]})
+    self.assertEqual(SqliteDataStore.monitored_guild_ids(), [1],
+    "Every field stored by the JSON data store should be imported")
+
+class TestMonitoredGuilds(unittest.TestCase):
+  def setUp(self):
+    SqliteDataStore.connect(':memory:')
+  
+  def test_only_guilds_with_channel_and_drivers_are_monitored(self):
+    with_channel_and_drivers = SqliteDataStore(1)
+    with_channel_and_drivers.save_monitoring_data({'channel_id': 100})
+    with_channel_and_drivers.save_drivers(sample_drivers())
+    SqliteDataStore(2).save_monitoring_data({'channel_id': 200})
+    SqliteDataStore(3).save_drivers(sample_drivers())
+    self.assertEqual(SqliteDataStore.monitored_guild_ids(), [1],
+    "Only guilds with a notification channel and drivers should be monitored")
@@ -0,0 +1,58 @@
+import asyncio
+import json
+import logging
+import unittest
+
+from balancebot.tracing import span
+from balancebot.tracing import TRACE_LOGGER
+
+class RecordingHandler(logging.Handler):
+  def __init__(self):
+    super().__init__()
+    self.records = []
+  
+  def emit(self, record):
+    self.records.append(json.loads(record.getMessage()))
+
+class TestSpans(unittest.TestCase):
+  def setUp(self):
+    self.handler = RecordingHandler()
+    TRACE_LOGGER.addHandler(self.handler)
+    TRACE_LOGGER.setLevel(logging.INFO)
+  
+  def tearDown(self):
+    TRACE_LOGGER.removeHandler(self.handler)
+    TRACE_LOGGER.setLevel(logging.NOTSET)
+  
+  def test_spans_in_gathered_tasks_are_children(self):
+    async def guild(guild_id):
+      with span('guild', guild_id=guild_id):
+        with span('solve'):
+          await asyncio.sleep(0)
+    
+    async def cycle():
+      with span('cycle') as cycle_span:
+        await asyncio.gather(guild(1), guild(2))
+      return cycle_span
+    
+    cycle_span = asyncio.new_event_loop().run_until_complete(cycle())
+    records = {(record['name'], record.get('guild_id')): record for record in self.handler.records if record['name'] != 'solve'}
+    self.assertEqual(records[('guild', 1)]['parent'], cycle_span.span_id)
+    self.assertEqual(records[('guild', 2)]['parent'], cycle_span.span_id)
+    self.assertEqual(set(record['trace'] for record in self.handler.records), {cycle_span.span_id},
+    "Every span in a cycle should share the cycle's trace ID")
+  
+  def test_child_time_is_totalled_by_name(self):
+    with span('guild') as guild_span:
+      with span('fetch_irating'):
+        pass
+      with span('fetch_irating'):
+        pass
+    self.assertEqual(list(guild_span.child_durations), ['fetch_irating'])
+    self.assertLessEqual(guild_span.child_durations['fetch_irating'], guild_span.duration)
+  
+  def test_errors_are_recorded(self):
+    with self.assertRaises(ValueError):
+      with span('solve'):
+        raise ValueError()
+    self.assertEqual(self.handler.records[-1]['error'], 'ValueError')